@@ -0,0 +1,195 @@
+'''
+Throughput and peak memory of the crawler's hot paths on the recorded fixtures scaled up to a season.
+
+    python -m benchmarks.bench_crawler                      # compare against benchmarks/baseline.json
+    python -m benchmarks.bench_crawler --save               # record the results as the new baseline
+    python -m benchmarks.bench_crawler --games 200 --only parse
+
+Boxscores are the recorded one with its roster cloned up to --players_per_team players, the schedule is
+the replay server's synthetic season.  Storage writes go to an in-memory S3 stand-in that keeps only
+object sizes, so the numbers cover parsing, serialization and the crawler itself, not the network.
+Exits with 1 when a benchmark regresses against the baseline by more than --threshold, or when no
+benchmark has a baseline entry to compare against; the ones missing from it are listed.  A full season
+takes a while, mostly in the per player paths (parse_player_info and the player layout) and in the
+tracemalloc run; --games 100 gives a quick check.  Baselines are machine specific, compare runs made
+on the same machine with the same --games.
+'''
+import sys
+import copy
+import json
+import logging
+from pathlib import Path
+from datetime import datetime
+
+from benchmarks.harness import measure, missing, regressions, load_baseline, save_baseline, report
+from nhldata.app import Crawler, Storage, GameStorageKey
+from nhldata.formats import OUTPUT_FORMATS
+from nhldata.parser import NhlParser
+from nhldata.replay import ReplayCatalog
+from nhldata.schema import NHL_SCHEMA, NHL_COLUMN_TYPES
+from nhldata.strategy import NHL_PARSING_STRATEGY, SCHEMA_PARSING_STRATEGY
+from tests.conftest import MemoryS3Client
+
+
+FIXTURES = Path(__file__).parent.parent / 'tests' / 'fixtures'
+BASELINE = Path(__file__).parent / 'baseline.json'
+
+SEASON_START = datetime(2019, 10, 2)
+SEASON_END = datetime(2020, 4, 4)
+
+
+class RecordedApi():
+    def __init__(self, schedule: dict, boxscore: dict):
+        self.schedule_data = schedule
+        self.boxscore_data = boxscore
+
+    def schedule(self, start_date, end_date):
+        return self.schedule_data
+
+    def boxscore(self, game_id, final=False):
+        return self.boxscore_data
+
+
+def season_schedule(games: int) -> dict:
+    ''' the synthetic season cut down to its first games games '''
+    days = (SEASON_END - SEASON_START).days + 1
+    games_per_day = max(1, -(-games // days))
+    catalog = ReplayCatalog.from_directory(FIXTURES, games_per_day=games_per_day)
+    schedule = json.loads(catalog.schedule(SEASON_START.strftime('%Y-%m-%d'), SEASON_END.strftime('%Y-%m-%d')))
+
+    remaining = games
+    dates = []
+
+    for date in schedule['dates']:
+        if remaining <= 0:
+            break
+
+        dates.append(dict(date, games=date['games'][:remaining]))
+        remaining -= len(dates[-1]['games'])
+
+    return dict(schedule, dates=dates)
+
+
+def scaled_boxscore(players_per_team: int) -> dict:
+    ''' the recorded boxscore with each roster cloned under new player ids up to players_per_team '''
+    boxscore = json.loads((FIXTURES / 'boxscore.json').read_text())
+
+    for team in boxscore['teams'].values():
+        recorded = list(team['players'].values())
+        players = {}
+
+        for index in range(players_per_team):
+            player = copy.deepcopy(recorded[index % len(recorded)])
+            player['person']['id'] += (index // len(recorded)) * 1000000
+            players[f"ID{player['person']['id']}"] = player
+
+        team['players'] = players
+
+    return boxscore
+
+
+def benchmarks(games: int, players_per_team: int, version: str) -> dict:
+    ''' name -> run(), each returning the number of rows it handled '''
+    schedule = season_schedule(games)
+    boxscore = scaled_boxscore(players_per_team)
+    strategy = NHL_PARSING_STRATEGY.get(version, SCHEMA_PARSING_STRATEGY)
+    parser = NhlParser(strategy, NHL_SCHEMA[version])
+    season = parser.parse_games(schedule['dates'])
+    frames = [(game, parser.parse_game_frame(boxscore, game)) for game in season]
+
+    def parse_game_id():
+        return len(parser.parse_game_id(schedule['dates']))
+
+    def parse_player_info():
+        return sum(len(parser.parse_player_info(boxscore, parser.output_cols, game)) for game in season)
+
+    def parse_game_frame():
+        return sum(len(parser.parse_game_frame(boxscore, game)) for game in season)
+
+    def store_game(output_format):
+        def run():
+            output = OUTPUT_FORMATS[output_format](NHL_COLUMN_TYPES[version])
+            storage = Storage('bench', MemoryS3Client(keep_bodies=False), output)
+
+            for game, game_df in frames:
+                storage.store_game(GameStorageKey(game.season, game.date, game.id), game_df)
+
+            return sum(len(game_df) for _, game_df in frames)
+
+        return run
+
+    def crawl(layout):
+        def run():
+            s3_client = MemoryS3Client(keep_bodies=False)
+            crawler = Crawler(RecordedApi(schedule, boxscore), Storage('bench', s3_client), version, layout=layout)
+            result = crawler.crawl(SEASON_START, SEASON_END)
+
+            return len(result.succeeded) * players_per_team * 2
+
+        return run
+
+    return {
+        'parse_game_id': parse_game_id,
+        'parse_player_info': parse_player_info,
+        'parse_game_frame': parse_game_frame,
+        'store_game_csv': store_game('csv'),
+        'store_game_csv_gz': store_game('csv.gz'),
+        'store_game_csv_zst': store_game('csv.zst'),
+        'store_game_parquet': store_game('parquet'),
+        'crawl_player_layout': crawl('player'),
+        'crawl_game_layout': crawl('game')
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='NHL crawler benchmarks')
+    parser.add_argument("--games", default=1271, type=int, help="games in the season, a regular season has 1271")
+    parser.add_argument("--players_per_team", default=20, type=int)
+    parser.add_argument("--version", default="v3", type=str)
+    parser.add_argument("--repeat", default=3, type=int, help="timed runs per benchmark, the best one counts")
+    parser.add_argument("--only", default=None, type=str, help="run the benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=str(BASELINE), type=str)
+    parser.add_argument("--threshold", default=0.2, type=float,
+                        help="allowed drop in rows/s or growth in peak memory before a benchmark fails")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline instead of comparing")
+    args = parser.parse_args()
+
+    # the crawler logs every game, which would dominate the timings
+    logging.disable(logging.INFO)
+
+    results = []
+
+    for name, run in benchmarks(args.games, args.players_per_team, args.version).items():
+        if args.only and args.only not in name:
+            continue
+
+        try:
+            results.append(measure(name, run, args.repeat))
+        except RuntimeError as e:
+            print("Skipping {}: {}".format(name, e), file=sys.stderr)
+
+    print(report(results))
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print("Saved baseline {}".format(args.baseline))
+        return
+
+    baseline = load_baseline(args.baseline)
+    failures = regressions(results, baseline, args.threshold)
+    unchecked = missing(results, baseline)
+
+    for name in unchecked:
+        print("{}: not in the baseline {}, save one with --save".format(name, args.baseline), file=sys.stderr)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    # nothing was compared at all, which would otherwise pass silently
+    if failures or (results and len(unchecked) == len(results)):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Measures a benchmark's throughput and peak memory and compares the results against a saved baseline.
+'''
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class BenchResult:
+    name: str
+    rows: int
+    seconds: float
+    peak_mb: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return dict(asdict(self), rows_per_second=self.rows_per_second)
+
+
+def measure(name: str, run, repeat: int = 3) -> BenchResult:
+    '''
+    run() does the work once and returns the number of rows it handled.  Timing takes the best of
+    repeat runs; peak memory comes from one more run under tracemalloc, which would skew the timings.
+    '''
+    rows = 0
+    best = None
+
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        rows = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchResult(name, rows, best, peak / 1024 / 1024)
+
+
+def regressions(results: list, baseline: dict, threshold: float) -> list:
+    '''
+    messages for every result that fell behind its baseline by more than threshold, either in rows per
+    second or in peak memory.  Benchmarks missing from the baseline are skipped, see missing().
+    '''
+    messages = []
+
+    for result in results:
+        previous = baseline.get(result.name)
+
+        if not previous:
+            continue
+
+        if result.rows_per_second < previous['rows_per_second'] * (1 - threshold):
+            messages.append("{}: {:.0f} rows/s is more than {:.0%} below the baseline {:.0f} rows/s".format(
+                result.name, result.rows_per_second, threshold, previous['rows_per_second']))
+
+        if result.peak_mb > previous['peak_mb'] * (1 + threshold):
+            messages.append("{}: peak {:.1f}MB is more than {:.0%} above the baseline {:.1f}MB".format(
+                result.name, result.peak_mb, threshold, previous['peak_mb']))
+
+    return messages
+
+
+def missing(results: list, baseline: dict) -> list:
+    ''' names of the results the baseline has nothing to compare against '''
+    return [result.name for result in results if not baseline.get(result.name)]
+
+
+def load_baseline(path) -> dict:
+    path = Path(path)
+
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_baseline(path, results: list) -> None:
+    baseline = load_baseline(path)
+    baseline.update({result.name: result.to_dict() for result in results})
+
+    Path(path).write_text(json.dumps(baseline, indent=2, sort_keys=True))
+
+
+def report(results: list) -> str:
+    lines = ['{:<32} {:>10} {:>10} {:>14} {:>10}'.format('benchmark', 'rows', 'seconds', 'rows/s', 'peak MB')]
+
+    for result in results:
+        lines.append('{:<32} {:>10} {:>10.3f} {:>14,.0f} {:>10.1f}'.format(
+            result.name, result.rows, result.seconds, result.rows_per_second, result.peak_mb))
+
+    return '\n'.join(lines)
@@ -1,9 +1,23 @@
+{{ config(materialized='incremental', unique_key='id') }}
+
+-- running tallies per player. An incremental run only re-totals the players who have games loaded
+-- since the last run, summing their narrow per game rows instead of rescanning all raw game stats
 select
-nhl_player_id as id,
-game_team_name team_name,
-full_name,
-coalesce(stats_assists, 0) + coalesce(stats_power_play_assists, 0) + coalesce(stats_shorthanded_assists, 0) + coalesce(goalie_stats_assists, 0) assists,
-coalesce(stats_goals, 0) + coalesce(stats_power_play_goals, 0) + coalesce(stats_shorthanded_goals, 0) + coalesce(goalie_stats_goals, 0) goals,
-coalesce(stats_assists, 0) + coalesce(stats_power_play_assists, 0) + coalesce(stats_shorthanded_assists, 0) + coalesce(goalie_stats_assists, 0) + coalesce(stats_goals, 0) + coalesce(stats_power_play_goals, 0) + coalesce(stats_shorthanded_goals, 0) + coalesce(goalie_stats_goals, 0) points,
-stats_time_on_ice::interval + stats_event_time_on_ice::interval +  stats_shorthanded_time_on_ice::interval + goalie_stats_time_on_ice::interval time_on_ice
-from {{ ref('player_game_stats') }}
+id,
+(array_agg(team_name order by game_date desc nulls last, loaded_at desc))[1] team_name,
+(array_agg(full_name order by game_date desc nulls last, loaded_at desc))[1] full_name,
+sum(assists) assists,
+sum(goals) goals,
+sum(points) points,
+sum(time_on_ice) time_on_ice,
+count(*) games_played,
+max(loaded_at) last_loaded_at
+from {{ ref('player_game_points') }}
+{% if is_incremental() %}
+where id in (
+    select id
+    from {{ ref('player_game_points') }}
+    where loaded_at > (select coalesce(max(last_loaded_at), '-infinity') from {{ this }})
+)
+{% endif %}
+group by id
@@ -0,0 +1,20 @@
+{{ config(materialized='incremental', unique_key='player_game_id') }}
+
+-- one row per player per game, folded in incrementally: each run only reads rows loaded since the
+-- previous one, and a reloaded game replaces its earlier rows through player_game_id
+select
+nhl_player_id || '-' || coalesce(game_id::text, 'unknown') player_game_id,
+nhl_player_id as id,
+game_id,
+game_date,
+game_team_name team_name,
+full_name,
+coalesce(stats_assists, 0) + coalesce(stats_power_play_assists, 0) + coalesce(stats_shorthanded_assists, 0) + coalesce(goalie_stats_assists, 0) assists,
+coalesce(stats_goals, 0) + coalesce(stats_power_play_goals, 0) + coalesce(stats_shorthanded_goals, 0) + coalesce(goalie_stats_goals, 0) goals,
+coalesce(stats_assists, 0) + coalesce(stats_power_play_assists, 0) + coalesce(stats_shorthanded_assists, 0) + coalesce(goalie_stats_assists, 0) + coalesce(stats_goals, 0) + coalesce(stats_power_play_goals, 0) + coalesce(stats_shorthanded_goals, 0) + coalesce(goalie_stats_goals, 0) points,
+coalesce(stats_time_on_ice, 0) + coalesce(goalie_stats_time_on_ice, 0) time_on_ice,
+loaded_at
+from {{ ref('player_game_stats') }}
+{% if is_incremental() %}
+where loaded_at > (select coalesce(max(loaded_at), '-infinity') from {{ this }})
+{% endif %}
@@ -1,4 +1,7 @@
 select
+        game_id,
+        game_date,
+        loaded_at,
         player_person_id as nhl_player_id,
         side,
         player_person_fullName full_name,
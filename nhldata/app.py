@@ -9,36 +9,148 @@ automomously.  So feel free to add anywhere (not hinted, this is where we see yo
     * messaging for monitoring or troubleshooting
     * anything else you think is necessary to have for restful nights
 '''
+import time
+import random
 import logging
-from io import StringIO
+import threading
 from pathlib import Path
-from datetime import datetime
-from dataclasses import dataclass
-import boto3
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import pandas as pd
-from botocore.config import Config
-from dateutil.parser import parse as dateparse
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
 
+from nhldata.cache import ResponseCache
 from nhldata.parser import NhlParser
-from nhldata.schema import NHL_SCHEMA
-from nhldata.strategy import NHL_PARSING_STRATEGY
+from nhldata.schema import NHL_SCHEMA, NHL_COLUMN_TYPES
+from nhldata.formats import CsvFormat, OUTPUT_FORMATS
+from nhldata.upload import UploadExecutor
+from nhldata.manifest import GameManifest
+from nhldata.metrics import Metrics
+from nhldata.players import PlayerDimension, PlayerStorageKey
+from nhldata.raw import RawArchive
+from nhldata.strategy import NHL_PARSING_STRATEGY, SCHEMA_PARSING_STRATEGY, FINAL_STATE
 
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 
+class RateLimiter():
+    '''
+    spaces out requests shared by every crawler thread.
+
+    When the api answers with a 429 everyone waits out the Retry-After delay and the spacing between
+    requests doubles; each successful request then relaxes the spacing back towards the configured rate.
+    '''
+    MIN_INTERVAL = 0.05
+    RECOVERY = 0.9
+
+    def __init__(self, rate: float = None):
+        self._base_interval = 1.0 / rate if rate else 0.0
+        self._interval = self._base_interval
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_allowed - now)
+            self._next_allowed = max(now, self._next_allowed) + self._interval
+
+        if wait:
+            time.sleep(wait)
+
+    def throttle(self, delay: float) -> None:
+        with self._lock:
+            self._interval = max(self._interval * 2, self.MIN_INTERVAL)
+            self._next_allowed = max(self._next_allowed, time.monotonic() + delay)
+
+    def relax(self) -> None:
+        with self._lock:
+            self._interval *= self.RECOVERY
+
+            if self._interval < max(self._base_interval, self.MIN_INTERVAL):
+                self._interval = self._base_interval
+
+
+def _retry_after(response) -> float:
+    ''' seconds to wait according to a Retry-After header, which is either a delay or an http date '''
+    value = response.headers.get('Retry-After')
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+
+
 class NHLApi:
     SCHEMA_HOST = "https://statsapi.web.nhl.com/"
     VERSION_PREFIX = "api/v1"
-
-    def __init__(self, base=None):
+    SCHEDULE_TTL = 300
+    # hydrates every game of a schedule with its boxscore
+    BOXSCORE_EXPAND = 'schedule.boxscore'
+
+    def __init__(self, base=None, retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 timeout: float = 10.0, pool_size: int = 10, rate_limit: float = None,
+                 on_request=None, session: requests.Session = None, cache: ResponseCache = None,
+                 metrics: Metrics = None):
+        '''
+        retries      -- extra attempts for timeouts, connection errors, 5xx and 429 responses
+        backoff      -- base delay in seconds for exponential backoff with full jitter
+        rate_limit   -- max requests per second across all threads, None for no limit
+        on_request   -- optional hook called as on_request(url, status, elapsed, attempt) after every attempt,
+                        status is None when no response was received
+        cache        -- optional ResponseCache, final boxscores are kept forever and schedules for SCHEDULE_TTL
+        metrics      -- Metrics collecting request latencies, statuses, retries and cache hits
+
+        conditional requests send back the ETag and Last-Modified validators of the previous response for
+        the same url, and get None instead of a payload when the api answers 304 Not Modified.
+        '''
         self.base = base if base else f'{self.SCHEMA_HOST}/{self.VERSION_PREFIX}'
-
-
-    def schedule(self, start_date: datetime, end_date: datetime) -> dict:
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.on_request = on_request
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.cache = cache
+        self.metrics = metrics if metrics else Metrics()
+
+        if session is None:
+            # keep-alive connections are reused across requests, one pool slot per crawler thread
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+        self._session = session
+        # url and params -> validators of the last response to a conditional request
+        self._validators = {}
+
+
+    def schedule(self, start_date: datetime, end_date: datetime, expand: str = None,
+                 conditional: bool = False) -> dict:
         '''
+        expand asks for extra data in every game, e.g. BOXSCORE_EXPAND.  A conditional request returns None
+        when the schedule hasn't changed since the last conditional one.
+
         returns a dict tree structure that is like
             "dates": [
                 {
@@ -53,12 +165,16 @@ class NHLApi:
         '''
         LOG.info("Attempting to fetch NHL game schedules from {} to {}".format(start_date, end_date))
 
+        params = {'startDate': start_date.strftime('%Y-%m-%d'), 'endDate': end_date.strftime('%Y-%m-%d')}
+
+        if expand:
+            params['expand'] = expand
+
         try:
-            result = self._get(
-                self._url('schedule'),
-                {'startDate': start_date.strftime('%Y-%m-%d'),
-                 'endDate': end_date.strftime('%Y-%m-%d')}
-            )
+            if conditional:
+                result = self._conditional_get('schedule', params)
+            else:
+                result = self._cached_get('schedule', params, ttl=self.SCHEDULE_TTL)
 
         except Exception:
             LOG.error("Failed to fetch NHL game schedules from {} to {}".format(start_date, end_date), exc_info=True)
@@ -67,8 +183,12 @@ class NHLApi:
 
         return result
 
-    def boxscore(self, game_id):
+    def boxscore(self, game_id, final: bool = False, conditional: bool = False):
         '''
+        final games never change so their boxscores are served from the cache, when there is one.  A
+        conditional request skips the cache and returns None when the boxscore hasn't changed since the
+        last conditional one.
+
         returns a dict tree structure that is like
            "teams": {
                 "home": {
@@ -87,10 +207,11 @@ class NHLApi:
         '''
         LOG.info("Attempting to fetch boxscore for game {}".format(game_id))
 
-        url = self._url(f'game/{game_id}/boxscore')
-
         try:
-            result = self._get(url)
+            if conditional:
+                result = self._conditional_get(f'game/{game_id}/boxscore')
+            else:
+                result = self._cached_get(f'game/{game_id}/boxscore', cacheable=final)
         except Exception:
             LOG.error("Unable to fetch boxscore for game {}".format(game_id))
 
@@ -98,81 +219,763 @@ class NHLApi:
 
         return result
 
-    def _get(self, url, params=None):
-        response = requests.get(url, params=params, timeout=10.0)
-        response.raise_for_status()
+    def _cached_get(self, path, params=None, cacheable=True, ttl=None):
+        url = self._url(path)
+
+        if not self.cache or not cacheable:
+            return self._get(url, params)
+
+        # keyed by the full url, so crawls of different api bases (e.g. a replay server) never share entries
+        result = self.cache.get(url, params)
+
+        if result is not None:
+            LOG.debug("Serving {} from the response cache".format(path))
+            self.metrics.inc('nhl_api_cache_hits_total', endpoint=_endpoint(path))
+            return result
+
+        result = self._get(url, params)
+
+        if result:
+            self.cache.put(url, params, result, ttl=ttl)
+
+        return result
+
+    def _conditional_get(self, path, params=None):
+        url = self._url(path)
+        key = (url, tuple(sorted((params or {}).items())))
+
+        response = self._request(url, params, headers=self._validators.get(key))
+
+        if response.status_code == 304:
+            self.metrics.inc('nhl_api_not_modified_total', endpoint=_endpoint(path))
+            return None
+
+        validators = {}
+
+        if response.headers.get('ETag'):
+            validators['If-None-Match'] = response.headers['ETag']
+
+        if response.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+
+        if validators:
+            self._validators[key] = validators
+        else:
+            self._validators.pop(key, None)
+
         return response.json()
 
+    def _get(self, url, params=None):
+        return self._request(url, params).json()
+
+    def _request(self, url, params=None, headers=None):
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire()
+
+            started = time.monotonic()
+            response = None
+
+            try:
+                response = self._session.get(url, params=params, headers=headers, timeout=self.timeout)
+                error = None
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = e
+
+            self._timed(url, response, time.monotonic() - started, attempt)
+
+            retryable = error is not None or response.status_code == 429 or response.status_code >= 500
+
+            if not retryable or attempt >= self.retries:
+                if error is not None:
+                    raise error
+
+                response.raise_for_status()
+                self.rate_limiter.relax()
+                return response
+
+            delay = self._backoff_delay(attempt)
+            throttled = response is not None and response.status_code == 429
+
+            if throttled:
+                retry_after = _retry_after(response)
+                # a Retry-After of 0 means right away, and no header may hold a worker past max_backoff
+                delay = min(retry_after if retry_after is not None else delay, self.max_backoff)
+
+            LOG.warning("Retrying {} in {:.2f}s after attempt {} failed with {}".format(
+                url, delay, attempt + 1, error if error is not None else response.status_code))
+
+            self.metrics.inc('nhl_api_retries_total', endpoint=_endpoint(url))
+
+            if throttled:
+                # the limiter holds back every thread, this one included, until the delay has passed
+                self.rate_limiter.throttle(delay)
+            else:
+                time.sleep(delay)
+
+            attempt += 1
+
+    def _backoff_delay(self, attempt: int) -> float:
+        ''' full jitter keeps parallel crawler threads from retrying in lock step '''
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _timed(self, url, response, elapsed, attempt):
+        status = response.status_code if response is not None else None
+
+        LOG.debug("GET {} -> {} in {:.3f}s (attempt {})".format(url, status, elapsed, attempt + 1))
+
+        endpoint = _endpoint(url)
+        self.metrics.observe('nhl_api_request_seconds', elapsed, endpoint=endpoint)
+        self.metrics.inc('nhl_api_requests_total', endpoint=endpoint, status=status if status else 'error')
+
+        if self.on_request:
+            self.on_request(url, status, elapsed, attempt)
+
     def _url(self, path):
         return f'{self.base}/{path}'
 
+def _endpoint(path: str) -> str:
+    ''' the api endpoint a url or path is for, without ids, to label metrics with '''
+    return 'boxscore' if path.rstrip('/').endswith('boxscore') else path.rstrip('/').rsplit('/', 1)[-1]
+
 @dataclass
 class StorageKey:
     gameid: str
     playerid: str
 
-    def key(self):
+    def key(self, extension: str = 'csv'):
         ''' renders the s3 key for the given set of properties '''
-        return f'{int(self.playerid)}/{self.gameid}.csv'
+        return f'{int(self.playerid)}/{self.gameid}.{extension}'
+
+@dataclass
+class GameStorageKey:
+    season: str
+    date: str
+    gameid: str
+
+    def key(self, extension: str = 'csv'):
+        ''' every player of one game, partitioned by season and date '''
+        return f'season={self.season}/date={self.date}/{self.gameid}.{extension}'
+
+@dataclass
+class DateStorageKey:
+    season: str
+    date: str
+
+    def key(self, extension: str = 'csv'):
+        ''' every player of every game played on one date '''
+        return f'season={self.season}/date={self.date}/games.{extension}'
 
 class Storage():
-    def __init__(self, dest_bucket, s3_client):
+    '''
+    objects of streaming formats are compressed into a spooled file, kept in memory up to
+    MULTIPART_THRESHOLD bytes and on disk past it, and larger ones such as date layout objects are sent
+    as a multipart upload of MULTIPART_CHUNKSIZE parts.
+    '''
+    MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+    def __init__(self, dest_bucket, s3_client, output_format=None, metrics: Metrics = None):
         self._s3_client = s3_client
         self.bucket = dest_bucket
+        self.output_format = output_format if output_format else CsvFormat()
+        self.metrics = metrics if metrics else Metrics()
+
+    def object_key(self, key: StorageKey) -> str:
+        return key.key(self.output_format.extension)
 
     def store_game(self, key: StorageKey, game_data) -> bool:
-        csv_buffer = StringIO()
-        game_data.to_csv(csv_buffer)
-        self._s3_client.put_object(Bucket=self.bucket, Key=key.key(), Body=csv_buffer.getvalue())
+        if hasattr(self.output_format, 'write'):
+            return self._stream_game(key, game_data)
+
+        with self.metrics.timer('nhl_stage_seconds', stage='serialize'):
+            body = self.output_format.serialize(game_data)
+
+        with self.metrics.timer('nhl_stage_seconds', stage='upload'):
+            self._s3_client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=body,
+                                       ContentType=self.output_format.content_type)
+
+        self.metrics.inc('nhl_objects_stored_total')
+        self.metrics.inc('nhl_bytes_stored_total', len(body))
+        return True
+
+    def _stream_game(self, key: StorageKey, game_data) -> bool:
+        from tempfile import SpooledTemporaryFile
+
+        with SpooledTemporaryFile(max_size=self.MULTIPART_THRESHOLD) as body:
+            with self.metrics.timer('nhl_stage_seconds', stage='serialize'):
+                self.output_format.write(game_data, body)
+
+            size = body.tell()
+            body.seek(0)
+
+            with self.metrics.timer('nhl_stage_seconds', stage='upload'):
+                self.upload(self.object_key(key), body, size, ContentType=self.output_format.content_type,
+                            ContentEncoding=self.output_format.content_encoding)
+
+        self.metrics.inc('nhl_objects_stored_total')
+        self.metrics.inc('nhl_bytes_stored_total', size)
+        return True
+
+    def upload(self, key: str, fileobj, size: int, **extra_args) -> None:
+        ''' writes size bytes from fileobj, in parts once they pass MULTIPART_THRESHOLD '''
+        if size < self.MULTIPART_THRESHOLD:
+            self._s3_client.put_object(Bucket=self.bucket, Key=key, Body=fileobj, **extra_args)
+            return
+
+        from boto3.s3.transfer import TransferConfig
+
+        config = TransferConfig(multipart_threshold=self.MULTIPART_THRESHOLD, multipart_chunksize=self.MULTIPART_CHUNKSIZE)
+        self._s3_client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra_args, Config=config)
+
+    def read_object(self, key: str) -> bytes:
+        ''' body of the object at key, None when there is no such object '''
+        return self.read_object_version(key)[0]
+
+    def read_object_version(self, key: str) -> tuple:
+        ''' (body, ETag) of the object at key, (None, None) when there is no such object '''
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self._s3_client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None, None
+
+            raise
+
+        return response['Body'].read(), response.get('ETag')
+
+    def write_object(self, key: str, body, **kwargs) -> None:
+        self._s3_client.put_object(Bucket=self.bucket, Key=key, Body=body, **kwargs)
+
+    def write_object_if(self, key: str, body, etag: str, **kwargs) -> bool:
+        '''
+        writes the object only if it still has the ETag it was read with, or doesn't exist yet when etag is
+        None.  False when another writer changed it in between.
+        '''
+        from botocore.exceptions import ClientError
+
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+
+        try:
+            self._s3_client.put_object(Bucket=self.bucket, Key=key, Body=body, **condition, **kwargs)
+        except ClientError as e:
+            # 409 when a concurrent conditional write to the same key is still in progress
+            if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict',
+                                                           '412', '409'):
+                return False
+
+            raise
+
         return True
 
+    def list_objects(self, prefix: str = ''):
+        ''' the listing entry, with Key, ETag and Size, of every object under prefix '''
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get('Contents', [])
+
+    def delete_objects(self, keys: list) -> None:
+        # a DeleteObjects request takes at most 1000 keys
+        for start in range(0, len(keys), 1000):
+            self._s3_client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True})
+
+@dataclass
+class CrawlResult:
+    succeeded: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    failed_uploads: dict = field(default_factory=dict)
+    skipped: list = field(default_factory=list)
+    # the schedule, or part of it, couldn't be fetched, as opposed to a range without games
+    schedule_failed: bool = False
+
 class Crawler():
-    def __init__(self, api: NHLApi, storage: Storage, version: str):
+    '''
+    layout picks how rows land in storage:
+        player -- one object per player per game, {playerid}/{gameid}.csv
+        game   -- one object per game, season={season}/date={date}/{gameid}.csv
+        date   -- one object per schedule date, season={season}/date={date}/games.csv
+
+    with an uploader, objects are written in the background and a game counts as succeeded once it is
+    queued; uploads that fail are reported per key in CrawlResult.failed_uploads.
+
+    with a manifest the crawl is incremental: games already landed as final are skipped, and games whose
+    boxscore hasn't changed since they landed aren't rewritten.  With the date layout a date is refetched
+    as a whole since its object holds every game of the date.
+
+    with hydrate the schedule is requested with every game's boxscore embedded, hydrate_days days at a
+    time, so a window costs a few large requests instead of one per game.  Games whose embedded boxscore
+    is missing or incomplete fall back to their own boxscore request.
+
+    with an archive the raw schedule and boxscore json is kept in the bucket as well, and a game only
+    succeeds once its boxscore is archived.
+
+    with players the static player_person_* attributes are split off: each game's rows are stored
+    without them, but for the player's name and team at the time of the game, and a player's attributes
+    are written to players/{playerid}.csv only when they changed.
+    '''
+    LAYOUTS = ('player', 'game', 'date')
+
+    def __init__(self, api: NHLApi, storage: Storage, version: str, workers: int = 1, layout: str = 'player',
+                 uploader: UploadExecutor = None, manifest: GameManifest = None, players: PlayerDimension = None,
+                 metrics: Metrics = None, on_stage=None, hydrate: bool = False, hydrate_days: int = 7,
+                 archive: RawArchive = None):
+        if layout not in self.LAYOUTS:
+            raise ValueError("Unknown storage layout {}, expected one of {}".format(layout, ', '.join(self.LAYOUTS)))
+
         self.api = api
         self.storage = storage
-        self.parser = NhlParser(NHL_PARSING_STRATEGY[version], NHL_SCHEMA[version])
+        self.parser = NhlParser(NHL_PARSING_STRATEGY.get(version, SCHEMA_PARSING_STRATEGY), NHL_SCHEMA[version])
         self.output_cols = self.parser.output_cols
-
-    def crawl(self, startDate: datetime, endDate: datetime) -> None:
+        self.workers = max(1, workers)
+        self.layout = layout
+        self.uploader = uploader
+        self.manifest = manifest
+        self.players = players
+        self.metrics = metrics if metrics else Metrics()
+        # called as on_stage(name) when the schedule, games and uploads stages of a crawl finish
+        self.on_stage = on_stage
+        self.hydrate = hydrate
+        self.hydrate_days = max(1, hydrate_days)
+        self.archive = archive
+
+        self._hydrated = {}
+        self._key_games = defaultdict(set)
+        self._key_players = {}
+
+    def crawl(self, startDate: datetime, endDate: datetime) -> CrawlResult:
         LOG.info("Crawling for NHL data from {} to {}".format(startDate, endDate))
 
-        schedule = self.api.schedule(startDate, endDate)
+        result = CrawlResult()
+        schedule = self._schedule(startDate, endDate, result)
         dates = schedule.get('dates')
 
+        if self.archive and not result.schedule_failed:
+            self._archive_schedule(startDate, endDate, dates or [])
+
+        if result.schedule_failed:
+            LOG.error("Failed to fetch the schedule between {} and {}".format(startDate, endDate))
+
         if not schedule or not dates:
-            LOG.warn("Unable able to find any NHL game data between {} and {}".format(startDate, endDate))
+            LOG.warning("Unable able to find any NHL game data between {} and {}".format(startDate, endDate))
 
         else:
-            game_ids = self.parser.parse_game_id(dates)
+            games = self.parser.parse_games(dates)
 
-            for game_id in game_ids:
-                boxscore = self.api.boxscore(game_id)
-                player_dfs = self.parser.parse_player_info(boxscore, self.output_cols)
+            if self.hydrate:
+                self._hydrated = self.parser.parse_hydrated_boxscores(dates)
 
-                for player_df in player_dfs:
-                    key = StorageKey(game_id, player_df.iloc[0]['player_person_id'])
+                LOG.info("The schedule carried boxscores for {} of {} games".format(len(self._hydrated), len(games)))
 
-                    self.storage.store_game(key, player_df)
+            if self.manifest:
+                games = self._unlanded(games, result)
 
-	# NOTE the data direct from the API is not quite what we want. Its nested in a way we don't want
-	#      so here we are looking for your ability to gently massage a data set. 
-        #TODO error handling
-        #TODO get games for dates
-        #TODO for each game get all player stats: schedule -> date -> teams.[home|away] -> $playerId: wanted_data
-        #TODO output to S3 should be a csv that matches the schema of utils/create_games_stats 
+            self._stage('schedule')
+
+            # each game is fetched, parsed and stored independently, so a pool of threads can keep
+            # several boxscore requests in flight while one failing game never affects the others
+            if self.workers > 1:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawler') as executor:
+                    self._collect(games, executor.map(self._crawl_game, games), result)
+            else:
+                self._collect(games, map(self._crawl_game, games), result)
+
+            self._stage('games')
+            self._hydrated = {}
+
+            if self.uploader:
+                result.failed_uploads = self.uploader.flush()
+                self._fail_uploaded_games(result)
+                self._stage('uploads')
+
+            if self.manifest:
+                self.manifest.save()
+
+            if self.players:
+                self.players.save()
+
+            LOG.info("Crawled {} of {} games between {} and {}, skipped {} already landed".format(
+                len(result.succeeded), len(games), startDate, endDate, len(result.skipped)))
+
+            self.metrics.inc('nhl_games_total', len(result.succeeded), outcome='succeeded')
+            self.metrics.inc('nhl_games_total', len(result.failed), outcome='failed')
+            self.metrics.inc('nhl_games_total', len(result.skipped), outcome='skipped')
+            self.metrics.inc('nhl_failed_uploads_total', len(result.failed_uploads))
+
+            if result.failed_uploads:
+                LOG.error("Failed to upload {} objects: {}".format(
+                    len(result.failed_uploads), ', '.join(sorted(result.failed_uploads))))
+
+            if result.failed:
+                LOG.error("Failed to crawl games: {}".format(', '.join(str(game_id) for game_id in result.failed)))
+
+        return result
+
+    def plan(self, startDate: datetime, endDate: datetime, extension: str = 'csv') -> list:
+        '''
+        object keys a crawl of the range would write, without parsing or storing anything.  Only the
+        player layout fetches boxscores, to learn who played.
+        '''
+        schedule = self.api.schedule(startDate, endDate)
+        keys = {}
+
+        for game in self.parser.parse_games(schedule.get('dates') or []):
+            if self.layout == 'game':
+                keys[GameStorageKey(game.season, game.date, game.id).key(extension)] = game.id
+
+            elif self.layout == 'date':
+                keys[DateStorageKey(game.season, game.date).key(extension)] = game.date
+
+            else:
+                boxscore = self.api.boxscore(game.id, final=game.state == FINAL_STATE)
+
+                for team in boxscore.get('teams', {}).values():
+                    for player in team.get('players', {}).values():
+                        keys[StorageKey(game.id, player['person']['id']).key(extension)] = game.id
+
+        return list(keys)
+
+    def _archive_schedule(self, startDate: datetime, endDate: datetime, dates: list) -> None:
+        try:
+            self.archive.store_schedule(dates, startDate, endDate)
+        except Exception:
+            LOG.error("Failed to archive the schedule, its games can't be reparsed until it is crawled again",
+                      exc_info=True)
+            self.metrics.inc('nhl_archive_failures_total', kind='schedule')
+
+    def _schedule(self, startDate: datetime, endDate: datetime, result: CrawlResult) -> dict:
+        ''' the api answers {} when the schedule couldn't be fetched, a range without games has no dates '''
+        if not self.hydrate:
+            schedule = self.api.schedule(startDate, endDate)
+            result.schedule_failed = not schedule
+
+            return schedule
+
+        schedule = {}
+        dates = []
+        window_start = startDate
+
+        while window_start <= endDate:
+            window_end = min(window_start + timedelta(days=self.hydrate_days - 1), endDate)
+            window = self.api.schedule(window_start, window_end, expand=NHLApi.BOXSCORE_EXPAND)
+
+            if not window:
+                LOG.warning("No hydrated schedule from {} to {}, falling back to the plain one".format(
+                    window_start, window_end))
+                window = self.api.schedule(window_start, window_end)
+
+            if not window:
+                result.schedule_failed = True
+
+            schedule = schedule or window
+            dates.extend(window.get('dates') or [])
+            window_start = window_end + timedelta(days=1)
+
+        return dict(schedule, dates=dates) if schedule else {}
+
+    def close(self) -> None:
+        if self.uploader:
+            self.uploader.close()
+
+    def _stage(self, name: str) -> None:
+        if self.on_stage:
+            self.on_stage(name)
+
+    def _unlanded(self, games: list, result: CrawlResult) -> list:
+        if self.layout == 'date':
+            fetch_dates = {game.date for game in games if self.manifest.should_fetch(game)}
+            fetch = [game for game in games if game.date in fetch_dates]
+        else:
+            fetch = [game for game in games if self.manifest.should_fetch(game)]
+
+        fetch_ids = {game.id for game in fetch}
+        result.skipped.extend(game.id for game in games if game.id not in fetch_ids)
+
+        return fetch
+
+    def _fail_uploaded_games(self, result: CrawlResult) -> None:
+        failed = set()
+
+        for object_key in result.failed_uploads:
+            failed.update(self._key_games.get(object_key, ()))
+
+        if self.players:
+            self.players.discard(
+                self._key_players[object_key] for object_key in result.failed_uploads if object_key in self._key_players
+            )
+
+        self._key_games.clear()
+        self._key_players.clear()
+
+        if not failed:
+            return
+
+        result.succeeded = [game_id for game_id in result.succeeded if game_id not in failed]
+        result.failed.extend(sorted(failed - set(result.failed)))
+
+        if self.manifest:
+            self.manifest.discard(failed)
+
+    def _collect(self, games: list, outcomes, result: CrawlResult) -> None:
+        '''
+        records the outcome of every game as it completes. Outcomes arrive in schedule order, so with the
+        date layout a date is written as soon as its last game is in while later games are still fetched.
+        A date with a failed game isn't written at all, its object would replace the one already landed
+        without that game's rows, and every game of the date fails with it.
+        '''
+        remaining = Counter(game.date for game in games)
+        date_games = defaultdict(list)
+        date_frames = defaultdict(list)
+        # date -> its failed games
+        failed_dates = defaultdict(list)
+
+        for game, (succeeded, game_df) in zip(games, outcomes):
+            if self.layout != 'date':
+                (result.succeeded if succeeded else result.failed).append(game.id)
+                continue
+
+            if succeeded:
+                date_games[game.date].append(game)
+            else:
+                result.failed.append(game.id)
+                failed_dates[game.date].append(game.id)
+
+            if game_df is not None:
+                date_frames[game.date].append(game_df)
+
+            remaining[game.date] -= 1
+
+            if not remaining[game.date]:
+                crawled = [crawled_game.id for crawled_game in date_games.pop(game.date, [])]
+                frames = date_frames.pop(game.date, [])
+
+                failed = failed_dates.pop(game.date, [])
+
+                if failed:
+                    LOG.error("Not writing the games of {}, {} of them failed".format(game.date, len(failed)))
+                    stored = False
+                else:
+                    stored = self._store_date(game, frames, crawled)
+
+                (result.succeeded if stored else result.failed).extend(crawled)
+
+                if not stored and self.manifest:
+                    self.manifest.discard(crawled + failed)
+
+    def _crawl_game(self, game) -> tuple:
+        ''' returns whether the game succeeded and, for the date layout, its still unstored frame '''
+        game_id = game.id
+
+        boxscore = self._hydrated.pop(game_id, None)
+
+        if boxscore is not None:
+            self.metrics.inc('nhl_boxscores_total', source='schedule')
+        else:
+            with self.metrics.timer('nhl_stage_seconds', stage='fetch'):
+                boxscore = self.api.boxscore(game_id, final=game.state == FINAL_STATE)
+
+            self.metrics.inc('nhl_boxscores_total', source='boxscore')
+
+        if not boxscore:
+            LOG.error("No boxscore data for game {}".format(game_id))
+            return False, None
+
+        digest = GameManifest.digest(boxscore) if self.manifest else None
+
+        if digest and self.layout != 'date' and self.manifest.unchanged(game, digest):
+            LOG.info("Boxscore for game {} is unchanged since it landed, skipping it".format(game_id))
+            # its state may still have moved on, e.g. a game that landed live and is now final
+            self.manifest.record(game, self.manifest.entries[str(game_id)]['rows'], digest)
+            return True, None
+
+        try:
+            if self.archive:
+                with self.metrics.timer('nhl_stage_seconds', stage='archive'):
+                    self.archive.store_boxscore(game, boxscore)
+
+            with self.metrics.timer('nhl_stage_seconds', stage='parse'):
+                game_df = self.parser.parse_game_frame(boxscore, game)
+
+            if game_df is not None:
+                self.metrics.inc('nhl_rows_total', len(game_df))
+
+            if game_df is None:
+                LOG.warning("No players found in boxscore for game {}".format(game_id))
+
+            elif self.players:
+                game_df = self._split_players(game, game_df)
+
+            if game_df is not None and self.layout != 'date':
+                self._store_game(game, game_df)
+
+        except Exception:
+            LOG.error("Failed to parse or store game {}".format(game_id), exc_info=True)
+            return False, None
+
+        if self.manifest:
+            self.manifest.record(game, len(game_df) if game_df is not None else 0, digest)
+
+        return True, game_df if self.layout == 'date' else None
+
+    def _store_game(self, game, game_df) -> None:
+        if self.layout == 'game':
+            self._store(GameStorageKey(game.season, game.date, game.id), game_df, [game.id])
+            return
+
+        for index, player_id in enumerate(game_df['player_person_id']):
+            key = StorageKey(game.id, player_id)
+
+            self._store(key, game_df.iloc[index:index + 1], [game.id])
+
+    def _split_players(self, game, game_df):
+        ''' stores the players whose attributes changed and returns the game's rows without attributes '''
+        changed, game_df = self.players.split(game_df, game.date)
+
+        for index, player_id in enumerate(changed['player_person_id']):
+            key = PlayerStorageKey(player_id)
+
+            if self.uploader:
+                self._key_players[self.storage.object_key(key)] = player_id
+
+            self._store(key, changed.iloc[index:index + 1], [game.id])
+
+        self.players.record(changed, game.date)
+
+        return game_df
+
+    def _store_date(self, game, frames: list, game_ids: list) -> bool:
+        if not frames:
+            return True
+
+        import pandas as pd
+
+        try:
+            self._store(DateStorageKey(game.season, game.date), pd.concat(frames, ignore_index=True), game_ids)
+        except Exception:
+            LOG.error("Failed to store games for {}".format(game.date), exc_info=True)
+            return False
+
+        return True
+
+    def _store(self, key, data, game_ids: list) -> None:
+        if self.uploader:
+            # remembered so a failed background upload can be traced back to the games it held
+            self._key_games[self.storage.object_key(key)].update(game_ids)
+            self.uploader.submit(key, data)
+        else:
+            self.storage.store_game(key, data)
+
+def add_crawler_arguments(parser) -> None:
+    parser.add_argument("--version", default="v3", type=str)
+    parser.add_argument("--api_base", default=None, type=str,
+                        help="NHL api base url, e.g. a local nhldata.replay server for load tests")
+    parser.add_argument("--workers", default=1, type=int,
+                        help="number of games to fetch, parse and store concurrently")
+    parser.add_argument("--rate_limit", default=None, type=float,
+                        help="max NHL api requests per second, unlimited by default")
+    parser.add_argument("--cache_dir", default=None, type=str,
+                        help="directory for a local response cache, disabled by default")
+    parser.add_argument("--cache_size_mb", default=512, type=int)
+    parser.add_argument("--layout", default="player", choices=Crawler.LAYOUTS,
+                        help="write one object per player per game, per game or per schedule date")
+    parser.add_argument("--format", default="csv", choices=sorted(OUTPUT_FORMATS),
+                        help="serialization of the stored objects, csv.gz and csv.zst are compressed as they are "
+                             "written and parquet carries typed columns")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip games the bucket's manifest already holds as final")
+    parser.add_argument("--upload_workers", default=0, type=int,
+                        help="upload in the background on this many threads, 0 uploads inline")
+    parser.add_argument("--max_pending_uploads", default=64, type=int)
+    parser.add_argument("--hydrate", action="store_true",
+                        help="read boxscores from a hydrated schedule, fetching games one by one only as a fallback")
+    parser.add_argument("--hydrate_days", default=7, type=int, help="days of hydrated schedule per request")
+    parser.add_argument("--archive_raw", action="store_true",
+                        help="keep the raw schedule and boxscore json under raw/ so nhldata.reparse can rebuild output")
+    parser.add_argument("--split_players", action="store_true",
+                        help="write player attributes once per player under players/ instead of on every row")
+
+def build_storage(args, metrics: Metrics = None) -> Storage:
+    import os
+    import boto3
+    from botocore.config import Config
+
+    dest_bucket = os.environ.get('DEST_BUCKET', 'output')
+
+    s3config = Config(signature_version='s3v4', max_pool_connections=max(10, args.workers + args.upload_workers))
+    s3client = boto3.client('s3', config=s3config, endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+
+    output_format = OUTPUT_FORMATS[args.format](NHL_COLUMN_TYPES.get(args.version, {}))
+
+    return Storage(dest_bucket, s3client, output_format, metrics)
+
+def build_crawler(args, on_stage=None) -> Crawler:
+    ''' wires the api, storage, uploader, manifest, player dimension and raw archive together from the parsed command line '''
+    cache = ResponseCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024) if args.cache_dir else None
+
+    metrics = Metrics()
+    api = NHLApi(args.api_base, pool_size=max(10, args.workers), rate_limit=args.rate_limit, cache=cache,
+                 metrics=metrics)
+
+    storage = build_storage(args, metrics)
+    uploader = UploadExecutor(storage, args.upload_workers, args.max_pending_uploads) if args.upload_workers else None
+    manifest = GameManifest(storage).load() if args.incremental else None
+    players = PlayerDimension(storage).load() if args.split_players else None
+    archive = RawArchive(storage) if args.archive_raw else None
+
+    return Crawler(api, storage, args.version, workers=args.workers, layout=args.layout,
+                   uploader=uploader, manifest=manifest, players=players, metrics=metrics, on_stage=on_stage,
+                   hydrate=args.hydrate, hydrate_days=args.hydrate_days, archive=archive)
+
+def write_reports(metrics: Metrics, args, result: CrawlResult = None) -> None:
+    ''' the run report and Prometheus textfile, a run that crashed reports no result '''
+    stages = {
+        stage: metrics.histogram('nhl_stage_seconds', stage=stage)
+        for stage in ('fetch', 'archive', 'parse', 'serialize', 'upload')
+    }
+
+    LOG.info("Stage totals: {}".format(', '.join(
+        '{} {:.2f}s over {}'.format(stage, histogram.sum, histogram.count)
+        for stage, histogram in stages.items() if histogram)))
+
+    if not args.report_dir:
+        return
 
-def main():
     import os
+
+    info = {'start_date': args.start_date, 'end_date': args.end_date, 'version': args.version,
+            'layout': args.layout, 'format': args.format, 'workers': args.workers, 'completed': result is not None}
+
+    if result is not None:
+        info.update(succeeded=len(result.succeeded), failed=result.failed, skipped=len(result.skipped),
+                    failed_uploads=sorted(result.failed_uploads), schedule_failed=result.schedule_failed)
+
+    metrics.write_report(os.path.join(args.report_dir, 'run_report.json'), **info)
+    metrics.write_prometheus(os.path.join(args.report_dir, 'nhldata.prom'))
+
+    LOG.info("Wrote the run report to {}".format(args.report_dir))
+
+def main():
     import argparse
 
     parser = argparse.ArgumentParser(description='NHL Stats crawler')
     parser.add_argument("--start_date", default="2020-08-04", type=str)
     parser.add_argument("--end_date", default="2020-08-05", type=str)
-    parser.add_argument("--version", default="v1", type=str)
+    parser.add_argument("--report_dir", default=None, type=str,
+                        help="write run_report.json and a nhldata.prom Prometheus textfile here at exit")
+    parser.add_argument("--dry_run", "--list_games", action="store_true",
+                        help="print the object keys the crawl would write and exit, without parsing or storing")
+    parser.add_argument("--profile", action="store_true",
+                        help="write a cProfile of every thread and its top functions next to the run report")
+    parser.add_argument("--profile_memory", action="store_true",
+                        help="write tracemalloc snapshots of each crawl stage and their top allocations")
+    parser.add_argument("--profile_top", default=25, type=int, help="entries per profile summary table")
+    add_crawler_arguments(parser)
     args = parser.parse_args()
 
-    version = args.version
-
     raw_start_date = args.start_date
     #raw_start_date = "2020-08-04"
     raw_end_date = args.end_date
@@ -181,15 +984,40 @@ def main():
     startDate = datetime.strptime(raw_start_date, "%Y-%m-%d")
     endDate = datetime.strptime(raw_end_date, "%Y-%m-%d")
 
-    dest_bucket = os.environ.get('DEST_BUCKET', 'output')
+    if args.dry_run:
+        # no storage is built, so neither boto3 nor pandas get imported
+        api = NHLApi(args.api_base, rate_limit=args.rate_limit)
+        keys = Crawler(api, None, args.version, layout=args.layout).plan(
+            startDate, endDate, OUTPUT_FORMATS[args.format].extension)
+
+        print('\n'.join(keys))
+        LOG.info("A crawl from {} to {} would write {} objects".format(raw_start_date, raw_end_date, len(keys)))
+        return
+
+    profiler = None
+
+    if args.profile or args.profile_memory:
+        from nhldata.profiling import Profiler
+
+        args.report_dir = args.report_dir or 'reports'
+        # started first so the uploader threads built with the crawler are profiled too
+        profiler = Profiler(args.report_dir, cpu=args.profile, memory=args.profile_memory, top=args.profile_top).start()
+
+    crawler = build_crawler(args, on_stage=profiler.stage if profiler else None)
+    result = None
+
+    try:
+        result = crawler.crawl(startDate, endDate)
+    finally:
+        crawler.close()
 
-    api = NHLApi()
+        if profiler:
+            profiler.stop()
 
-    s3client = boto3.client('s3', config=Config(signature_version='s3v4'), endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+        write_reports(crawler.metrics, args, result)
 
-    storage = Storage(dest_bucket, s3client)
-    crawler = Crawler(api, storage, version)
-    crawler.crawl(startDate, endDate)
+    if result.schedule_failed or result.failed or result.failed_uploads:
+        raise SystemExit(1)
 
 if __name__ == '__main__':
     main()
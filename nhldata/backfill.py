@@ -0,0 +1,163 @@
+'''
+Backfills a long date range by splitting it into windows crawled across worker processes.
+
+Completed windows are checkpointed in the destination bucket, so rerunning the same backfill after an
+interruption only crawls the windows that didn't finish.  A window with failed games, or whose schedule
+couldn't be fetched, isn't checkpointed and is retried by the next run.
+
+    python -m nhldata.backfill --start_date 2018-10-01 --end_date 2020-09-30 --window_days 7 --processes 4
+'''
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from nhldata.app import add_crawler_arguments, build_crawler, build_storage
+
+
+LOG = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def split_windows(start_date: datetime, end_date: datetime, window_days: int) -> list:
+    ''' consecutive, inclusive (start, end) windows of at most window_days days covering the range '''
+    windows = []
+    window_start = start_date
+
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+
+    return windows
+
+
+def window_name(window: tuple) -> str:
+    return '{}_{}'.format(window[0].strftime(DATE_FORMAT), window[1].strftime(DATE_FORMAT))
+
+
+class Checkpoint():
+    ''' json object in the destination bucket listing the windows a backfill has completed '''
+    PREFIX = '_backfill'
+
+    def __init__(self, storage, start_date: datetime, end_date: datetime, window_days: int, prefix: str = PREFIX):
+        self.storage = storage
+        self.key = '{}/{}_{}_{}d.json'.format(
+            prefix, start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT), window_days)
+        self.completed = set()
+
+    def load(self) -> 'Checkpoint':
+        body = self.storage.read_object(self.key)
+        self.completed = set(json.loads(body)['completed']) if body else set()
+
+        return self
+
+    def mark_done(self, window: tuple) -> None:
+        self.completed.add(window_name(window))
+        body = json.dumps({'completed': sorted(self.completed)})
+
+        self.storage.write_object(self.key, body, ContentType='application/json')
+
+    def is_done(self, window: tuple) -> bool:
+        return window_name(window) in self.completed
+
+
+_crawler = None
+
+def _init_worker(args, build) -> None:
+    ''' one crawler per process, so its http session and s3 client are reused across windows '''
+    global _crawler
+    _crawler = build(args)
+
+def _crawl_window(window: tuple) -> tuple:
+    if _crawler.manifest:
+        _crawler.manifest.load()
+
+    if _crawler.players:
+        _crawler.players.load()
+
+    result = _crawler.crawl(*window)
+
+    return len(result.succeeded), result.failed, len(result.failed_uploads), len(result.skipped), result.schedule_failed
+
+
+def backfill(args, build=build_crawler, checkpoint_prefix: str = Checkpoint.PREFIX, storage=None) -> bool:
+    '''
+    build(args) makes each process' crawler, it has to be a module level function so it can be pickled.
+    Runs with a different build keep their own checkpoints under checkpoint_prefix, in storage, the
+    destination bucket by default.
+    '''
+    start_date = datetime.strptime(args.start_date, DATE_FORMAT)
+    end_date = datetime.strptime(args.end_date, DATE_FORMAT)
+
+    windows = split_windows(start_date, end_date, args.window_days)
+    storage = storage if storage else build_storage(args)
+    checkpoint = Checkpoint(storage, start_date, end_date, args.window_days, checkpoint_prefix).load()
+    pending = [window for window in windows if not checkpoint.is_done(window)]
+
+    LOG.info("Backfilling {} to {}: {} windows of {} days, {} already completed".format(
+        args.start_date, args.end_date, len(windows), args.window_days, len(windows) - len(pending)))
+
+    started = time.monotonic()
+    games = 0
+    failed_windows = []
+
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=_init_worker, initargs=(args, build)) as executor:
+        futures = {executor.submit(_crawl_window, window): window for window in pending}
+
+        for done, future in enumerate(as_completed(futures), 1):
+            window = futures[future]
+
+            try:
+                succeeded, failed, failed_uploads, skipped, schedule_failed = future.result()
+            except Exception:
+                LOG.error("Window {} crashed, it will be retried on the next run".format(window_name(window)), exc_info=True)
+                failed_windows.append(window_name(window))
+                continue
+
+            games += succeeded
+
+            if schedule_failed:
+                failed_windows.append(window_name(window))
+                LOG.error("Window {} couldn't fetch its schedule, it will be retried on the next run".format(
+                    window_name(window)))
+
+            elif failed or failed_uploads:
+                failed_windows.append(window_name(window))
+                LOG.error("Window {} failed games {} and {} uploads, it will be retried on the next run".format(
+                    window_name(window), failed, failed_uploads))
+            else:
+                checkpoint.mark_done(window)
+
+            elapsed = time.monotonic() - started
+
+            LOG.info("[{}/{} windows] {} done: {} games, {} skipped, {} total in {:.0f}s ({:.2f} games/s)".format(
+                done, len(pending), window_name(window), succeeded, skipped, games, elapsed,
+                games / elapsed if elapsed else 0.0))
+
+    LOG.info("Backfill finished: {} games in {:.0f}s, {} windows failed".format(
+        games, time.monotonic() - started, len(failed_windows)))
+
+    return not failed_windows
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='NHL Stats backfill')
+    parser.add_argument("--start_date", required=True, type=str)
+    parser.add_argument("--end_date", required=True, type=str)
+    parser.add_argument("--window_days", default=7, type=int,
+                        help="days of schedule crawled by one window")
+    parser.add_argument("--processes", default=4, type=int,
+                        help="number of windows crawled at the same time")
+    add_crawler_arguments(parser)
+    args = parser.parse_args()
+
+    if not backfill(args):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
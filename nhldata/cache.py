@@ -0,0 +1,112 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ResponseCache():
+    '''
+    on disk cache of api responses keyed by endpoint url, api base included, and query params.
+
+    Every entry is a gzipped json file holding the payload and its expiry (None meaning it never expires).
+    A file's mtime doubles as its last access time, so once the cache grows past max_bytes the least
+    recently used entries are evicted first.
+    '''
+    SUFFIX = '.json.gz'
+
+    def __init__(self, directory, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._entries())
+
+    def get(self, endpoint: str, params: dict = None):
+        path = self._path(endpoint, params)
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            LOG.warning("Discarding unreadable cache entry {}".format(path))
+            self._remove(path)
+            return None
+
+        if entry['expires'] is not None and entry['expires'] < time.time():
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry['payload']
+
+    def put(self, endpoint: str, params: dict, payload, ttl: float = None) -> None:
+        ''' stores the payload, ttl is in seconds and None keeps the entry until it is evicted '''
+        path = self._path(endpoint, params)
+        entry = {'expires': time.time() + ttl if ttl is not None else None, 'payload': payload}
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as entry_file:
+            json.dump(entry, entry_file)
+
+        with self._lock:
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._size += path.stat().st_size - previous
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+
+            LOG.debug("Evicting cache entry {}".format(path))
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def _remove(self, path: Path) -> None:
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+
+            self._size -= size
+
+    def _entries(self):
+        return self.directory.glob(f'*{self.SUFFIX}')
+
+    def _path(self, endpoint: str, params: dict = None) -> Path:
+        key = json.dumps([endpoint, sorted((params or {}).items())], default=str)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        return self.directory / f'{digest}{self.SUFFIX}'
@@ -0,0 +1,351 @@
+'''
+Merges the small {playerid}/{gameid}.csv objects of the player layout into one object per season, or
+per date, sorted by game and player.
+
+    python -m nhldata.compact --partition season
+    python -m nhldata.compact --partition date --format csv.zst
+
+Compacted objects are written under compacted/ with a new key on every run, and only become visible
+through _compaction/manifest.json, which lists the current object of every partition and the small
+objects it holds.  The manifest is replaced in a single write, so a reader honoring it (like
+nhldata.loader) sees either the small objects or the object holding them, never both or neither.
+Superseded objects are deleted once they have been out of the manifest for --grace_seconds, leaving
+readers that loaded an older manifest time to finish.
+
+Runs are incremental: only partitions with small objects that are new, or were rewritten since they
+were compacted, are read and rewritten, from their previous compacted object plus those small objects.
+A small object rewritten after its partition was compacted is picked up by the next run, until then
+readers keep seeing its compacted rows.  Only one compaction should run against a bucket at a time.
+'''
+import io
+import re
+import csv
+import json
+import logging
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from nhldata.formats import OUTPUT_FORMATS, decompress
+from nhldata.strategy import season_of
+
+
+LOG = logging.getLogger(__name__)
+
+# the small objects of the player layout, in any of the csv formats
+SMALL_KEY = re.compile(r'^(\d+)/(\d+)\.csv(\.gz|\.zst)?$')
+COMPACTED_PREFIX = 'compacted/'
+
+
+class CompactionManifest():
+    '''
+    json object like
+        {"partitions": {"season=20192020": {"key": "compacted/season=20192020/part-....csv.gz",
+                                            "sources": [["8475683/2019030042.csv", "<etag>", 1], ...],
+                                            "rows": 1, "compacted_at": "..."}},
+         "retired": [["compacted/season=20192020/part-....csv.gz", null, "<retired at>"], ...]}
+
+    sources are the small objects a partition's object holds, with their ETag when compacted and their
+    number of rows, in the order their rows appear.  retired objects are waiting to be deleted.
+    '''
+    KEY = '_compaction/manifest.json'
+
+    def __init__(self, storage, key: str = KEY):
+        self.storage = storage
+        self.key = key
+        self.partitions = {}
+        self.retired = []
+
+    def load(self) -> 'CompactionManifest':
+        body = self.storage.read_object(self.key)
+        entries = json.loads(body) if body else {}
+
+        self.partitions = entries.get('partitions', {})
+        self.retired = entries.get('retired', [])
+
+        LOG.info("Loaded compaction manifest {} with {} partitions".format(self.key, len(self.partitions)))
+
+        return self
+
+    def save(self) -> None:
+        ''' one write, so readers see the whole previous manifest or the whole new one '''
+        entries = {'partitions': self.partitions, 'retired': self.retired}
+
+        self.storage.write_object(self.key, json.dumps(entries, sort_keys=True), ContentType='application/json')
+
+        LOG.info("Saved compaction manifest {} with {} partitions".format(self.key, len(self.partitions)))
+
+    def sources(self) -> dict:
+        ''' small object key -> (partition, etag) for every compacted small object '''
+        return {
+            source: (name, etag)
+            for name, partition in self.partitions.items()
+            for source, etag, _ in partition['sources']
+        }
+
+    @staticmethod
+    def visible(keys, body: bytes) -> list:
+        '''
+        the keys a reader should read given the manifest body, None when there is no manifest: small
+        objects already compacted and compacted objects that aren't current are left out
+        '''
+        keys = list(keys)
+
+        if not body:
+            return [key for key in keys if not key.startswith(COMPACTED_PREFIX)]
+
+        partitions = json.loads(body).get('partitions', {})
+        current = {partition['key'] for partition in partitions.values()}
+        compacted = {source for partition in partitions.values() for source, _, _ in partition['sources']}
+
+        return [
+            key for key in keys
+            if key not in compacted and (not key.startswith(COMPACTED_PREFIX) or key in current)
+        ]
+
+
+@dataclass
+class CompactionResult:
+    partitions: list = field(default_factory=list)
+    objects: int = 0
+    rows: int = 0
+    deleted: int = 0
+    failed: dict = field(default_factory=dict)
+
+
+class Compactor():
+    PARTITIONS = ('season', 'date')
+
+    def __init__(self, storage, partition: str = 'season', output_format: str = 'csv.gz',
+                 grace_seconds: float = 3600.0, readers: int = 8, manifest: CompactionManifest = None):
+        if partition not in self.PARTITIONS:
+            raise ValueError("Unknown partition {}, expected one of {}".format(partition, ', '.join(self.PARTITIONS)))
+
+        self.storage = storage
+        self.partition = partition
+        self.output_format = OUTPUT_FORMATS[output_format]()
+
+        if not hasattr(self.output_format, 'compressor'):
+            raise ValueError("Compacted objects are written as csv.gz or csv.zst, not {}".format(output_format))
+
+        self.grace_seconds = grace_seconds
+        self.readers = max(1, readers)
+        self.manifest = manifest if manifest else CompactionManifest(storage)
+
+    def compact(self) -> CompactionResult:
+        result = CompactionResult()
+        run = datetime.now(timezone.utc)
+        self.manifest.load()
+
+        listing = {
+            entry['Key']: entry['ETag'] for entry in self.storage.list_objects() if SMALL_KEY.match(entry['Key'])
+        }
+        compacted = self.manifest.sources()
+
+        pending = sorted(key for key, etag in listing.items() if compacted.get(key, (None, None))[1] != etag)
+
+        LOG.info("Found {} small objects, {} not compacted yet".format(len(listing), len(pending)))
+
+        retired = []
+
+        for name, sources in sorted(self._partitions(pending, listing, compacted, result).items()):
+            try:
+                previous = self.manifest.partitions.get(name)
+                self.manifest.partitions[name] = self._compact_partition(name, previous, sources, run)
+            except Exception as e:
+                LOG.error("Failed to compact partition {}".format(name), exc_info=True)
+                result.failed[name] = repr(e)
+                continue
+
+            if previous:
+                retired.append([previous['key'], None])
+
+            retired.extend([source, etag] for source, etag, _ in sources if source in listing)
+
+            result.partitions.append(name)
+            result.objects += len(sources)
+            result.rows += self.manifest.partitions[name]['rows']
+
+        expired = self._expired(run, listing)
+        # a source compacted again is retired anew with its current etag
+        replaced = expired | {key for key, _ in retired}
+        self.manifest.retired = [entry for entry in self.manifest.retired if entry[0] not in replaced]
+        self.manifest.retired.extend(entry + [run.isoformat()] for entry in retired)
+
+        if result.partitions or expired:
+            self.manifest.save()
+
+        # only deleted once the manifest no longer points at them
+        self.storage.delete_objects(sorted(expired))
+        result.deleted = len(expired)
+
+        LOG.info("Compacted {} small objects into {} partitions, deleted {} retired objects, {} failed".format(
+            result.objects, len(result.partitions), result.deleted, len(result.failed)))
+
+        return result
+
+    def _partitions(self, pending: list, listing: dict, compacted: dict, result: CompactionResult) -> dict:
+        ''' partition name -> [(source key, etag, (header, rows))] of the pending small objects '''
+        partitions = {}
+
+        for key, body in self._read_all(pending):
+            try:
+                header, rows = _read_csv(body)
+                name = compacted[key][0] if key in compacted else self._partition_of(key, header, rows)
+            except Exception as e:
+                LOG.error("Skipping unreadable object {}".format(key), exc_info=True)
+                result.failed[key] = repr(e)
+                continue
+
+            partitions.setdefault(name, []).append((key, listing[key], (header, rows)))
+
+        return partitions
+
+    def _partition_of(self, key: str, header: list, rows: list) -> str:
+        season = season_of(SMALL_KEY.match(key).group(2))
+
+        if self.partition == 'season':
+            return f'season={season}'
+
+        if 'game_date' not in header or not rows:
+            raise ValueError("date partitions need a game_date column, written by schema v2 and later")
+
+        return f'season={season}/date={rows[0][header.index("game_date")]}'
+
+    def _compact_partition(self, name: str, previous: dict, pending: list, run: datetime) -> dict:
+        ''' writes the partition's new object and returns its manifest entry '''
+        sources = {}
+
+        if previous:
+            header, rows = _read_csv(self.storage.read_object(previous['key']))
+            start = 0
+
+            for source, etag, count in previous['sources']:
+                sources[source] = (etag, header, rows[start:start + count])
+                start += count
+
+        for source, etag, (header, rows) in pending:
+            sources[source] = (etag, header, rows)
+
+        ordered = sorted(sources, key=_game_and_player)
+        columns = _columns(sources[source][1] for source in ordered)
+
+        key = '{}{}/part-{}.{}'.format(
+            COMPACTED_PREFIX, name, run.strftime('%Y%m%dT%H%M%S%f'), self.output_format.extension)
+        size, rows = self._write(key, columns, [sources[source] for source in ordered])
+
+        LOG.info("Compacted {} small objects of {} into {} ({} rows, {} bytes)".format(
+            len(ordered), name, key, rows, size))
+
+        return {
+            'key': key,
+            'sources': [[source, sources[source][0], len(sources[source][2])] for source in ordered],
+            'rows': rows,
+            'compacted_at': run.isoformat()
+        }
+
+    def _write(self, key: str, columns: list, sources: list) -> tuple:
+        from tempfile import SpooledTemporaryFile
+
+        rows = 0
+
+        with SpooledTemporaryFile(max_size=self.storage.MULTIPART_THRESHOLD) as body:
+            with self.output_format.compressor(body) as compressed:
+                text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+                writer = csv.writer(text, lineterminator='\n')
+                writer.writerow(columns)
+
+                for _, header, source_rows in sources:
+                    positions = [header.index(column) if column in header else None for column in columns]
+
+                    for row in source_rows:
+                        writer.writerow(['' if index is None else row[index] for index in positions])
+
+                    rows += len(source_rows)
+
+                text.flush()
+                text.detach()
+
+            size = body.tell()
+            body.seek(0)
+
+            self.storage.upload(key, body, size, ContentType=self.output_format.content_type,
+                                ContentEncoding=self.output_format.content_encoding)
+
+        return size, rows
+
+    def _expired(self, run: datetime, listing: dict) -> set:
+        '''
+        retired objects past the grace period.  A small object rewritten since it was retired is kept,
+        it holds rows the next run has to compact.
+        '''
+        expired = set()
+
+        for key, etag, retired_at in self.manifest.retired:
+            if (run - datetime.fromisoformat(retired_at)).total_seconds() < self.grace_seconds:
+                continue
+
+            if etag is None or listing.get(key) in (etag, None):
+                expired.add(key)
+
+        return expired
+
+    def _read_all(self, keys: list):
+        with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix='compactor') as executor:
+            yield from zip(keys, executor.map(self.storage.read_object, keys))
+
+
+def _read_csv(body: bytes) -> tuple:
+    if body is None:
+        raise ValueError("object could not be read")
+
+    reader = csv.reader(io.StringIO(decompress(body).decode('utf-8')))
+    header = next(reader, [])
+
+    return header, list(reader)
+
+def _columns(headers) -> list:
+    ''' every column of the headers, in the order they first appear '''
+    columns = {}
+
+    for header in headers:
+        columns.update(dict.fromkeys(header))
+
+    return list(columns)
+
+def _game_and_player(key: str) -> tuple:
+    player_id, game_id = SMALL_KEY.match(key).group(1, 2)
+
+    return int(game_id), int(player_id)
+
+
+def main():
+    import os
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='NHL Stats small object compaction')
+    parser.add_argument("--partition", default="season", choices=Compactor.PARTITIONS,
+                        help="merge the small objects of each season or of each game date")
+    parser.add_argument("--format", default="csv.gz", choices=['csv.gz', 'csv.zst'])
+    parser.add_argument("--grace_seconds", default=3600, type=float,
+                        help="how long superseded objects are kept for readers of an older manifest")
+    parser.add_argument("--readers", default=8, type=int, help="small objects read in parallel")
+    args = parser.parse_args()
+
+    import boto3
+    from botocore.config import Config
+    from nhldata.app import Storage
+
+    s3_client = boto3.client('s3', config=Config(signature_version='s3v4', max_pool_connections=max(10, args.readers)),
+                             endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+    storage = Storage(os.environ.get('DEST_BUCKET', 'output'), s3_client)
+
+    result = Compactor(storage, args.partition, args.format, args.grace_seconds, args.readers).compact()
+
+    if result.failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+'''
+Compiles NHL_SCHEMA column names into a single row extractor.
+
+A column name is the json path to its value joined with underscores.  Columns starting with `player`
+are read from a boxscore player entry, so `player_person_currentTeam_id` is
+player['person']['currentTeam']['id'].  Any other column is read from the context the player was found
+in, e.g. `side` is context['side'].  Keys containing underscores can't be expressed this way.
+
+The generated function resolves every shared parent dict once and fills missing keys with None, so a
+new schema version gets a parser without a hand maintained strategy.  Columns given a converter have
+their value passed through it inside the same generated function.
+'''
+from functools import lru_cache
+
+
+PLAYER_ROOT = 'player'
+CONTEXT_ROOT = 'context'
+
+_EMPTY = {}
+
+
+def column_path(column: str) -> tuple:
+    ''' the root object and key path a schema column is read from '''
+    parts = tuple(column.split('_'))
+
+    if parts[0] == PLAYER_ROOT and len(parts) > 1:
+        return PLAYER_ROOT, parts[1:]
+
+    return CONTEXT_ROOT, parts
+
+
+def compile_extractor(output_cols, converters=None) -> callable:
+    '''
+    returns extract(player: dict, context: dict) -> tuple with one value per output column.
+    converters, when given, holds a callable or None for each output column.
+    '''
+    return _compile(tuple(output_cols), tuple(converters) if converters else None)
+
+
+@lru_cache(maxsize=None)
+def _compile(output_cols: tuple, converters: tuple = None) -> callable:
+    parents = {}
+    lines = []
+    values = []
+
+    def parent(root, path):
+        ''' name of the local holding the dict at root/path, emitting its lookup the first time '''
+        if not path:
+            return root
+
+        name = parents.get((root, path))
+
+        if name is None:
+            enclosing = parent(root, path[:-1])
+            name = f'_{len(parents)}'
+            lines.append(f'    {name} = {enclosing}.get({path[-1]!r}) or _EMPTY')
+            parents[(root, path)] = name
+
+        return name
+
+    namespace = {'_EMPTY': _EMPTY}
+
+    for index, column in enumerate(output_cols):
+        root, path = column_path(column)
+        value = f'{parent(root, path[:-1])}.get({path[-1]!r})'
+
+        if converters and converters[index] is not None:
+            namespace[f'_convert{index}'] = converters[index]
+            value = f'_convert{index}({value})'
+
+        values.append(value)
+
+    source = '\n'.join(
+        [f'def extract({PLAYER_ROOT}, {CONTEXT_ROOT}):']
+        + lines
+        + ['    return (' + ''.join(f'{value}, ' for value in values) + ')']
+    )
+
+    exec(compile(source, f'<nhl extractor: {len(output_cols)} columns>', 'exec'), namespace)
+
+    return namespace['extract']
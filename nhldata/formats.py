@@ -0,0 +1,200 @@
+'''
+Output formats Storage can serialize a frame of player rows into.
+
+Formats with serialize() return the whole object, streaming formats with write() encode it straight into
+a file Storage uploads from, and name the Content-Encoding it is stored with.
+'''
+import io
+from io import BytesIO, StringIO
+from typing import TYPE_CHECKING
+
+from nhldata.schema import COLUMN_CONVERTERS
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class CsvFormat():
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def __init__(self, column_types: dict = None):
+        pass
+
+    def serialize(self, game_data: 'pd.DataFrame'):
+        csv_buffer = StringIO()
+        game_data.to_csv(csv_buffer)
+        return csv_buffer.getvalue()
+
+
+class GzipCsvFormat():
+    '''
+    csv rows compressed as they are written, with no uncompressed copy of the object in memory.  Stored
+    with Content-Encoding: gzip, which the loader reads back transparently.
+    '''
+    extension = 'csv.gz'
+    content_type = 'text/csv'
+    content_encoding = 'gzip'
+
+    def __init__(self, column_types: dict = None, level: int = 6):
+        self.level = level
+
+    def compressor(self, fileobj):
+        ''' a binary stream compressing into fileobj, which closing it leaves open '''
+        import gzip
+
+        # mtime=0 keeps the bytes of an unchanged frame identical from one run to the next
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=self.level, mtime=0)
+
+    def write(self, game_data: 'pd.DataFrame', fileobj) -> None:
+        with self.compressor(fileobj) as compressed:
+            _write_csv(game_data, compressed)
+
+
+class ZstdCsvFormat():
+    ''' like GzipCsvFormat with zstandard, which compresses about as well several times faster '''
+    extension = 'csv.zst'
+    content_type = 'text/csv'
+    content_encoding = 'zstd'
+
+    def __init__(self, column_types: dict = None, level: int = 3):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("The csv.zst output format needs zstandard, install it with `pip install zstandard`")
+
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compressor(self, fileobj):
+        return self._compressor.stream_writer(fileobj, closefd=False)
+
+    def write(self, game_data: 'pd.DataFrame', fileobj) -> None:
+        with self.compressor(fileobj) as compressed:
+            _write_csv(game_data, compressed)
+
+
+def _write_csv(game_data: 'pd.DataFrame', binary) -> None:
+    ''' the csv CsvFormat serializes, encoded into a binary stream as pandas writes it '''
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+    try:
+        game_data.to_csv(text)
+        text.flush()
+    finally:
+        # leaves the binary stream open for its owner to close
+        text.detach()
+
+
+class ParquetFormat():
+    '''
+    compressed, typed parquet. Column types come from NHL_COLUMN_TYPES so values land as the same
+    ints, bools and floats game_stats declares instead of strings to be cast again on every read.
+    '''
+    extension = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+
+    def __init__(self, column_types: dict, compression: str = 'zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("The parquet output format needs pyarrow, install it with `pip install pyarrow`")
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.column_types = column_types
+        self.compression = compression
+
+    def serialize(self, game_data: 'pd.DataFrame') -> bytes:
+        pa = self._pa
+        arrow_types = {'int': pa.int64(), 'bool': pa.bool_(), 'float': pa.float64(), 'str': pa.string()}
+
+        coerced = {}
+        fields = []
+
+        for column, values in game_data.items():
+            column_type = self.column_types.get(column, 'str')
+
+            if values.dtype.kind != _DTYPE_KINDS[column_type]:
+                coerced[column] = _coerce(values, column_type)
+
+            fields.append(pa.field(column, arrow_types[column_type]))
+
+        frame = game_data.assign(**coerced) if coerced else game_data
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        # only columns arrow inferred differently are cast, e.g. large_string and all null columns
+        table = pa.table([
+            values if values.type == column.type else values.cast(column.type)
+            for values, column in zip(table.columns, fields)
+        ], schema=pa.schema(fields))
+
+        parquet_buffer = BytesIO()
+        self._pq.write_table(table, parquet_buffer, compression=self.compression)
+        return parquet_buffer.getvalue()
+
+
+# numpy dtype kinds a column can already hold to be written as its type without coercion
+_DTYPE_KINDS = {'int': 'i', 'bool': 'b', 'float': 'f', 'str': 'O'}
+
+
+def _coerce(values: 'pd.Series', column_type: str) -> 'pd.Series':
+    '''
+    a column as the nullable pandas dtype of a NHL_COLUMN_TYPES type, converted a column at a time.  Values
+    that aren't numbers become nulls in numeric columns, and "MM:SS" clocks become seconds as with
+    COLUMN_CONVERTERS.
+    '''
+    import numpy as np
+    import pandas as pd
+
+    if column_type == 'str':
+        return values.astype('string')
+
+    if column_type == 'bool':
+        if values.dtype == bool:
+            return values
+
+        return values.map(COLUMN_CONVERTERS['bool'], na_action='ignore').astype('boolean')
+
+    numbers = pd.to_numeric(values, errors='coerce')
+    # only values that aren't numbers are looked at again, for clocks
+    unparsed = numbers.isna() & values.notna()
+
+    if column_type == 'int' and unparsed.any():
+        clocks = values[unparsed].astype(str)
+        clocks = clocks[clocks.str.contains(':', regex=False)]
+        numbers = numbers.astype('float64')
+        numbers[clocks.index] = clocks.map(COLUMN_CONVERTERS['int'])
+
+    if column_type == 'int':
+        # int() truncates, as COLUMN_CONVERTERS does
+        return pd.Series(np.trunc(numbers.astype('float64')), index=values.index).astype('Int64')
+
+    return numbers.astype('float64')
+
+
+def decompress(body: bytes) -> bytes:
+    ''' the csv in a gzip or zstd object, told apart by magic bytes whatever the key or Content-Encoding says '''
+    if body.startswith(GZIP_MAGIC):
+        import gzip
+
+        return gzip.decompress(body)
+
+    if body.startswith(ZSTD_MAGIC):
+        import zstandard
+
+        # streamed frames don't record their size, which ZstdDecompressor.decompress needs
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+    return body
+
+
+# builds a format from the NHL_COLUMN_TYPES of the schema version being written
+OUTPUT_FORMATS = {
+    'csv': CsvFormat,
+    'csv.gz': GzipCsvFormat,
+    'csv.zst': ZstdCsvFormat,
+    'parquet': ParquetFormat
+}
@@ -0,0 +1,243 @@
+'''
+Polls the games of one date while they are played and writes only the player rows that changed.
+
+    python -m nhldata.live --date 2020-08-04 --interval 30
+
+Every poll reads the date's schedule for the state of each game and fetches the boxscores of live games
+only, plus one last fetch once a game goes final.  Requests are conditional, so the api answers 304
+when nothing changed since the last poll, and a boxscore that comes back with the same content hash as
+last time isn't parsed.  Of a changed boxscore, only the players whose row hashes differ from their last
+written row are stored, as {playerid}/{gameid}.csv like the crawler's player layout.  Polling stops once
+every game of the date is final.
+'''
+import time
+import logging
+from datetime import datetime
+from dataclasses import dataclass, field
+
+from nhldata.app import NHLApi, Storage, StorageKey
+from nhldata.formats import OUTPUT_FORMATS
+from nhldata.manifest import GameManifest
+from nhldata.metrics import Metrics
+from nhldata.parser import NhlParser
+from nhldata.schema import NHL_SCHEMA
+from nhldata.strategy import NHL_PARSING_STRATEGY, SCHEMA_PARSING_STRATEGY, FINAL_STATE, LIVE_STATE
+
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class PollResult:
+    fetched: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    players_written: int = 0
+    # every game of the date is final and has been written
+    finished: bool = False
+
+
+class LivePoller():
+    '''
+    interval is the delay between polls while a game is live, idle_interval while every game is yet to
+    start.  With a manifest, games are recorded in it once written as final so an incremental crawl
+    skips them.
+    '''
+    def __init__(self, api: NHLApi, storage: Storage, version: str, interval: float = 30.0,
+                 idle_interval: float = 300.0, manifest: GameManifest = None, metrics: Metrics = None):
+        self.api = api
+        self.storage = storage
+        self.parser = NhlParser(NHL_PARSING_STRATEGY.get(version, SCHEMA_PARSING_STRATEGY), NHL_SCHEMA[version])
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.manifest = manifest
+        self.metrics = metrics if metrics else Metrics()
+
+        self._dates = None
+        # game id -> hash of its last boxscore, and (game id, player id) -> hash of the player's last row
+        self._game_hashes = {}
+        self._row_hashes = {}
+        self._finished = set()
+
+    def run(self, date: datetime, max_polls: int = None) -> PollResult:
+        ''' polls until every game of the date is final, or max_polls polls, and returns the last poll '''
+        polls = 0
+
+        while True:
+            result = self.poll(date)
+            polls += 1
+
+            if result.finished or (max_polls and polls >= max_polls):
+                return result
+
+            delay = self.interval if self._live() else self.idle_interval
+
+            LOG.debug("Polling again in {}s".format(delay))
+            time.sleep(delay)
+
+    def poll(self, date: datetime) -> PollResult:
+        result = PollResult()
+        self.metrics.inc('nhl_live_polls_total')
+
+        schedule = self.api.schedule(date, date, conditional=True)
+
+        if schedule is None:
+            LOG.debug("Schedule for {} is unchanged".format(date))
+
+        elif not schedule:
+            LOG.warning("No schedule for {}, using the last one".format(date))
+
+        else:
+            self._dates = schedule.get('dates') or []
+
+        games = self.parser.parse_games(self._dates or [])
+
+        for game in games:
+            if self.manifest and game.id not in self._finished and not self.manifest.should_fetch(game):
+                # already landed as final, e.g. by a crawl
+                self._finished.add(game.id)
+
+            if game.state == LIVE_STATE or (game.state == FINAL_STATE and game.id not in self._finished):
+                self._poll_game(game, result)
+
+        if self.manifest:
+            self.manifest.save()
+
+        result.finished = self._dates is not None and all(game.id in self._finished for game in games)
+
+        LOG.info("Polled {} games for {}: {} unchanged, {} failed, {} players written".format(
+            len(result.fetched) + len(result.unchanged) + len(result.failed), date.strftime('%Y-%m-%d'),
+            len(result.unchanged), len(result.failed), result.players_written))
+
+        return result
+
+    def _live(self) -> bool:
+        return any(game.state == LIVE_STATE for game in self.parser.parse_games(self._dates or []))
+
+    def _poll_game(self, game, result: PollResult) -> None:
+        # a 304 only means unchanged once the previous boxscore was written, until then it's fetched in full
+        boxscore = self.api.boxscore(game.id, conditional=game.id in self._game_hashes)
+
+        if boxscore is None:
+            self._unchanged(game, result)
+            return
+
+        if not boxscore:
+            LOG.error("No boxscore data for game {}".format(game.id))
+            self.metrics.inc('nhl_live_boxscores_total', outcome='failed')
+            result.failed.append(game.id)
+            return
+
+        digest = GameManifest.digest(boxscore)
+
+        if self._game_hashes.get(game.id) == digest:
+            self._unchanged(game, result)
+            return
+
+        try:
+            written, rows = self._write_changed_players(game, boxscore)
+        except Exception:
+            LOG.error("Failed to parse or store game {}".format(game.id), exc_info=True)
+            self.metrics.inc('nhl_live_boxscores_total', outcome='failed')
+            result.failed.append(game.id)
+            # the next poll fetches the game in full and retries the players that weren't stored
+            self._game_hashes.pop(game.id, None)
+            return
+
+        self._game_hashes[game.id] = digest
+        self.metrics.inc('nhl_live_boxscores_total', outcome='changed')
+        self.metrics.inc('nhl_live_players_written_total', written)
+        result.fetched.append(game.id)
+        result.players_written += written
+
+        if game.state == FINAL_STATE:
+            self._finish(game, rows, digest)
+
+    def _unchanged(self, game, result: PollResult) -> None:
+        LOG.debug("Boxscore for game {} is unchanged".format(game.id))
+        self.metrics.inc('nhl_live_boxscores_total', outcome='unchanged')
+        result.unchanged.append(game.id)
+
+        if game.state == FINAL_STATE:
+            self._finish(game, None, self._game_hashes[game.id])
+
+    def _finish(self, game, rows: int, digest: str) -> None:
+        self._finished.add(game.id)
+
+        if self.manifest:
+            if rows is None:
+                rows = sum(1 for game_id, _ in self._row_hashes if game_id == game.id)
+
+            self.manifest.record(game, rows, digest)
+
+    def _write_changed_players(self, game, boxscore: dict) -> tuple:
+        ''' (players written, players in the game) '''
+        import pandas as pd
+
+        game_df = self.parser.parse_game_frame(boxscore, game)
+
+        if game_df is None:
+            return 0, 0
+
+        written = 0
+        hashes = pd.util.hash_pandas_object(game_df, index=False)
+
+        for index, (player_id, row_hash) in enumerate(zip(game_df['player_person_id'], hashes)):
+            key = (game.id, player_id)
+
+            if self._row_hashes.get(key) == row_hash:
+                continue
+
+            self.storage.store_game(StorageKey(game.id, player_id), game_df.iloc[index:index + 1])
+            self._row_hashes[key] = row_hash
+            written += 1
+
+        return written, len(game_df)
+
+
+def main():
+    import argparse
+
+    from nhldata.app import build_storage, write_reports
+
+    parser = argparse.ArgumentParser(description='NHL live game poller')
+    parser.add_argument("--date", default=datetime.now().strftime('%Y-%m-%d'), type=str,
+                        help="date whose games are polled, today by default")
+    parser.add_argument("--version", default="v3", type=str)
+    parser.add_argument("--api_base", default=None, type=str)
+    parser.add_argument("--rate_limit", default=None, type=float,
+                        help="max NHL api requests per second, unlimited by default")
+    parser.add_argument("--format", default="csv", choices=sorted(OUTPUT_FORMATS))
+    parser.add_argument("--interval", default=30.0, type=float, help="seconds between polls while games are live")
+    parser.add_argument("--idle_interval", default=300.0, type=float,
+                        help="seconds between polls while no game has started")
+    parser.add_argument("--max_polls", default=None, type=int)
+    parser.add_argument("--incremental", action="store_true",
+                        help="record final games in the bucket's manifest so incremental crawls skip them")
+    parser.add_argument("--report_dir", default=None, type=str,
+                        help="write run_report.json and a nhldata.prom Prometheus textfile here at exit")
+    parser.set_defaults(workers=1, upload_workers=0, layout='player')
+    args = parser.parse_args()
+
+    date = datetime.strptime(args.date, '%Y-%m-%d')
+    # the report describes a one date crawl
+    args.start_date = args.end_date = args.date
+
+    metrics = Metrics()
+    api = NHLApi(args.api_base, rate_limit=args.rate_limit, metrics=metrics)
+    storage = build_storage(args, metrics)
+    manifest = GameManifest(storage).load() if args.incremental else None
+
+    poller = LivePoller(api, storage, args.version, args.interval, args.idle_interval, manifest, metrics)
+    result = None
+
+    try:
+        result = poller.run(date, args.max_polls)
+    finally:
+        write_reports(metrics, args)
+
+    if result.failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
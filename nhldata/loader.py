@@ -0,0 +1,352 @@
+'''
+Bulk loads the crawler's csv objects into postgres.
+
+Objects are read in parallel from the bucket (or a local copy of it) and their rows streamed into a few
+`COPY ... FROM STDIN` batches over a single connection, instead of one psql \\copy per file.  Rows are
+matched to table columns by their csv header, so files written by any layout load the same way.  Objects
+written compressed (--format csv.gz or csv.zst) are decompressed on the fly, recognized by their content.
+Once nhldata.compact has run, its manifest decides which objects are read: the compacted objects in place
+of the small ones they hold.
+
+    python -m nhldata.loader --source s3_data/data-bucket
+    python -m nhldata.loader --bucket data-bucket --readers 16 --batch_size 100000
+
+The players/ dimension written by --split_players crawls is only loaded when asked for by prefix, and
+upserted so each player keeps one row, their latest attributes:
+
+    python -m nhldata.loader --source s3_data/data-bucket --prefix players --version players --table players \\
+        --mode upsert
+'''
+import os
+import csv
+import logging
+from io import StringIO
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from nhldata.compact import CompactionManifest
+from nhldata.formats import decompress
+from nhldata.schema import NHL_SCHEMA, NHL_COLUMN_TYPES
+
+
+logging.basicConfig(level=logging.INFO)
+LOG = logging.getLogger(__name__)
+
+DIMENSION_PREFIXES = ('players/',)
+DATA_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst')
+
+
+def _is_data_key(key: str) -> bool:
+    '''
+    csv objects written by the crawler, leaving out metadata such as _manifest/ and _backfill/, and
+    dimensions such as players/ unless the source is rooted in them
+    '''
+    return (key.endswith(DATA_EXTENSIONS) and not any(part.startswith('_') for part in key.split('/'))
+            and not key.startswith(DIMENSION_PREFIXES))
+
+
+class LocalSource():
+    ''' a local copy of the bucket, keys are relative to the bucket's root directory like BucketSource's '''
+    def __init__(self, directory, prefix: str = ''):
+        self.directory = Path(directory)
+        self.prefix = prefix
+
+    def keys(self):
+        # read before listing, so every object the manifest points at is already there
+        manifest = self._manifest()
+        keys = []
+
+        for path in sorted((self.directory / self.prefix).rglob('*.csv*')):
+            key = path.relative_to(self.directory).as_posix()
+
+            if path.is_file() and _is_data_key(key[len(self.prefix):].lstrip('/')):
+                keys.append(key)
+
+        return CompactionManifest.visible(keys, manifest)
+
+    def _manifest(self) -> bytes:
+        try:
+            return self.read(CompactionManifest.KEY)
+        except FileNotFoundError:
+            return None
+
+    def read(self, key: str) -> bytes:
+        return (self.directory / key).read_bytes()
+
+
+class BucketSource():
+    def __init__(self, s3_client, bucket: str, prefix: str = ''):
+        self._s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def keys(self):
+        # read before listing, so every object the manifest points at is already there
+        manifest = self._manifest()
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+        keys = []
+
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for entry in page.get('Contents', []):
+                if _is_data_key(entry['Key'][len(self.prefix):].lstrip('/')):
+                    keys.append(entry['Key'])
+
+        return CompactionManifest.visible(keys, manifest)
+
+    def _manifest(self) -> bytes:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.read(CompactionManifest.KEY)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+
+            raise
+
+    def read(self, key: str) -> bytes:
+        return self._s3_client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+
+@dataclass
+class LoadResult:
+    files: int = 0
+    rows: int = 0
+    failed: list = field(default_factory=list)
+    # staged rows an upsert didn't merge, for lacking a game_id or repeating a game and player (a player
+    # for the players table)
+    dropped: int = 0
+
+
+class CopyLoader():
+    '''
+    streams rows from a source into table through COPY batches of batch_size rows on one connection,
+    committing once at the end so a failed load leaves the table untouched.
+
+    modes:
+        append -- rows are copied straight into the table
+        upsert -- rows are copied into a temporary staging table first, then every game found there
+                  replaces that game's rows in the table.  Loading the same games twice is a no-op and a
+                  nightly load only touches the new games.  Needs a schema with game_id (v2 and later),
+                  or the players schema, whose rows are replaced per player instead.
+                  Nothing is loaded when an object can't be read, its game would lose the rows it held.
+    '''
+    MODES = ('append', 'upsert')
+    # column whose staged values replace their rows in an upsert, and the columns a row is unique by
+    UPSERT_KEYS = {'players': ('player_person_id', ['player_person_id'])}
+    DEFAULT_UPSERT_KEY = ('game_id', ['game_id', 'player_person_id'])
+
+    def __init__(self, connection, version: str = 'v3', table: str = 'game_stats',
+                 batch_size: int = 50000, readers: int = 8, mode: str = 'append'):
+        if mode not in self.MODES:
+            raise ValueError("Unknown load mode {}, expected one of {}".format(mode, ', '.join(self.MODES)))
+
+        self.upsert_key, self.unique_columns = self.UPSERT_KEYS.get(version, self.DEFAULT_UPSERT_KEY)
+
+        if mode == 'upsert' and self.upsert_key not in NHL_SCHEMA[version]:
+            raise ValueError("Upserts need {}, which schema {} doesn't have".format(self.upsert_key, version))
+
+        self.connection = connection
+        self.table = table
+        self.columns = NHL_SCHEMA[version]
+        self.batch_size = batch_size
+        self.readers = max(1, readers)
+        self.mode = mode
+        self.copy_table = f'{table}_staging' if mode == 'upsert' else table
+
+        column_types = NHL_COLUMN_TYPES.get(version, {})
+        self._int_columns = {column for column in self.columns if column_types.get(column) == 'int'}
+
+    def load(self, source) -> LoadResult:
+        result = LoadResult()
+        batch = StringIO()
+        writer = csv.writer(batch)
+        batch_rows = 0
+
+        with self.connection.cursor() as cursor:
+            if self.mode == 'upsert':
+                cursor.execute('CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP'.format(
+                    self.copy_table, self.table))
+
+            for key, body in self._read_all(source):
+                try:
+                    rows = self._rows(body)
+                except Exception:
+                    LOG.error("Skipping unreadable object {}".format(key), exc_info=True)
+                    result.failed.append(key)
+                    continue
+
+                writer.writerows(rows)
+                batch_rows += len(rows)
+                result.files += 1
+
+                if batch_rows >= self.batch_size:
+                    self._copy(cursor, batch, batch_rows)
+                    result.rows += batch_rows
+
+                    batch = StringIO()
+                    writer = csv.writer(batch)
+                    batch_rows = 0
+
+            if batch_rows:
+                self._copy(cursor, batch, batch_rows)
+                result.rows += batch_rows
+
+            if self.mode == 'upsert' and result.failed:
+                # merging would replace the games of the unread objects without their rows
+                self.connection.rollback()
+
+                LOG.error("Rolled back the upsert into {}, {} objects couldn't be read: {}".format(
+                    self.table, len(result.failed), ', '.join(result.failed)))
+
+                return LoadResult(failed=result.failed)
+
+            if self.mode == 'upsert':
+                result.dropped = result.rows - self._merge(cursor)
+
+        self.connection.commit()
+
+        LOG.info("Loaded {} rows from {} objects into {}, {} objects failed".format(
+            result.rows, result.files, self.table, len(result.failed)))
+
+        if result.dropped:
+            LOG.warning("Dropped {} staged rows without a {} or repeating a {}".format(
+                result.dropped, self.upsert_key, ' and '.join(self.unique_columns)))
+
+        return result
+
+    def _read_all(self, source):
+        ''' (key, body) in listing order, with at most a few reads per reader in flight at once '''
+        window = self.readers * 4
+
+        with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix='loader') as executor:
+            pending = []
+
+            for key in source.keys():
+                pending.append((key, executor.submit(source.read, key)))
+
+                if len(pending) >= window:
+                    yield self._result(*pending.pop(0))
+
+            while pending:
+                yield self._result(*pending.pop(0))
+
+    def _result(self, key, future):
+        try:
+            return key, future.result()
+        except Exception:
+            LOG.error("Failed to read object {}".format(key), exc_info=True)
+            return key, None
+
+    def _rows(self, body: bytes) -> list:
+        ''' the object's rows reordered to self.columns, anything the table doesn't have is dropped '''
+        if body is None:
+            raise ValueError("object could not be read")
+
+        reader = csv.reader(StringIO(decompress(body).decode('utf-8')))
+        header = next(reader, None)
+
+        if header is None:
+            return []
+
+        positions = {column: index for index, column in enumerate(header)}
+        missing = [column for column in self.columns if column not in positions]
+
+        if len(missing) == len(self.columns):
+            raise ValueError("header doesn't match any column of {}".format(self.table))
+
+        indexes = [positions.get(column) for column in self.columns]
+        # pandas turns int columns holding a null into floats, which postgres won't cast back to int
+        int_indexes = [index for index, column in enumerate(self.columns) if column in self._int_columns]
+
+        rows = []
+
+        for record in reader:
+            row = ['' if index is None else record[index] for index in indexes]
+
+            for index in int_indexes:
+                if row[index].endswith('.0'):
+                    row[index] = row[index][:-2]
+
+            rows.append(row)
+
+        return rows
+
+    def _copy(self, cursor, batch: StringIO, rows: int) -> None:
+        batch.seek(0)
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(self.copy_table, ', '.join(self.columns)),
+            batch
+        )
+
+        LOG.info("Copied {} rows into {}".format(rows, self.copy_table))
+
+    def _merge(self, cursor) -> int:
+        '''
+        replaces the staged games (or players) in the table, keeping one row per game and player, returns the
+        rows merged
+        '''
+        columns = ', '.join(self.columns)
+        unique = ', '.join(self.unique_columns)
+
+        cursor.execute(
+            'DELETE FROM {table} WHERE {key} IN (SELECT DISTINCT {key} FROM {staging})'.format(
+                table=self.table, key=self.upsert_key, staging=self.copy_table))
+
+        LOG.info("Replacing {} existing rows of the staged {} values in {}".format(
+            cursor.rowcount, self.upsert_key, self.table))
+
+        cursor.execute(
+            'INSERT INTO {table} ({columns}) '
+            'SELECT DISTINCT ON ({unique}) {columns} FROM {staging} '
+            'WHERE {key} IS NOT NULL ORDER BY {unique}'.format(
+                table=self.table, columns=columns, unique=unique, key=self.upsert_key, staging=self.copy_table))
+
+        LOG.info("Merged {} rows into {}".format(cursor.rowcount, self.table))
+
+        return cursor.rowcount
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='NHL Stats bulk loader')
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--source", type=str, help="local directory holding the crawled objects")
+    source_group.add_argument("--bucket", type=str, help="bucket holding the crawled objects")
+    parser.add_argument("--prefix", default="", type=str)
+    parser.add_argument("--dsn", default=os.environ.get('LOADER_DSN', 'host=localhost user=postgres dbname=postgres'),
+                        type=str, help="libpq connection string, PG* environment variables also apply")
+    parser.add_argument("--version", default="v3", type=str)
+    parser.add_argument("--table", default="game_stats", type=str)
+    parser.add_argument("--mode", default="append", choices=CopyLoader.MODES,
+                        help="upsert replaces the rows of every game, or player, being loaded instead of appending")
+    parser.add_argument("--batch_size", default=50000, type=int, help="rows per COPY statement")
+    parser.add_argument("--readers", default=8, type=int, help="objects read in parallel")
+    args = parser.parse_args()
+
+    import psycopg2
+
+    if args.bucket:
+        import boto3
+        from botocore.config import Config
+
+        s3_client = boto3.client('s3', config=Config(signature_version='s3v4', max_pool_connections=args.readers),
+                                 endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+        source = BucketSource(s3_client, args.bucket, args.prefix)
+    else:
+        source = LocalSource(args.source, args.prefix)
+
+    connection = psycopg2.connect(args.dsn)
+
+    try:
+        result = CopyLoader(connection, args.version, args.table, args.batch_size, args.readers, args.mode).load(source)
+    finally:
+        connection.close()
+
+    if result.failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+from nhldata.strategy import FINAL_STATE
+
+
+LOG = logging.getLogger(__name__)
+
+
+class GameManifest():
+    '''
+    json object in the destination bucket recording every game that has landed there, like
+        {"2019030042": {"state": "Final", "rows": 40, "hash": "<sha1 of the boxscore>", "landed_at": "..."}}
+
+    An incremental crawl only fetches games that are missing from it or weren't final when they landed,
+    and skips rewriting a game whose boxscore hashes the same as last time.  Saving re-reads the object,
+    applies only this run's changes and writes it back only if no other run wrote it in between, see
+    update_object, so runs over other windows (e.g. backfill processes) keep theirs.
+    '''
+    KEY = '_manifest/games.json'
+
+    def __init__(self, storage, key: str = KEY):
+        self.storage = storage
+        self.key = key
+        self.entries = {}
+
+        self._lock = threading.Lock()
+        self._recorded = {}
+        self._discarded = set()
+
+    def load(self) -> 'GameManifest':
+        self.entries = self._read()
+        self._recorded = {}
+        self._discarded = set()
+
+        LOG.info("Loaded manifest {} with {} games".format(self.key, len(self.entries)))
+
+        return self
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._recorded and not self._discarded:
+                return
+
+            def apply(entries):
+                for game_id in self._discarded:
+                    entries.pop(game_id, None)
+
+                entries.update(self._recorded)
+
+            self.entries = update_object(self.storage, self.key, apply)
+            self._recorded = {}
+            self._discarded = set()
+
+        LOG.info("Saved manifest {} with {} games".format(self.key, len(self.entries)))
+
+    def should_fetch(self, game) -> bool:
+        entry = self.entries.get(str(game.id))
+
+        return entry is None or entry['state'] != FINAL_STATE or game.state != FINAL_STATE
+
+    def unchanged(self, game, digest: str) -> bool:
+        entry = self.entries.get(str(game.id))
+
+        return entry is not None and entry['hash'] == digest
+
+    def record(self, game, rows: int, digest: str) -> None:
+        entry = {
+            'state': game.state,
+            'rows': rows,
+            'hash': digest,
+            'landed_at': datetime.now(timezone.utc).isoformat()
+        }
+
+        with self._lock:
+            self.entries[str(game.id)] = entry
+            self._recorded[str(game.id)] = entry
+            self._discarded.discard(str(game.id))
+
+    def discard(self, game_ids) -> None:
+        with self._lock:
+            for game_id in map(str, game_ids):
+                self.entries.pop(game_id, None)
+                self._recorded.pop(game_id, None)
+                self._discarded.add(game_id)
+
+    def _read(self) -> dict:
+        body = self.storage.read_object(self.key)
+
+        return json.loads(body) if body else {}
+
+    @staticmethod
+    def digest(boxscore: dict) -> str:
+        return hashlib.sha1(json.dumps(boxscore, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def update_object(storage, key: str, apply, attempts: int = 5) -> dict:
+    '''
+    reads the json object at key, applies apply(entries) to it and writes it back on the condition that
+    it still has the ETag it was read with.  When another process wrote it in between, its entries are
+    read again and the changes applied on top, so neither write is lost.  Returns the written entries.
+    '''
+    for _ in range(attempts):
+        body, etag = storage.read_object_version(key)
+        entries = json.loads(body) if body else {}
+
+        apply(entries)
+
+        if storage.write_object_if(key, json.dumps(entries, sort_keys=True), etag, ContentType='application/json'):
+            return entries
+
+        LOG.info("{} was written by another run, merging again".format(key))
+
+    raise RuntimeError("{} kept changing under {} attempts to update it".format(key, attempts))
@@ -0,0 +1,189 @@
+'''
+In-process counters and latency histograms for a crawl, written out at exit as a json run report and a
+Prometheus textfile (for node_exporter's textfile collector).
+
+    metrics = Metrics()
+    metrics.inc('nhl_games_total', outcome='succeeded')
+
+    with metrics.timer('nhl_stage_seconds', stage='parse'):
+        ...
+
+    metrics.write_report('reports/run_report.json', start_date='2020-08-04')
+    metrics.write_prometheus('reports/nhldata.prom')
+'''
+import os
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# seconds, from a cached read to a slow api call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram():
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        ''' upper bound of the bucket holding the q quantile, the max for the overflow bucket '''
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': round(self.max, 6)
+        }
+
+
+class Metrics():
+    ''' thread safe counters and histograms, each series named like a Prometheus metric plus labels '''
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        with self._lock:
+            return self._histograms.get((name, _labels(labels)))
+
+    def report(self, **info) -> dict:
+        ''' every series as plain json, with info describing the run '''
+        finished_at = datetime.now(timezone.utc)
+        counters = {}
+        histograms = {}
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, {})[_label_text(labels)] = value
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(name, {})[_label_text(labels)] = histogram.summary()
+
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'elapsed_seconds': round((finished_at - self.started_at).total_seconds(), 3),
+            'run': info,
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def write_report(self, path, **info) -> None:
+        _write_atomically(path, json.dumps(self.report(**info), indent=2))
+
+    def prometheus(self) -> str:
+        ''' the text exposition format '''
+        lines = []
+        typed = set()
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+
+                lines.append(f'{name}{_label_text(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+
+                cumulative = 0
+
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_label_text(labels + (("le", str(bound)),))} {cumulative}')
+
+                lines.append(f'{name}_sum{_label_text(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{_label_text(labels)} {histogram.count}')
+
+        lines.append('# TYPE nhldata_last_run_timestamp_seconds gauge')
+        lines.append(f'nhldata_last_run_timestamp_seconds {time.time():.0f}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path) -> None:
+        _write_atomically(path, self.prometheus())
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(name, value.replace('"', '\\"')) for name, value in labels) + '}'
+
+def _write_atomically(path, text: str) -> None:
+    ''' readers such as node_exporter never see a half written file '''
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    partial = path.with_name(path.name + '.tmp')
+    partial.write_text(text)
+    os.replace(partial, path)
@@ -1,15 +1,42 @@
-from nhldata.strategy import NhlParsingStrategy
+from typing import TYPE_CHECKING
+
+from nhldata.strategy import NhlParsingStrategy, NhlGame
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class NhlParser():
     def __init__(self, parsing_strategy: NhlParsingStrategy, output_cols: list):
         self.output_cols = output_cols
+        self._extractor = parsing_strategy.compile_extractor(output_cols)
 
         self._parse_game_id = parsing_strategy.parse_game_id
         self._parse_player_info = parsing_strategy.parse_player_info
+        self._parse_games = parsing_strategy.parse_games
+        self._parse_player_rows = parsing_strategy.parse_player_rows
+        self._parse_hydrated_boxscores = parsing_strategy.parse_hydrated_boxscores
 
     def parse_game_id(self, dates: list) -> list:
         return self._parse_game_id(dates)
 
-    def parse_player_info(self, boxscore: dict, output_cols: list) -> list:
-        return self._parse_player_info(boxscore, output_cols)
+    def parse_games(self, dates: list) -> list:
+        return self._parse_games(dates)
+
+    def parse_hydrated_boxscores(self, dates: list) -> dict:
+        ''' empty for strategies that can't read a hydrated schedule, every game is then fetched alone '''
+        return self._parse_hydrated_boxscores(dates) if self._parse_hydrated_boxscores else {}
+
+    def parse_player_info(self, boxscore: dict, output_cols: list, game: NhlGame = None) -> list:
+        return self._parse_player_info(boxscore, output_cols, game)
+
+    def parse_player_rows(self, boxscore: dict, game: NhlGame = None) -> list:
+        return self._parse_player_rows(boxscore, self._extractor, game)
+
+    def parse_game_frame(self, boxscore: dict, game: NhlGame = None) -> 'pd.DataFrame':
+        ''' every player of the game as one row of a single frame, None when nobody played '''
+        import pandas as pd
+
+        rows = self.parse_player_rows(boxscore, game)
+
+        return pd.DataFrame(rows, columns=self.output_cols) if rows else None
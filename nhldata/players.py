@@ -0,0 +1,137 @@
+import json
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+
+from nhldata.manifest import update_object
+from nhldata.schema import PLAYER_DIMENSION_COLUMNS, PLAYER_GAME_COLUMNS
+
+
+LOG = logging.getLogger(__name__)
+
+
+@dataclass
+class PlayerStorageKey:
+    playerid: str
+
+    def key(self, extension: str = 'csv'):
+        ''' the latest attributes of one player '''
+        return f'players/{int(self.playerid)}.{extension}'
+
+
+class PlayerDimension():
+    '''
+    tracks which player attributes have already been written to the players/ dimension, as a json
+    object in the destination bucket mapping each player id to a hash of their attributes and the date of
+    the game they were taken from, like
+        {"8475683": {"hash": "<sha1 of the attributes>", "date": "2020-08-04"}}
+
+    split() picks the players of a game whose attributes aren't written yet or differ from last time,
+    from the in-process copy of that object, so a player's row is only rewritten when a trade, birthday
+    or roster move changes it.  Only a game at least as recent as the one that wrote the player's row can
+    rewrite it, so a backfill of an old season never puts back stale attributes.  Like GameManifest,
+    saving applies only this run's changes with a conditional write, so processes saving at the same time
+    keep each other's players; a player another process wrote from a more recent game in the meantime is
+    dropped instead, so the next crawl of the player writes its row again.
+    '''
+    KEY = '_players/attributes.json'
+
+    def __init__(self, storage, key: str = KEY):
+        self.storage = storage
+        self.key = key
+        self.entries = {}
+
+        self._lock = threading.Lock()
+        self._recorded = {}
+        self._discarded = set()
+
+    def load(self) -> 'PlayerDimension':
+        self.entries = self._read()
+        self._recorded = {}
+        self._discarded = set()
+
+        LOG.info("Loaded player dimension {} with {} players".format(self.key, len(self.entries)))
+
+        return self
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._recorded and not self._discarded:
+                return
+
+            def apply(entries):
+                entries.update({player_id: _entry(value) for player_id, value in entries.items()})
+
+                for player_id in self._discarded:
+                    entries.pop(player_id, None)
+
+                for player_id, entry in self._recorded.items():
+                    if _newer(entry['date'], entries.get(player_id)):
+                        entries[player_id] = entry
+                    else:
+                        LOG.warning("Player {} was written from a more recent game by another run".format(player_id))
+                        entries.pop(player_id)
+
+            self.entries = update_object(self.storage, self.key, apply)
+            self._recorded = {}
+            self._discarded = set()
+
+        LOG.info("Saved player dimension {} with {} players".format(self.key, len(self.entries)))
+
+    def split(self, game_df, date: str = None) -> tuple:
+        '''
+        (dimension rows of the players whose attributes changed as of the game's date, the game's rows
+        without the attributes other than PLAYER_GAME_COLUMNS)
+        '''
+        columns = ['player_person_id'] + [column for column in PLAYER_DIMENSION_COLUMNS if column in game_df.columns]
+        players = game_df[columns].drop_duplicates('player_person_id')
+
+        changed = []
+
+        for index, row in enumerate(players.itertuples(index=False)):
+            entry = self.entries.get(str(row[0]))
+
+            if (entry is None or entry['hash'] != self.digest(row[1:])) and _newer(date, entry):
+                changed.append(index)
+
+        attributes = [column for column in columns[1:] if column not in PLAYER_GAME_COLUMNS]
+
+        return players.iloc[changed], game_df.drop(columns=attributes)
+
+    def record(self, players, date: str = None) -> None:
+        ''' players written from the attributes of a game played on date '''
+        recorded = {
+            str(row[0]): {'hash': self.digest(row[1:]), 'date': date}
+            for row in players.itertuples(index=False)
+        }
+
+        with self._lock:
+            self.entries.update(recorded)
+            self._recorded.update(recorded)
+            self._discarded.difference_update(recorded)
+
+    def discard(self, player_ids) -> None:
+        with self._lock:
+            for player_id in map(str, player_ids):
+                self.entries.pop(player_id, None)
+                self._recorded.pop(player_id, None)
+                self._discarded.add(player_id)
+
+    def _read(self) -> dict:
+        body = self.storage.read_object(self.key)
+
+        return {player_id: _entry(value) for player_id, value in json.loads(body).items()} if body else {}
+
+    @staticmethod
+    def digest(attributes) -> str:
+        return hashlib.sha1(json.dumps(list(attributes), default=str).encode('utf-8')).hexdigest()
+
+
+def _entry(value) -> dict:
+    ''' entries written before game dates were kept are a bare hash '''
+    return value if isinstance(value, dict) else {'hash': value, 'date': None}
+
+def _newer(date: str, entry: dict) -> bool:
+    ''' whether a game played on date may rewrite the player of entry, always when either date is unknown '''
+    return entry is None or date is None or entry['date'] is None or date >= entry['date']
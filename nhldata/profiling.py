@@ -0,0 +1,141 @@
+'''
+CPU and memory profiling for a crawl, written next to the run report.
+
+    python -m nhldata.app --profile --profile_memory --report_dir reports
+
+cProfile runs in the main thread and in every thread started while profiling, such as the crawler and
+uploader pools, and all of them are merged into one profile.pstats (open it with `python -m pstats`
+or snakeviz).  With memory profiling a tracemalloc snapshot is taken at the end of each crawl stage
+and saved as memory_{n}_{stage}.snapshot.  profile_summary.txt lists the top functions by cumulative
+and own time, and the allocation sites that grew the most during each stage.
+'''
+import io
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from pathlib import Path
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Profiler():
+    def __init__(self, directory, cpu: bool = True, memory: bool = False, top: int = 25, frames: int = 10):
+        self.directory = Path(directory)
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.frames = frames
+        self.snapshots = []
+
+        self._profile = cProfile.Profile() if cpu else None
+        self._thread_profiles = []
+        self._lock = threading.Lock()
+
+    def start(self) -> 'Profiler':
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        if self.memory:
+            tracemalloc.start(self.frames)
+
+        if self.cpu:
+            threading.setprofile(self._profile_thread)
+            self._profile.enable()
+
+        return self
+
+    def stage(self, name: str) -> None:
+        ''' a crawl stage finished, Crawler's on_stage hook '''
+        if not self.memory:
+            return
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(str(self.directory / 'memory_{}_{}.snapshot'.format(len(self.snapshots), name)))
+
+        self.snapshots.append((name, snapshot))
+
+    def stop(self) -> None:
+        if self.cpu:
+            self._profile.disable()
+            threading.setprofile(None)
+
+        if self.memory:
+            self.stage('end')
+            tracemalloc.stop()
+
+        summary = []
+
+        if self.cpu:
+            stats = self._stats()
+            stats.dump_stats(str(self.directory / 'profile.pstats'))
+
+            for sort in ('cumulative', 'tottime'):
+                summary.append(self._top_functions(stats, sort))
+
+        if self.memory:
+            summary.append(self._top_allocations())
+
+        (self.directory / 'profile_summary.txt').write_text('\n\n'.join(summary))
+
+        LOG.info("Wrote profiles to {}".format(self.directory))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        ''' first profile event of a new thread, swaps itself for a cProfile of that thread '''
+        sys.setprofile(None)
+
+        profile = cProfile.Profile()
+
+        with self._lock:
+            self._thread_profiles.append(profile)
+
+        profile.enable()
+
+    def _stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self._profile)
+
+        with self._lock:
+            thread_profiles = list(self._thread_profiles)
+
+        for profile in thread_profiles:
+            # threads still running, e.g. a daemon, are read as they are
+            profile.create_stats()
+
+            if profile.stats:
+                stats.add(profile)
+
+        return stats
+
+    def _top_functions(self, stats: pstats.Stats, sort: str) -> str:
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(sort).print_stats(self.top)
+
+        return 'Top {} functions by {} time, {} threads profiled\n{}'.format(
+            self.top, sort, len(self._thread_profiles) + 1, output.getvalue().strip())
+
+    def _top_allocations(self) -> str:
+        lines = ['Top {} allocation sites grown in each stage'.format(self.top)]
+        previous = None
+
+        for name, snapshot in self.snapshots:
+            lines.append('')
+            lines.append('[{}]'.format(name))
+
+            if previous is None:
+                differences = snapshot.statistics('lineno')[:self.top]
+            else:
+                differences = snapshot.compare_to(previous, 'lineno')[:self.top]
+
+            lines.extend(str(difference) for difference in differences)
+            previous = snapshot
+
+        return '\n'.join(lines)
@@ -0,0 +1,138 @@
+'''
+Archive of the raw api responses a crawl was built from, kept in the destination bucket as gzipped json
+
+    raw/schedule/date={date}.json.gz                         -- the schedule entry of one date
+    raw/boxscore/season={season}/date={date}/{gameid}.json.gz
+
+so output can be rebuilt for any range or schema version without calling the api again, see
+nhldata.reparse.
+'''
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+
+
+LOG = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+@dataclass
+class RawScheduleKey:
+    date: str
+
+    def key(self, extension: str = 'json.gz'):
+        return f'raw/schedule/date={self.date}.{extension}'
+
+@dataclass
+class RawBoxscoreKey:
+    season: str
+    date: str
+    gameid: str
+
+    def key(self, extension: str = 'json.gz'):
+        return f'raw/boxscore/season={self.season}/date={self.date}/{self.gameid}.{extension}'
+
+
+class RawArchive():
+    def __init__(self, storage, compresslevel: int = 6):
+        self.storage = storage
+        self.compresslevel = compresslevel
+
+    def store_schedule(self, dates: list, start_date: datetime = None, end_date: datetime = None) -> None:
+        '''
+        the schedule entry of every date, and with a range an entry without games for each of its dates the
+        api had none for, so a reparse can tell a date without games from one that was never archived
+        '''
+        for date in dates:
+            self._write(RawScheduleKey(date['date']).key(), date)
+
+        if start_date is None:
+            return
+
+        archived = {date['date'] for date in dates}
+        date = start_date
+
+        while date <= end_date:
+            day = date.strftime(DATE_FORMAT)
+
+            if day not in archived:
+                self._write(RawScheduleKey(day).key(), {'date': day, 'games': []})
+
+            date += timedelta(days=1)
+
+    def store_boxscore(self, game, boxscore: dict) -> None:
+        self._write(RawBoxscoreKey(game.season, game.date, game.id).key(), boxscore)
+
+    def read_schedule(self, start_date: datetime, end_date: datetime) -> list:
+        ''' the archived schedule entries of every date in the range, dates never archived are left out '''
+        dates = []
+        date = start_date
+
+        while date <= end_date:
+            entry = self._read(RawScheduleKey(date.strftime(DATE_FORMAT)).key())
+
+            if entry is not None:
+                dates.append(entry)
+
+            date += timedelta(days=1)
+
+        return dates
+
+    def read_boxscore(self, game) -> dict:
+        return self._read(RawBoxscoreKey(game.season, game.date, game.id).key())
+
+    def _write(self, key: str, payload: dict) -> None:
+        body = gzip.compress(json.dumps(payload).encode('utf-8'), compresslevel=self.compresslevel)
+
+        self.storage.write_object(key, body, ContentType='application/json', ContentEncoding='gzip')
+
+    def _read(self, key: str) -> dict:
+        body = self.storage.read_object(key)
+
+        return json.loads(gzip.decompress(body)) if body is not None else None
+
+
+class ArchiveApi():
+    '''
+    answers NHLApi's schedule and boxscore calls from a RawArchive, so a Crawler built on it rebuilds
+    output with no api traffic.  Boxscores are found through the games of the schedules read so far.
+    '''
+    def __init__(self, archive: RawArchive, parser):
+        self.archive = archive
+        self.parser = parser
+
+        self._games = {}
+
+    def schedule(self, start_date: datetime, end_date: datetime, expand: str = None) -> dict:
+        dates = self.archive.read_schedule(start_date, end_date)
+
+        for game in self.parser.parse_games(dates):
+            self._games[game.id] = game
+
+        if not dates:
+            LOG.error("No archived schedule from {} to {}".format(start_date, end_date))
+            return {}
+
+        if len(dates) < (end_date - start_date).days + 1:
+            LOG.warning("Only {} dates from {} to {} are archived".format(len(dates), start_date, end_date))
+
+        # dates archived without games are only there to tell them apart from dates never archived
+        return {'dates': [date for date in dates if date.get('games')]}
+
+    def boxscore(self, game_id, final: bool = False) -> dict:
+        game = self._games.get(game_id)
+
+        if game is None:
+            LOG.error("Game {} isn't part of any archived schedule".format(game_id))
+            return {}
+
+        boxscore = self.archive.read_boxscore(game)
+
+        if boxscore is None:
+            LOG.error("No archived boxscore for game {}".format(game_id))
+            return {}
+
+        return boxscore
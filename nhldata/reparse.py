@@ -0,0 +1,56 @@
+'''
+Rebuilds crawler output from the raw archive written by --archive_raw crawls, without calling the api.
+
+The range is split into windows reparsed across worker processes, so decoding and parsing use every core,
+and output is written with the usual layout, format and schema options.  Like a backfill, completed
+windows are checkpointed, per schema version, layout and format, and a rerun only picks up the ones that
+didn't finish.
+
+    python -m nhldata.reparse --start_date 2019-10-02 --end_date 2020-04-04 --version v3 --layout game --processes 8
+'''
+import os
+import logging
+
+from nhldata.app import add_crawler_arguments, build_crawler
+from nhldata.backfill import backfill
+from nhldata.raw import RawArchive, ArchiveApi
+
+
+LOG = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = '_reparse'
+
+
+def build_reparse_crawler(args):
+    ''' a crawler reading the schedule and boxscores from the archive in its own bucket '''
+    crawler = build_crawler(args)
+    crawler.api = ArchiveApi(RawArchive(crawler.storage), crawler.parser)
+
+    return crawler
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='NHL Stats reparse from the raw archive')
+    parser.add_argument("--start_date", required=True, type=str)
+    parser.add_argument("--end_date", required=True, type=str)
+    parser.add_argument("--window_days", default=3, type=int,
+                        help="days of archived games reparsed by one window")
+    parser.add_argument("--processes", default=os.cpu_count(), type=int,
+                        help="number of windows reparsed at the same time, every core by default")
+    add_crawler_arguments(parser)
+    args = parser.parse_args()
+
+    # the archive already holds everything and every game is rebuilt, whatever the output holds
+    args.archive_raw = False
+    args.incremental = False
+    args.hydrate = False
+
+    checkpoint_prefix = f'{CHECKPOINT_PREFIX}/{args.version}_{args.layout}_{args.format}'
+
+    if not backfill(args, build=build_reparse_crawler, checkpoint_prefix=checkpoint_prefix):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
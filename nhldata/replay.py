@@ -0,0 +1,291 @@
+'''
+Local stand-in for the NHL stats api, replaying recorded responses so crawls can be load tested offline.
+
+Serves /api/v1/schedule and /api/v1/game/{id}/boxscore from a fixtures directory holding a schedule.json
+and boxscores: boxscore_{gameid}.json answers for that game, boxscore.json for every other game.  With
+games_per_day the recorded schedule is replaced by a synthetic one with that many games on every
+requested date, so a full season can be crawled from a single recorded game.  A schedule requested with
+expand=schedule.boxscore carries each game's boxscore.  Every response carries an ETag and a request
+sending it back in If-None-Match gets a 304, as the live poller expects.  Latency, 5xx errors and
+429s are injected at the configured rates.
+
+    python -m nhldata.replay --port 8080 --games_per_day 8 --latency 0.05 --error_rate 0.01 --throttle_rate 0.01
+    python -m nhldata.app --api_base http://127.0.0.1:8080/api/v1 --start_date 2019-10-02 --end_date 2020-04-04 --workers 16
+'''
+import re
+import copy
+import hashlib
+import json
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+LOG = logging.getLogger(__name__)
+
+PREFIX = '/api/v1'
+DATE_FORMAT = '%Y-%m-%d'
+
+_BOXSCORE_PATH = re.compile(r'^/game/(\d+)/boxscore$')
+
+
+@dataclass
+class ReplayConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    games_per_day: int = None
+    seed: int = None
+
+
+class ReplayCatalog():
+    ''' the responses to replay, built once and served as pre-encoded json '''
+    def __init__(self, schedule: dict, boxscores: dict, default_boxscore: dict = None, games_per_day: int = None):
+        self.schedule_data = schedule
+        self.games_per_day = games_per_day
+
+        self._boxscores = {str(game_id): self._encode(boxscore) for game_id, boxscore in boxscores.items()}
+        self._default_boxscore = self._encode(default_boxscore) if default_boxscore else None
+
+        self._template_game = next(
+            (game for date in schedule.get('dates', []) for game in date['games']),
+            {'status': {'abstractGameState': 'Final'}}
+        )
+
+    @classmethod
+    def from_directory(cls, directory, games_per_day: int = None) -> 'ReplayCatalog':
+        directory = Path(directory)
+        boxscores = {}
+        default_boxscore = None
+
+        for path in sorted(directory.glob('boxscore*.json')):
+            boxscore = json.loads(path.read_text())
+
+            if path.stem == 'boxscore':
+                default_boxscore = boxscore
+            else:
+                boxscores[path.stem.split('_', 1)[1]] = boxscore
+
+        schedule = json.loads((directory / 'schedule.json').read_text())
+
+        return cls(schedule, boxscores, default_boxscore, games_per_day)
+
+    def schedule(self, start_date: str, end_date: str, expand: str = '') -> bytes:
+        if self.games_per_day:
+            dates = self._synthetic_dates(datetime.strptime(start_date, DATE_FORMAT),
+                                          datetime.strptime(end_date, DATE_FORMAT))
+        else:
+            dates = [date for date in self.schedule_data.get('dates', []) if start_date <= date['date'] <= end_date]
+
+        games = sum(len(date['games']) for date in dates)
+
+        if 'schedule.boxscore' in expand.split(','):
+            dates = [dict(date, games=[self._hydrated(game) for game in date['games']]) for date in dates]
+
+        return self._encode(dict(self.schedule_data, dates=dates, totalItems=games, totalGames=games))
+
+    def boxscore(self, game_id: str) -> bytes:
+        ''' None when there is nothing recorded to answer for the game '''
+        return self._boxscores.get(game_id, self._default_boxscore)
+
+    def _hydrated(self, game: dict) -> dict:
+        boxscore = self.boxscore(str(game['gamePk']))
+
+        return dict(game, boxscore=json.loads(boxscore)) if boxscore else game
+
+    def _synthetic_dates(self, start_date: datetime, end_date: datetime) -> list:
+        '''
+        games_per_day final games on every date. Ids are numbered from September 1st of the season the date
+        belongs to, so the same date always gets the same games whatever range was asked for.
+        '''
+        dates = []
+        date = start_date
+
+        while date <= end_date:
+            season_start = date.year if date.month >= 9 else date.year - 1
+            day = (date - datetime(season_start, 9, 1)).days
+            games = []
+
+            for index in range(self.games_per_day):
+                game_id = int(f'{season_start}02{day * self.games_per_day + index + 1:04d}')
+                game = copy.deepcopy(self._template_game)
+                game.update({
+                    'gamePk': game_id,
+                    'link': f'{PREFIX}/game/{game_id}/feed/live',
+                    'season': f'{season_start}{season_start + 1}',
+                    'gameDate': date.strftime(DATE_FORMAT) + 'T23:00:00Z'
+                })
+                games.append(game)
+
+            dates.append({'date': date.strftime(DATE_FORMAT), 'totalItems': len(games), 'totalGames': len(games),
+                          'games': games, 'events': [], 'matches': []})
+            date += timedelta(days=1)
+
+        return dates
+
+    @staticmethod
+    def _encode(payload: dict) -> bytes:
+        return json.dumps(payload).encode('utf-8')
+
+
+class ReplayServer():
+    '''
+    serves a catalog over http on a background thread, every request on its own thread like the real
+    api's connection handling.  url is the base to hand NHLApi, and requests counts the responses sent
+    by status code.
+    '''
+    def __init__(self, catalog: ReplayCatalog, config: ReplayConfig = None, host: str = '127.0.0.1', port: int = 0):
+        self.catalog = catalog
+        self.config = config if config else ReplayConfig()
+        self.requests = {}
+
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{PREFIX}'
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+
+        LOG.info("Replaying the NHL api at {}".format(self.url))
+
+        return self
+
+    def serve_forever(self) -> None:
+        LOG.info("Replaying the NHL api at {}".format(self.url))
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, path: str, query: dict, headers: dict = None) -> tuple:
+        ''' (status, headers, body) for a request with the given request headers, after the configured latency '''
+        delay, roll = self._draw()
+
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.config.throttle_rate:
+            return 429, {'Retry-After': str(self.config.retry_after)}, b''
+
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return 503, {}, b''
+
+        body = None
+
+        if path == f'{PREFIX}/schedule':
+            start_date = query.get('startDate', [None])[0]
+            end_date = query.get('endDate', [start_date])[0]
+
+            if start_date:
+                body = self.catalog.schedule(start_date, end_date, query.get('expand', [''])[0])
+
+        elif path.startswith(PREFIX):
+            match = _BOXSCORE_PATH.match(path[len(PREFIX):])
+
+            if match:
+                body = self.catalog.boxscore(match.group(1))
+
+        if body is None:
+            return 404, {}, b''
+
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+
+        if headers and headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+
+        return 200, {'Content-Type': 'application/json', 'ETag': etag}, body
+
+    def _draw(self) -> tuple:
+        with self._lock:
+            jitter = self._random.uniform(-self.config.jitter, self.config.jitter) if self.config.jitter else 0.0
+            roll = self._random.random()
+
+        return max(0.0, self.config.latency + jitter), roll
+
+    def _count(self, status: int) -> None:
+        with self._lock:
+            self.requests[status] = self.requests.get(status, 0) + 1
+
+
+def _handler(replay: ReplayServer):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, headers, body = replay.respond(url.path, parse_qs(url.query), self.headers)
+            replay._count(status)
+
+            self.send_response(status)
+
+            for name, value in headers.items():
+                self.send_header(name, value)
+
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            LOG.debug(format % args)
+
+    return ReplayHandler
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='NHL api replay server')
+    parser.add_argument("--fixtures", default=str(Path(__file__).parent.parent / 'tests' / 'fixtures'), type=str,
+                        help="directory holding schedule.json and boxscore*.json")
+    parser.add_argument("--host", default="127.0.0.1", type=str)
+    parser.add_argument("--port", default=8080, type=int)
+    parser.add_argument("--latency", default=0.0, type=float, help="seconds added to every response")
+    parser.add_argument("--jitter", default=0.0, type=float, help="latency varies by up to this many seconds")
+    parser.add_argument("--error_rate", default=0.0, type=float, help="share of requests answered with a 503")
+    parser.add_argument("--throttle_rate", default=0.0, type=float, help="share of requests answered with a 429")
+    parser.add_argument("--retry_after", default=1.0, type=float, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--games_per_day", default=None, type=int,
+                        help="synthesize this many games on every date instead of the recorded schedule")
+    parser.add_argument("--seed", default=None, type=int)
+    args = parser.parse_args()
+
+    catalog = ReplayCatalog.from_directory(args.fixtures, args.games_per_day)
+    config = ReplayConfig(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                          args.games_per_day, args.seed)
+    server = ReplayServer(catalog, config, args.host, args.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
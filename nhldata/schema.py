@@ -68,3 +68,147 @@ NHL_SCHEMA = {
         'side'
     ]
 }
+
+# v2 carries the game each row belongs to, so reloading a game can replace exactly its rows
+NHL_SCHEMA['v2'] = NHL_SCHEMA['v1'] + [
+    'game_id',
+    'game_date'
+]
+
+# column types matching utils/create_games_stats.sql, used by typed output formats
+NHL_COLUMN_TYPES = {
+    'v1': {
+        'player_person_id': 'int',
+        'player_jerseyNumber': 'int',
+        'player_person_active': 'bool',
+        'player_person_alternateCaptain': 'bool',
+        'player_person_birthCity': 'str',
+        'player_person_birthCountry': 'str',
+        'player_person_birthDate': 'str',
+        'player_person_birthStateProvince': 'str',
+        'player_person_captain': 'bool',
+        'player_person_currentAge': 'int',
+        'player_person_currentTeam_id': 'int',
+        'player_person_currentTeam_link': 'str',
+        'player_person_currentTeam_name': 'str',
+        'player_person_firstName': 'str',
+        'player_person_fullName': 'str',
+        'player_person_height': 'str',
+        'player_person_lastName': 'str',
+        'player_person_link': 'str',
+        'player_person_nationality': 'str',
+        'player_person_primaryNumber': 'int',
+        'player_person_primaryPosition_abbreviation': 'str',
+        'player_person_primaryPosition_code': 'str',
+        'player_person_primaryPosition_name': 'str',
+        'player_person_primaryPosition_type': 'str',
+        'player_person_rookie': 'bool',
+        'player_person_rosterStatus': 'str',
+        'player_person_shootsCatches': 'str',
+        'player_person_weight': 'int',
+        'player_stats_goalieStats_assists': 'float',
+        'player_stats_goalieStats_decision': 'str',
+        'player_stats_goalieStats_evenSaves': 'float',
+        'player_stats_goalieStats_evenShotsAgainst': 'float',
+        'player_stats_goalieStats_evenStrengthSavePercentage': 'float',
+        'player_stats_goalieStats_goals': 'float',
+        'player_stats_goalieStats_pim': 'float',
+        'player_stats_goalieStats_powerPlaySavePercentage': 'float',
+        'player_stats_goalieStats_powerPlaySaves': 'float',
+        'player_stats_goalieStats_powerPlayShotsAgainst': 'float',
+        'player_stats_goalieStats_savePercentage': 'float',
+        'player_stats_goalieStats_saves': 'float',
+        'player_stats_goalieStats_shortHandedSavePercentage': 'float',
+        'player_stats_goalieStats_shortHandedSaves': 'float',
+        'player_stats_goalieStats_shortHandedShotsAgainst': 'float',
+        'player_stats_goalieStats_shots': 'float',
+        'player_stats_goalieStats_timeOnIce': 'str',
+        'player_stats_skaterStats_assists': 'float',
+        'player_stats_skaterStats_blocked': 'float',
+        'player_stats_skaterStats_evenTimeOnIce': 'str',
+        'player_stats_skaterStats_faceOffPct': 'float',
+        'player_stats_skaterStats_faceOffWins': 'float',
+        'player_stats_skaterStats_faceoffTaken': 'float',
+        'player_stats_skaterStats_giveaways': 'float',
+        'player_stats_skaterStats_goals': 'float',
+        'player_stats_skaterStats_hits': 'float',
+        'player_stats_skaterStats_penaltyMinutes': 'float',
+        'player_stats_skaterStats_plusMinus': 'float',
+        'player_stats_skaterStats_powerPlayAssists': 'float',
+        'player_stats_skaterStats_powerPlayGoals': 'float',
+        'player_stats_skaterStats_powerPlayTimeOnIce': 'str',
+        'player_stats_skaterStats_shortHandedAssists': 'float',
+        'player_stats_skaterStats_shortHandedGoals': 'float',
+        'player_stats_skaterStats_shortHandedTimeOnIce': 'str',
+        'player_stats_skaterStats_shots': 'float',
+        'player_stats_skaterStats_takeaways': 'float',
+        'player_stats_skaterStats_timeOnIce': 'str',
+        'side': 'str'
+    }
+}
+
+NHL_COLUMN_TYPES['v2'] = dict(NHL_COLUMN_TYPES['v1'], game_id='int', game_date='str')
+
+# v3 normalizes at ingest: time on ice becomes int seconds instead of an "MM:SS" string, so downstream
+# totals are plain integer sums
+NHL_SCHEMA['v3'] = list(NHL_SCHEMA['v2'])
+
+NHL_COLUMN_TYPES['v3'] = dict(
+    NHL_COLUMN_TYPES['v2'],
+    **{column: 'int' for column in NHL_SCHEMA['v3'] if column.lower().endswith('timeonice')}
+)
+
+
+# static player attributes repeated by every row of a player. With split players they are written once
+# per player to a dimension keyed by player_person_id, and the rest are left out of the per game rows
+PLAYER_DIMENSION_COLUMNS = [
+    column for column in NHL_SCHEMA['v1'] if column.startswith('player_person_') and column != 'player_person_id'
+]
+
+# of those, the name the dbt marts report and the player's team at the time of the game stay in the per
+# game rows too: the team changes with trades, so only the game's own row can attribute it
+PLAYER_GAME_COLUMNS = [
+    'player_person_fullName',
+    'player_person_currentTeam_id',
+    'player_person_currentTeam_link',
+    'player_person_currentTeam_name'
+]
+
+NHL_SCHEMA['players'] = ['player_person_id'] + PLAYER_DIMENSION_COLUMNS
+
+NHL_COLUMN_TYPES['players'] = {column: NHL_COLUMN_TYPES['v3'][column] for column in NHL_SCHEMA['players']}
+
+def _nullable(convert):
+    def converter(value):
+        if value is None or value != value:
+            return None
+
+        return convert(value)
+
+    return converter
+
+def _to_int(value) -> int:
+    ''' ints, numeric strings and "MM:SS" clocks, which become seconds '''
+    if isinstance(value, str):
+        if ':' in value:
+            minutes, seconds = value.split(':')
+            return int(minutes) * 60 + int(seconds)
+
+        return int(float(value))
+
+    return int(value)
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 't', 'y', 'yes', '1')
+
+    return bool(value)
+
+
+# turns a raw value into the python value of a NHL_COLUMN_TYPES type, None stays None
+COLUMN_CONVERTERS = {
+    'int': _nullable(_to_int),
+    'bool': _nullable(_to_bool),
+    'float': _nullable(float),
+    'str': _nullable(str)
+}
@@ -1,10 +1,30 @@
 import logging
+from typing import TYPE_CHECKING
 from collections import namedtuple
 
-import pandas as pd
+from nhldata.extractor import compile_extractor
+from nhldata.schema import NHL_COLUMN_TYPES, COLUMN_CONVERTERS
 
 
-NhlParsingStrategy = namedtuple('NhlParsingStrategy', 'parse_game_id, parse_player_info')
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+LOG = logging.getLogger(__name__)
+
+
+# compile_extractor builds the row extractor parse_player_rows is handed, from the output columns, and
+# parse_hydrated_boxscores reads the boxscores embedded in a hydrated schedule
+NhlParsingStrategy = namedtuple(
+    'NhlParsingStrategy',
+    'parse_game_id, parse_player_info, parse_games, parse_player_rows, compile_extractor, parse_hydrated_boxscores',
+    defaults=(compile_extractor, None)
+)
+
+NhlGame = namedtuple('NhlGame', 'id, date, season, state')
+
+FINAL_STATE = 'Final'
+LIVE_STATE = 'Live'
 
 
 def parse_game_id(dates: list) -> list:
@@ -16,138 +36,116 @@ def parse_game_id(dates: list) -> list:
 
     return ids
 
-def _parse_personal_info(personal_info: dict, jersey_number: int, output_cols: list) -> pd.DataFrame:
-    current_team_info = personal_info['currentTeam']
-    current_pos_info = personal_info['primaryPosition']
-
-    player_id = personal_info['id']
-    name = personal_info['fullName']
-
-    logging.info("Parsing player information for: {}, id: {}".format(name, player_id))
-
-    reorganized_cols = [(
-        player_id,
-        jersey_number,
-        personal_info['active'],
-        personal_info['alternateCaptain'],
-        personal_info['birthCity'],
-        personal_info['birthCountry'],
-        personal_info['birthDate'],
-        personal_info.get('birthStateProvince'),
-        personal_info['captain'],
-        personal_info['currentAge'],
-        current_team_info['id'],
-        current_team_info['link'],
-        current_team_info['name'],
-        personal_info['firstName'],
-        name,
-        personal_info['height'],
-        personal_info['lastName'],
-        personal_info['link'],
-        personal_info['nationality'],
-        personal_info['primaryNumber'],
-        current_pos_info['abbreviation'],
-        current_pos_info['code'],
-        current_pos_info['name'],
-        current_pos_info['type'],
-        personal_info['rookie'],
-        personal_info['rosterStatus'],
-        personal_info['shootsCatches'],
-        personal_info['weight']
-    )]
-
-    return pd.DataFrame(reorganized_cols, columns=output_cols)
-
-def _parse_goalie_stats(stats: dict, output_cols: list) -> pd.DataFrame:
-    if stats:
-        reorganized_cols = [(
-            stats['assists'],
-            stats['decision'],
-            stats['evenSaves'],
-            stats['evenShotsAgainst'],
-            stats['evenStrengthSavePercentage'],
-            stats['goals'],
-            stats['pim'],
-            stats.get('powerPlaySavePercentage'),
-            stats['powerPlaySaves'],
-            stats['powerPlayShotsAgainst'],
-            stats['savePercentage'],
-            stats['saves'],
-            stats.get('shortHandedSavePercentage'),
-            stats['shortHandedSaves'],
-            stats['shortHandedShotsAgainst'],
-            stats['shots'],
-            stats['timeOnIce']
-        )]
-    else:
-        reorganized_cols = []
-
-    return pd.DataFrame(reorganized_cols, columns=output_cols)
-
-def _parse_skater_stats(stats: dict, output_cols: list) -> pd.DataFrame:
-    if stats:
-        reorganized_cols = [(
-            stats['assists'],
-            stats['blocked'],
-            stats['evenTimeOnIce'],
-            stats.get('faceOffPct'),
-            stats['faceOffWins'],
-            stats['faceoffTaken'],
-            stats['giveaways'],
-            stats['goals'],
-            stats['hits'],
-            stats['penaltyMinutes'],
-            stats['plusMinus'],
-            stats['powerPlayAssists'],
-            stats['powerPlayGoals'],
-            stats['powerPlayTimeOnIce'],
-            stats['shortHandedAssists'],
-            stats['shortHandedGoals'],
-            stats['shortHandedTimeOnIce'],
-            stats['shots'],
-            stats['takeaways'],
-            stats['timeOnIce'],
-            stats.get('side')
-        )]
-    else:
-        reorganized_cols = []
-
-    return pd.DataFrame(reorganized_cols, columns=output_cols)
-
-def _parse_stats(stats: dict, goalie_cols: list, skater_cols: list) -> list:
-    goalie_stats = stats.get('goalieStats')
-    skater_stats = stats.get('skaterStats')
-
-    goalie_df = _parse_goalie_stats(goalie_stats, goalie_cols)
-    skater_df = _parse_skater_stats(skater_stats, skater_cols)
-
-    return pd.concat([goalie_df, skater_df], ignore_index=True)
-
-
-def parse_player_info(boxscore: dict, output_cols: list) -> list:
-    players_info = []
-    teams = boxscore['teams']
-    player_cols = output_cols[:28]
+def parse_games(dates: list) -> list:
+    games = []
+
+    for date in dates:
+        for game in date['games']:
+            games.append(NhlGame(
+                game['gamePk'],
+                date.get('date'),
+                game.get('season') or season_of(game['gamePk']),
+                game.get('status', {}).get('abstractGameState')
+            ))
+
+    return games
+
+def parse_hydrated_boxscores(dates: list) -> dict:
+    '''
+    game id -> boxscore for the games of a hydrated schedule that carry a complete one, i.e. both teams
+    with their players.  Games left out have to be fetched on their own.
+    '''
+    boxscores = {}
+
+    for date in dates:
+        for game in date['games']:
+            boxscore = game.get('boxscore') or game.get('liveData', {}).get('boxscore')
+
+            if _complete_boxscore(boxscore):
+                boxscores[game['gamePk']] = boxscore
+
+    return boxscores
+
+def _complete_boxscore(boxscore) -> bool:
+    teams = (boxscore or {}).get('teams') or {}
+
+    return all(isinstance(teams.get(side), dict) and teams[side].get('players') for side in ('home', 'away'))
+
+def season_of(game_id) -> str:
+    ''' game ids start with the year the season started in, e.g. 2019030042 is part of 20192020 '''
+    start_year = int(str(game_id)[:4])
 
-    logging.info("Parsing Player Information")
+    return f'{start_year}{start_year + 1}'
+
+def _parse_personal_info(personal_info: dict, jersey_number: int, output_cols: list) -> 'pd.DataFrame':
+    import pandas as pd
+
+    LOG.debug("Parsing player information for: {}, id: {}".format(personal_info['fullName'], personal_info['id']))
+
+    player = {'person': personal_info, 'jerseyNumber': jersey_number}
+
+    return pd.DataFrame([compile_extractor(output_cols)(player, {})], columns=output_cols)
+
+def _parse_goalie_stats(stats: dict, output_cols: list) -> 'pd.DataFrame':
+    import pandas as pd
+
+    player = {'stats': {'goalieStats': stats}}
+
+    return pd.DataFrame([compile_extractor(output_cols)(player, {})] if stats else [], columns=output_cols)
+
+def _parse_skater_stats(stats: dict, output_cols: list) -> 'pd.DataFrame':
+    import pandas as pd
+
+    player = {'stats': {'skaterStats': stats}}
+
+    return pd.DataFrame([compile_extractor(output_cols)(player, {})] if stats else [], columns=output_cols)
+
+
+def parse_player_rows(boxscore: dict, extractor, game: NhlGame = None) -> list:
+    '''
+    one plain tuple per player, in the column order the extractor was compiled for. Building the frame is
+    left to the caller so a whole game costs one DataFrame instead of several per player.
+
+    game fills the game_* columns of schemas that have them.
+    '''
+    rows = []
+    teams = boxscore['teams']
+    game_context = {'id': game.id, 'date': game.date} if game else {}
 
     for target_team in ['home', 'away']:
         players = teams[target_team]['players']
+        context = {'side': target_team, 'game': game_context}
 
         for player in players.values():
-            personal_info = _parse_personal_info(player['person'], player['jerseyNumber'], player_cols)
+            rows.append(extractor(player, context))
+
+    LOG.debug("Parsed {} players".format(len(rows)))
+
+    return rows
+
+def parse_player_info(boxscore: dict, output_cols: list, game: NhlGame = None) -> list:
+    import pandas as pd
+
+    rows = parse_player_rows(boxscore, compile_extractor(output_cols), game)
 
-            stats = _parse_stats(player['stats'], output_cols[28:45], output_cols[45:])
+    return [pd.DataFrame([row], columns=output_cols) for row in rows]
 
-            player_data = pd.concat([personal_info, stats], ignore_index=True)
 
-            player_df = pd.DataFrame(player_data, columns=output_cols)
+def typed_extractor(column_types: dict) -> callable:
+    ''' compiles extractors converting every value to its column type, e.g. "MM:SS" to int seconds '''
+    def compile_typed_extractor(output_cols):
+        return compile_extractor(output_cols, [
+            COLUMN_CONVERTERS.get(column_types.get(column)) for column in output_cols
+        ])
 
-            players_info.append(player_df)
+    return compile_typed_extractor
 
-    return players_info
 
+# reads any NHL_SCHEMA version through its compiled extractor
+SCHEMA_PARSING_STRATEGY = NhlParsingStrategy(parse_game_id, parse_player_info, parse_games, parse_player_rows,
+                                             parse_hydrated_boxscores=parse_hydrated_boxscores)
 
 NHL_PARSING_STRATEGY = {
-    'v1': NhlParsingStrategy(parse_game_id, parse_player_info)
+    'v1': SCHEMA_PARSING_STRATEGY,
+    'v3': SCHEMA_PARSING_STRATEGY._replace(compile_extractor=typed_extractor(NHL_COLUMN_TYPES['v3']))
 }
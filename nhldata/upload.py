@@ -0,0 +1,83 @@
+import queue
+import logging
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UploadExecutor():
+    '''
+    hands Storage.store_game calls to a pool of uploader threads sharing the storage's s3 client.
+
+    Pending uploads wait in a bounded queue and submit() blocks while it is full, so fetching and parsing
+    can't run ahead of the uploads and memory stays flat.  flush() waits for everything submitted so far
+    and returns the errors of the uploads that failed, keyed by their storage key.
+    '''
+    def __init__(self, storage, workers: int = 4, max_pending: int = 64):
+        self.storage = storage
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'uploader-{index}', daemon=True)
+            for index in range(max(1, workers))
+        ]
+
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, data) -> None:
+        self._queue.put((key, data))
+
+    def flush(self) -> dict:
+        self._queue.join()
+
+        with self._lock:
+            errors, self._errors = self._errors, {}
+
+        return errors
+
+    def close(self) -> dict:
+        errors = self.flush()
+
+        for _ in self._threads:
+            self._queue.put(_STOP)
+
+        for thread in self._threads:
+            thread.join()
+
+        return errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is _STOP:
+                    return
+
+                key, data = item
+                self._upload(key, data)
+
+            finally:
+                self._queue.task_done()
+
+    def _upload(self, key, data) -> None:
+        try:
+            self.storage.store_game(key, data)
+        except Exception as e:
+            object_key = self.storage.object_key(key)
+            LOG.error("Failed to upload {}".format(object_key), exc_info=True)
+
+            with self._lock:
+                self._errors[object_key] = repr(e)
@@ -0,0 +1,89 @@
+'''
+In-memory stand-ins for the bucket shared by the tests, and by the benchmarks for MemoryS3Client.
+'''
+import hashlib
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+
+
+class ObjectStorage():
+    ''' Storage's read_object and write_object calls on a dict, with a version number as the ETag '''
+    def __init__(self):
+        self.objects = {}
+        self.versions = {}
+
+    def read_object(self, key):
+        return self.objects.get(key)
+
+    def read_object_version(self, key):
+        return self.objects.get(key), self.versions.get(key)
+
+    def write_object(self, key, body, **kwargs):
+        self.objects[key] = body
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def write_object_if(self, key, body, etag, **kwargs):
+        if self.versions.get(key) != etag:
+            return False
+
+        self.write_object(key, body, **kwargs)
+        return True
+
+
+class MemoryS3Client():
+    '''
+    the s3 client calls Storage makes, on objects kept as bytes by key with the arguments they were
+    written with in extra_args.  Puts honor IfMatch and IfNoneMatch against the md5 ETag of the body.
+    With keep_bodies=False only the number and size of the objects written are kept, as bytes, so
+    benchmarks measure the writer rather than the stand-in.
+    '''
+    def __init__(self, keep_bodies: bool = True):
+        self.keep_bodies = keep_bodies
+        self.objects = {}
+        self.extra_args = {}
+        self.written = 0
+        self.bytes = 0
+        self.deleted = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        etag = self._etag(Key)
+
+        if kwargs.pop('IfMatch', etag) != etag or (kwargs.pop('IfNoneMatch', None) and etag):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+
+        body = Body.read() if hasattr(Body, 'read') else Body
+        body = body.encode('utf-8') if isinstance(body, str) else body
+
+        self.written += 1
+        self.bytes += len(body)
+
+        if self.keep_bodies:
+            self.objects[Key] = body
+            self.extra_args[Key] = kwargs
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        self.put_object(Bucket, Key, Fileobj, **dict(ExtraArgs or {}, multipart=True))
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+
+        return {'Body': BytesIO(self.objects[Key]), 'ETag': self._etag(Key)}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {'Contents': [
+            {'Key': key, 'ETag': self._etag(key), 'Size': len(body)}
+            for key, body in sorted(self.objects.items()) if key.startswith(Prefix)
+        ]}
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete['Objects']:
+            self.deleted.append(entry['Key'])
+            self.objects.pop(entry['Key'], None)
+
+    def _etag(self, key):
+        return '"{}"'.format(hashlib.md5(self.objects[key]).hexdigest()) if key in self.objects else None
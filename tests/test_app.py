@@ -1,5 +1,400 @@
+import gzip
+import json
+import threading
+from pathlib import Path
+from datetime import datetime
+
 import pytest
+import pandas as pd
+
+from nhldata.app import Crawler, Storage, GameStorageKey
+from nhldata.formats import CsvFormat, OUTPUT_FORMATS, decompress
+from nhldata.manifest import GameManifest
+from nhldata.metrics import Metrics
+from nhldata.players import PlayerDimension
+from nhldata.strategy import NhlGame
+from nhldata.upload import UploadExecutor
+from tests.conftest import MemoryS3Client
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+class FakeApi():
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.schedule_data = json.loads((FIXTURES / 'schedule.json').read_text())
+        self.boxscore_data = json.loads((FIXTURES / 'boxscore.json').read_text())
+        self.fetched = []
+        self.expanded = []
+        self._lock = threading.Lock()
+
+    def schedule(self, start_date, end_date, expand=None):
+        if expand:
+            self.expanded.append((start_date, end_date, expand))
+
+        return self.schedule_data
+
+    def boxscore(self, game_id, final=False):
+        with self._lock:
+            self.fetched.append(game_id)
+
+        return {} if game_id in self.failing else self.boxscore_data
+
+
+class FakeStorage():
+    def __init__(self):
+        self.stored = {}
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def store_game(self, key, game_data):
+        with self._lock:
+            self.stored[key.key()] = game_data
+
+        return True
+
+    def object_key(self, key):
+        return key.key()
+
+    def read_object(self, key):
+        return self.objects.get(key)
+
+    def read_object_version(self, key):
+        body = self.objects.get(key)
+
+        return body, hash(body) if body is not None else None
+
+    def write_object(self, key, body, **kwargs):
+        self.objects[key] = body
+
+    def write_object_if(self, key, body, etag, **kwargs):
+        with self._lock:
+            if self.read_object_version(key)[1] != etag:
+                return False
+
+            self.objects[key] = body
+            return True
+
+
+@pytest.fixture()
+def start_date():
+    return datetime.strptime("2020-08-04", "%Y-%m-%d")
+
+@pytest.fixture()
+def end_date():
+    return datetime.strptime("2020-08-05", "%Y-%m-%d")
+
 
 # TODO feel free to add tests for anything as you work things out
 def test_app():
     pass
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_stores_every_player(start_date, end_date, workers):
+    api = FakeApi()
+    storage = FakeStorage()
+
+    result = Crawler(api, storage, 'v1', workers=workers).crawl(start_date, end_date)
+
+    assert sorted(api.fetched) == [2019030042, 2019030043, 2019030044]
+    assert sorted(result.succeeded) == [2019030042, 2019030043, 2019030044]
+    assert result.failed == []
+    assert len(storage.stored) == 3 * 6
+    assert '8475683/2019030042.csv' in storage.stored
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_reports_failed_games(start_date, end_date, workers):
+    api = FakeApi(failing=[2019030043])
+    storage = FakeStorage()
+
+    result = Crawler(api, storage, 'v1', workers=workers).crawl(start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030044]
+    assert result.failed == [2019030043]
+    assert not any(key.endswith('/2019030043.csv') for key in storage.stored)
+
+def test_crawl_without_games(start_date, end_date):
+    api = FakeApi()
+    api.schedule_data = {}
+
+    result = Crawler(api, FakeStorage(), 'v1').crawl(start_date, end_date)
+
+    assert result.succeeded == []
+    assert result.failed == []
+    assert result.schedule_failed
+
+def test_crawl_of_a_range_without_games_succeeds(start_date, end_date):
+    api = FakeApi()
+    api.schedule_data = dict(api.schedule_data, dates=[], totalGames=0)
+
+    result = Crawler(api, FakeStorage(), 'v1').crawl(start_date, end_date)
+
+    assert result.succeeded == []
+    assert not result.schedule_failed
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_game_layout(start_date, end_date, workers):
+    storage = FakeStorage()
+
+    result = Crawler(FakeApi(), storage, 'v1', workers=workers, layout='game').crawl(start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030043, 2019030044]
+    assert sorted(storage.stored) == [
+        'season=20192020/date=2020-08-04/2019030042.csv',
+        'season=20192020/date=2020-08-04/2019030043.csv',
+        'season=20192020/date=2020-08-05/2019030044.csv'
+    ]
+    assert len(storage.stored['season=20192020/date=2020-08-04/2019030042.csv']) == 6
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_date_layout(start_date, end_date, workers):
+    api = FakeApi(failing=[2019030044])
+    storage = FakeStorage()
+
+    result = Crawler(api, storage, 'v1', workers=workers, layout='date').crawl(start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030043]
+    assert result.failed == [2019030044]
+    assert list(storage.stored) == ['season=20192020/date=2020-08-04/games.csv']
+    assert len(storage.stored['season=20192020/date=2020-08-04/games.csv']) == 12
+
+def test_date_layout_keeps_a_landed_date_when_one_of_its_games_fails(start_date, end_date):
+    storage = FakeStorage()
+    manifest = GameManifest(storage).load()
+    Crawler(FakeApi(), storage, 'v1', layout='date', manifest=manifest).crawl(start_date, end_date)
+    landed = storage.stored['season=20192020/date=2020-08-04/games.csv']
+
+    rerun = Crawler(FakeApi(failing=[2019030043]), storage, 'v1', layout='date', manifest=GameManifest(storage))
+    result = rerun.crawl(start_date, end_date)
+
+    assert sorted(result.failed) == [2019030042, 2019030043]
+    assert result.succeeded == [2019030044]
+    assert storage.stored['season=20192020/date=2020-08-04/games.csv'] is landed
+    assert len(landed) == 12
+    assert sorted(json.loads(storage.objects[GameManifest.KEY])) == ['2019030044']
+
+def test_unknown_layout():
+    with pytest.raises(ValueError):
+        Crawler(FakeApi(), FakeStorage(), 'v1', layout='team')
+
+def test_crawl_with_background_uploads(start_date, end_date):
+    storage = FakeStorage()
+
+    with UploadExecutor(storage, workers=2, max_pending=4) as uploader:
+        result = Crawler(FakeApi(), storage, 'v1', workers=2, uploader=uploader).crawl(start_date, end_date)
+
+    assert result.failed_uploads == {}
+    assert len(storage.stored) == 3 * 6
+
+def test_storage_uses_format_extension():
+    s3_client = MemoryS3Client()
+    output_format = CsvFormat()
+    output_format.extension = 'txt'
+
+    storage = Storage('bucket', s3_client, output_format)
+    storage.store_game(GameStorageKey('20192020', '2020-08-04', 2019030042), pd.DataFrame({'a': [1]}))
+
+    key = 'season=20192020/date=2020-08-04/2019030042.txt'
+    assert s3_client.objects[key] == b',a\n0,1\n'
+    assert s3_client.extra_args[key] == {'ContentType': 'text/csv'}
+
+@pytest.mark.parametrize('output_format, encoding', [('csv.gz', 'gzip'), ('csv.zst', 'zstd')])
+def test_storage_streams_compressed_objects(output_format, encoding):
+    s3_client = MemoryS3Client()
+
+    storage = Storage('bucket', s3_client, OUTPUT_FORMATS[output_format]())
+    storage.store_game(GameStorageKey('20192020', '2020-08-04', 2019030042), pd.DataFrame({'a': [1]}))
+
+    key = f'season=20192020/date=2020-08-04/2019030042.{output_format}'
+    body = s3_client.objects[key]
+    assert decompress(body) == b',a\n0,1\n'
+    assert s3_client.extra_args[key] == {'ContentType': 'text/csv', 'ContentEncoding': encoding}
+    assert storage.metrics.counter('nhl_bytes_stored_total') == len(body)
+
+def test_storage_uploads_large_objects_in_parts(monkeypatch):
+    s3_client = MemoryS3Client()
+    monkeypatch.setattr(Storage, 'MULTIPART_THRESHOLD', 64)
+
+    storage = Storage('bucket', s3_client, OUTPUT_FORMATS['csv.gz']())
+    storage.store_game(GameStorageKey('20192020', '2020-08-04', 2019030042), pd.DataFrame({'a': range(1000)}))
+
+    key = 'season=20192020/date=2020-08-04/2019030042.csv.gz'
+    body = s3_client.objects[key]
+    assert s3_client.extra_args[key]['multipart']
+    assert len(gzip.decompress(body).splitlines()) == 1001
+
+def test_storage_objects():
+    storage = Storage('bucket', MemoryS3Client())
+
+    assert storage.read_object('_manifest/games.json') is None
+
+    storage.write_object('_manifest/games.json', b'{}')
+
+    assert storage.read_object('_manifest/games.json') == b'{}'
+
+def test_storage_conditional_writes():
+    storage = Storage('bucket', MemoryS3Client())
+
+    assert storage.write_object_if('_manifest/games.json', b'{}', None)
+    assert not storage.write_object_if('_manifest/games.json', b'{"a": 1}', None)
+
+    body, etag = storage.read_object_version('_manifest/games.json')
+    storage.write_object('_manifest/games.json', b'{"b": 1}')
+
+    assert body == b'{}'
+    assert not storage.write_object_if('_manifest/games.json', b'{"a": 1}', etag)
+
+    etag = storage.read_object_version('_manifest/games.json')[1]
+    assert storage.write_object_if('_manifest/games.json', b'{"c": 1}', etag)
+    assert storage.read_object('_manifest/games.json') == b'{"c": 1}'
+
+def test_incremental_crawl_skips_landed_final_games(start_date, end_date):
+    api = FakeApi()
+    api.schedule_data['dates'][1]['games'][0]['status']['abstractGameState'] = 'Live'
+    storage = FakeStorage()
+
+    first = Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    assert first.succeeded == [2019030042, 2019030043, 2019030044]
+    assert sorted(json.loads(storage.objects[GameManifest.KEY])) == ['2019030042', '2019030043', '2019030044']
+
+    api.fetched.clear()
+    storage.stored.clear()
+
+    second = Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    assert second.skipped == [2019030042, 2019030043]
+    assert api.fetched == [2019030044]
+    assert storage.stored == {}
+
+def test_incremental_crawl_rewrites_changed_games(start_date, end_date):
+    api = FakeApi()
+    api.schedule_data['dates'][1]['games'][0]['status']['abstractGameState'] = 'Live'
+    storage = FakeStorage()
+
+    Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    storage.stored.clear()
+    api.boxscore_data['teams']['away']['players']['ID8474709']['stats']['skaterStats']['goals'] = 3
+
+    Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    assert len(storage.stored) == 6
+    assert all(key.endswith('/2019030044.csv') for key in storage.stored)
+
+def test_incremental_crawl_records_a_game_going_final_with_an_unchanged_boxscore(start_date, end_date):
+    api = FakeApi()
+    api.schedule_data['dates'][1]['games'][0]['status']['abstractGameState'] = 'Live'
+    storage = FakeStorage()
+    Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    api.schedule_data['dates'][1]['games'][0]['status']['abstractGameState'] = 'Final'
+    second = Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    entry = json.loads(storage.objects[GameManifest.KEY])['2019030044']
+    assert second.succeeded == [2019030044]
+    assert (entry['state'], entry['rows']) == ('Final', 6)
+
+    api.fetched.clear()
+    third = Crawler(api, storage, 'v1', manifest=GameManifest(storage).load()).crawl(start_date, end_date)
+
+    assert third.skipped == [2019030042, 2019030043, 2019030044]
+    assert api.fetched == []
+
+def test_incremental_date_layout_refetches_whole_dates(start_date, end_date):
+    api = FakeApi()
+    storage = FakeStorage()
+    manifest = GameManifest(storage)
+    manifest.record(NhlGame(2019030042, '2020-08-04', '20192020', 'Final'), 6, 'hash')
+    manifest.record(NhlGame(2019030044, '2020-08-05', '20192020', 'Final'), 6, 'hash')
+
+    result = Crawler(api, storage, 'v1', layout='date', manifest=manifest).crawl(start_date, end_date)
+
+    assert result.skipped == [2019030044]
+    assert sorted(api.fetched) == [2019030042, 2019030043]
+    assert len(storage.stored['season=20192020/date=2020-08-04/games.csv']) == 12
+
+def test_crawl_v2_rows_carry_the_game(start_date, end_date):
+    storage = FakeStorage()
+
+    Crawler(FakeApi(), storage, 'v2', layout='game').crawl(start_date, end_date)
+
+    game_df = storage.stored['season=20192020/date=2020-08-05/2019030044.csv']
+    assert set(game_df['game_id']) == {2019030044}
+    assert set(game_df['game_date']) == {'2020-08-05'}
+
+@pytest.mark.parametrize('layout', ['player', 'game', 'date'])
+def test_crawl_split_players(start_date, end_date, layout):
+    storage = FakeStorage()
+    players = PlayerDimension(storage)
+
+    result = Crawler(FakeApi(), storage, 'v3', workers=2, layout=layout, players=players).crawl(start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030043, 2019030044]
+
+    dimension_keys = sorted(key for key in storage.stored if key.startswith('players/'))
+    assert len(dimension_keys) == 6
+    assert 'player_person_birthCity' in storage.stored['players/8475683.csv'].columns
+
+    facts = [data for key, data in storage.stored.items() if not key.startswith('players/')]
+    assert facts and all('player_person_birthCity' not in data.columns for data in facts)
+    assert all('player_person_id' in data.columns for data in facts)
+    # the marts read the name and the team of the game from the per game rows
+    assert all({'player_person_fullName', 'player_person_currentTeam_name'} <= set(data.columns) for data in facts)
+
+    storage.stored.clear()
+    Crawler(FakeApi(), storage, 'v3', layout=layout, players=PlayerDimension(storage).load()).crawl(start_date, end_date)
+
+    assert not any(key.startswith('players/') for key in storage.stored)
+
+def test_crawl_metrics(start_date, end_date):
+    metrics = Metrics()
+    storage = Storage('bucket', MemoryS3Client(), metrics=metrics)
+
+    Crawler(FakeApi(failing=[2019030043]), storage, 'v3', layout='game', metrics=metrics).crawl(start_date, end_date)
+
+    assert metrics.counter('nhl_games_total', outcome='succeeded') == 2
+    assert metrics.counter('nhl_games_total', outcome='failed') == 1
+    assert metrics.counter('nhl_rows_total') == 12
+    assert metrics.counter('nhl_objects_stored_total') == 2
+    assert metrics.counter('nhl_bytes_stored_total') > 0
+
+    for stage in ('fetch', 'parse', 'serialize', 'upload'):
+        assert metrics.histogram('nhl_stage_seconds', stage=stage).count in (2, 3)
+
+def test_crawl_reports_stages(start_date, end_date):
+    stages = []
+
+    with UploadExecutor(FakeStorage(), workers=1) as uploader:
+        Crawler(FakeApi(), uploader.storage, 'v3', uploader=uploader, on_stage=stages.append).crawl(start_date, end_date)
+
+    assert stages == ['schedule', 'games', 'uploads']
+
+@pytest.mark.parametrize('layout, keys', [('player', 18), ('game', 3), ('date', 2)])
+def test_plan_lists_keys_without_storing(start_date, end_date, layout, keys):
+    planned = Crawler(FakeApi(), None, 'v3', layout=layout).plan(start_date, end_date, 'parquet')
+
+    assert len(planned) == keys
+    assert all(key.endswith('.parquet') for key in planned)
+
+def test_hydrated_crawl_falls_back_to_boxscore_requests(start_date, end_date):
+    api = FakeApi()
+    hydrated = json.loads(json.dumps(api.schedule_data))
+    first_day, second_day = hydrated['dates']
+    first_day['games'][0]['boxscore'] = api.boxscore_data
+    first_day['games'][1]['boxscore'] = {'teams': {'home': {'players': {}}, 'away': {'players': {}}}}
+    second_day['games'][0]['boxscore'] = api.boxscore_data
+    api.schedule_data = hydrated
+
+    metrics = Metrics()
+    storage = FakeStorage()
+
+    result = Crawler(api, storage, 'v3', layout='game', metrics=metrics, hydrate=True, hydrate_days=2).crawl(
+        start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030043, 2019030044]
+    assert api.expanded == [(start_date, end_date, 'schedule.boxscore')]
+    assert api.fetched == [2019030043]
+    assert metrics.counter('nhl_boxscores_total', source='schedule') == 2
+    assert len(storage.stored) == 3
@@ -0,0 +1,85 @@
+import logging
+from argparse import Namespace
+from datetime import datetime
+from pathlib import Path
+
+from nhldata.app import CrawlResult
+from nhldata.backfill import Checkpoint, backfill, split_windows, window_name
+from tests.conftest import ObjectStorage
+
+
+class WindowCrawler():
+    ''' crawls two games per window, failing one, crashing or missing the schedule for the windows args names '''
+    manifest = None
+    players = None
+
+    def __init__(self, args):
+        self.args = args
+
+    def crawl(self, start_date, end_date):
+        name = window_name((start_date, end_date))
+
+        # the crawler runs in a worker process, the test only sees what it writes
+        with open(self.args.crawled, 'a') as crawled:
+            crawled.write(name + '\n')
+
+        if name in self.args.crashing:
+            raise RuntimeError("crashed")
+
+        return CrawlResult(succeeded=[1, 2], failed=[3] if name in self.args.failing else [],
+                           schedule_failed=name in self.args.unscheduled)
+
+def build_window_crawler(args):
+    return WindowCrawler(args)
+
+
+def day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def test_split_windows():
+    windows = split_windows(day('2020-08-01'), day('2020-08-16'), 7)
+
+    assert [window_name(window) for window in windows] == [
+        '2020-08-01_2020-08-07',
+        '2020-08-08_2020-08-14',
+        '2020-08-15_2020-08-16'
+    ]
+
+def test_split_single_day():
+    assert split_windows(day('2020-08-04'), day('2020-08-04'), 7) == [(day('2020-08-04'), day('2020-08-04'))]
+
+def test_checkpoint_resumes_completed_windows():
+    storage = ObjectStorage()
+    windows = split_windows(day('2020-08-01'), day('2020-08-16'), 7)
+
+    Checkpoint(storage, day('2020-08-01'), day('2020-08-16'), 7).load().mark_done(windows[1])
+
+    checkpoint = Checkpoint(storage, day('2020-08-01'), day('2020-08-16'), 7).load()
+
+    assert [checkpoint.is_done(window) for window in windows] == [False, True, False]
+    assert not Checkpoint(storage, day('2020-08-01'), day('2020-08-16'), 3).load().completed
+
+def test_backfill_resumes_and_retries_unfinished_windows(tmp_path, caplog):
+    storage = ObjectStorage()
+    args = Namespace(start_date='2020-08-01', end_date='2020-08-12', window_days=3, processes=1,
+                     crawled=str(tmp_path / 'crawled'), failing=['2020-08-04_2020-08-06'],
+                     crashing=['2020-08-07_2020-08-09'], unscheduled=['2020-08-10_2020-08-12'])
+
+    with caplog.at_level(logging.INFO, logger='nhldata.backfill'):
+        assert not backfill(args, build=build_window_crawler, storage=storage)
+
+    assert '[4/4 windows]' in caplog.text
+    assert 'games/s' in caplog.text
+    assert 'Backfill finished: 6 games' in caplog.text
+
+    checkpoint = Checkpoint(storage, day('2020-08-01'), day('2020-08-12'), 3).load()
+    assert checkpoint.completed == {'2020-08-01_2020-08-03'}
+
+    Path(args.crawled).unlink()
+    args.failing = args.crashing = args.unscheduled = []
+
+    assert backfill(args, build=build_window_crawler, storage=storage)
+    assert sorted(Path(args.crawled).read_text().split()) == [
+        '2020-08-04_2020-08-06', '2020-08-07_2020-08-09', '2020-08-10_2020-08-12']
+    assert len(Checkpoint(storage, day('2020-08-01'), day('2020-08-12'), 3).load().completed) == 4
@@ -0,0 +1,25 @@
+from benchmarks.bench_crawler import benchmarks
+from benchmarks.harness import BenchResult, measure, missing, regressions, save_baseline, load_baseline
+
+
+def test_measure_counts_rows_and_memory():
+    result = measure('allocate', lambda: len([bytearray(1024) for _ in range(1000)]), repeat=2)
+
+    assert result.rows == 1000
+    assert result.rows_per_second > 0
+    assert result.peak_mb > 0.9
+
+def test_regressions_beyond_threshold(tmp_path):
+    baseline_path = tmp_path / 'baseline.json'
+    save_baseline(baseline_path, [BenchResult('parse', 1000, 1.0, 10.0), BenchResult('store', 1000, 1.0, 10.0)])
+    baseline = load_baseline(baseline_path)
+
+    assert regressions([BenchResult('parse', 1000, 1.1, 11.0)], baseline, 0.2) == []
+    assert len(regressions([BenchResult('parse', 1000, 2.0, 10.0)], baseline, 0.2)) == 1
+    assert len(regressions([BenchResult('store', 1000, 2.0, 20.0)], baseline, 0.2)) == 2
+    assert regressions([BenchResult('new', 1000, 9.0, 90.0)], baseline, 0.2) == []
+    assert missing([BenchResult('parse', 1000, 1.0, 10.0), BenchResult('new', 1000, 9.0, 90.0)], baseline) == ['new']
+
+def test_benchmarks_run():
+    for name, run in benchmarks(games=2, players_per_team=2, version='v3').items():
+        assert run() > 0, name
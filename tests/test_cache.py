@@ -0,0 +1,51 @@
+import time
+
+from nhldata.cache import ResponseCache
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(tmp_path)
+
+    cache.put('game/1/boxscore', None, {'teams': {'home': {}}})
+
+    assert cache.get('game/1/boxscore') == {'teams': {'home': {}}}
+    assert cache.get('game/2/boxscore') is None
+
+def test_keyed_by_params(tmp_path):
+    cache = ResponseCache(tmp_path)
+
+    cache.put('schedule', {'startDate': '2020-08-04', 'endDate': '2020-08-05'}, {'dates': [1]})
+
+    assert cache.get('schedule', {'endDate': '2020-08-05', 'startDate': '2020-08-04'}) == {'dates': [1]}
+    assert cache.get('schedule', {'startDate': '2020-08-04', 'endDate': '2020-08-06'}) is None
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(tmp_path)
+
+    cache.put('schedule', None, {'dates': []}, ttl=-1)
+
+    assert cache.get('schedule') is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path)
+    payload = {'data': 'x' * 100}
+
+    cache.put('game/1/boxscore', None, payload)
+    entry_size = cache._size
+    cache.max_bytes = entry_size * 2
+
+    cache.put('game/2/boxscore', None, payload)
+    time.sleep(0.01)
+    cache.get('game/1/boxscore')
+    cache.put('game/3/boxscore', None, payload)
+
+    assert cache.get('game/1/boxscore') == payload
+    assert cache.get('game/2/boxscore') is None
+    assert cache.get('game/3/boxscore') == payload
+
+def test_size_is_restored_on_startup(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put('game/1/boxscore', None, {'teams': {}})
+
+    assert ResponseCache(tmp_path)._size == cache._size
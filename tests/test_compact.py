@@ -0,0 +1,162 @@
+import csv
+import json
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from nhldata.app import Storage, StorageKey
+from nhldata.compact import Compactor, CompactionManifest
+from nhldata.formats import decompress
+from nhldata.loader import BucketSource, CopyLoader, LocalSource
+from nhldata.parser import NhlParser
+from nhldata.schema import NHL_SCHEMA
+from nhldata.strategy import NHL_PARSING_STRATEGY, NhlGame
+from tests.conftest import MemoryS3Client
+from tests.test_loader import FakeConnection
+
+
+version = 'v3'
+
+parser = NhlParser(NHL_PARSING_STRATEGY[version], NHL_SCHEMA[version])
+boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+
+
+def store_players(storage, game, goals=None):
+    game_df = parser.parse_game_frame(boxscore, game)
+
+    if goals is not None:
+        game_df['player_stats_skaterStats_goals'] = goals
+
+    for index, player_id in enumerate(game_df['player_person_id']):
+        storage.store_game(StorageKey(game.id, player_id), game_df.iloc[index:index + 1])
+
+    return len(game_df)
+
+
+def compacted_rows(s3_client, key):
+    return list(csv.DictReader(StringIO(decompress(s3_client.objects[key]).decode('utf-8'))))
+
+
+first_game = NhlGame(2019030042, '2020-08-04', '20192020', 'Final')
+second_game = NhlGame(2019030044, '2020-08-05', '20192020', 'Final')
+
+
+@pytest.fixture()
+def s3_client():
+    return MemoryS3Client()
+
+@pytest.fixture()
+def storage(s3_client):
+    return Storage('bucket', s3_client)
+
+
+def test_compacts_a_season_sorted_by_game_and_player(s3_client, storage):
+    players = store_players(storage, second_game) + store_players(storage, first_game)
+
+    result = Compactor(storage).compact()
+
+    manifest = CompactionManifest(storage).load()
+    partition = manifest.partitions['season=20192020']
+    rows = compacted_rows(s3_client, partition['key'])
+
+    assert result.partitions == ['season=20192020']
+    assert result.objects == result.rows == players
+    assert partition['key'].startswith('compacted/season=20192020/part-') and partition['key'].endswith('.csv.gz')
+    assert [(int(row['game_id']), int(row['player_person_id'])) for row in rows] == sorted(
+        (int(row['game_id']), int(row['player_person_id'])) for row in rows)
+    assert [source for source, _, _ in partition['sources']][0].endswith('/2019030042.csv')
+
+def test_readers_see_compacted_objects_in_place_of_small_ones(s3_client, storage):
+    players = store_players(storage, first_game)
+    small_keys = sorted(s3_client.objects)
+
+    assert BucketSource(s3_client, 'bucket').keys() == small_keys
+
+    Compactor(storage).compact()
+    partition = CompactionManifest(storage).load().partitions['season=20192020']
+
+    assert BucketSource(s3_client, 'bucket').keys() == [partition['key']]
+    assert CopyLoader(FakeConnection(), version).load(BucketSource(s3_client, 'bucket')).rows == players
+
+def test_compaction_is_incremental(s3_client, storage):
+    store_players(storage, first_game)
+    Compactor(storage).compact()
+    previous = CompactionManifest(storage).load().partitions['season=20192020']
+
+    assert Compactor(storage).compact().partitions == []
+
+    players = store_players(storage, second_game)
+    result = Compactor(storage).compact()
+    manifest = CompactionManifest(storage).load()
+    partition = manifest.partitions['season=20192020']
+
+    assert result.objects == players
+    assert partition['rows'] == previous['rows'] + players
+    assert len(compacted_rows(s3_client, partition['key'])) == partition['rows']
+    assert [previous['key'], None] in [entry[:2] for entry in manifest.retired]
+
+def test_retired_objects_are_deleted_after_the_grace_period(s3_client, storage):
+    players = store_players(storage, first_game)
+    Compactor(storage, grace_seconds=0).compact()
+
+    result = Compactor(storage, grace_seconds=0).compact()
+
+    assert result.deleted == players
+    partition = CompactionManifest(storage).load().partitions['season=20192020']
+
+    assert sorted(s3_client.objects) == [CompactionManifest.KEY, partition['key']]
+    assert CopyLoader(FakeConnection(), version).load(BucketSource(s3_client, 'bucket')).rows == players
+
+def test_rewritten_small_objects_are_compacted_again(s3_client, storage):
+    players = store_players(storage, first_game)
+    Compactor(storage, grace_seconds=0).compact()
+
+    store_players(storage, first_game, goals=7)
+    result = Compactor(storage, grace_seconds=0).compact()
+    partition = CompactionManifest(storage).load().partitions['season=20192020']
+    rows = compacted_rows(s3_client, partition['key'])
+
+    # the rewritten objects weren't deleted with the ones they replaced
+    assert result.deleted == 0
+    assert result.objects == players
+    assert len(rows) == players
+    assert {row['player_stats_skaterStats_goals'] for row in rows} == {'7'}
+
+    # they go once compacted, along with the partition's previous object
+    assert Compactor(storage, grace_seconds=0).compact().deleted == players + 1
+
+def test_compacts_by_date(s3_client, storage):
+    store_players(storage, first_game)
+    store_players(storage, second_game)
+
+    result = Compactor(storage, partition='date', output_format='csv.zst').compact()
+
+    assert result.partitions == ['season=20192020/date=2020-08-04', 'season=20192020/date=2020-08-05']
+    assert all(key.endswith('.csv.zst') for key in s3_client.objects if key.startswith('compacted/'))
+
+def test_orphaned_compacted_objects_are_invisible():
+    keys = ['1/2019030042.csv', 'compacted/season=20192020/part-1.csv.gz']
+
+    assert CompactionManifest.visible(keys, None) == ['1/2019030042.csv']
+
+def test_local_copies_of_a_compacted_bucket_load_once(s3_client, storage, tmp_path):
+    players = store_players(storage, first_game)
+    Compactor(storage).compact()
+    players += store_players(storage, second_game)
+
+    for key, body in s3_client.objects.items():
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(body)
+
+    connection = FakeConnection()
+    result = CopyLoader(connection, version).load(LocalSource(tmp_path))
+    rows = [row for _, data in connection.copies for row in csv.reader(StringIO(data))]
+    columns = NHL_SCHEMA[version]
+    games_and_players = [(row[columns.index('game_id')], row[columns.index('player_person_id')]) for row in rows]
+
+    assert sorted(LocalSource(tmp_path).keys()) == sorted(BucketSource(s3_client, 'bucket').keys())
+    prefix = games_and_players[0][1]
+    assert LocalSource(tmp_path, prefix).keys() == BucketSource(s3_client, 'bucket', prefix).keys()
+    assert result.rows == players
+    assert len(set(games_and_players)) == players
@@ -0,0 +1,40 @@
+from nhldata.extractor import column_path, compile_extractor
+from nhldata.schema import NHL_SCHEMA
+
+
+def test_column_path():
+    assert column_path('player_person_currentTeam_id') == ('player', ('person', 'currentTeam', 'id'))
+    assert column_path('player_jerseyNumber') == ('player', ('jerseyNumber',))
+    assert column_path('side') == ('context', ('side',))
+    assert column_path('game_id') == ('context', ('game', 'id'))
+
+def test_extracts_nested_values_in_column_order():
+    extract = compile_extractor(['player_person_currentTeam_name', 'player_jerseyNumber', 'side', 'player_person_id'])
+
+    player = {'person': {'id': 8475683, 'currentTeam': {'name': 'Florida Panthers'}}, 'jerseyNumber': '72'}
+
+    assert extract(player, {'side': 'home'}) == ('Florida Panthers', '72', 'home', 8475683)
+
+def test_missing_keys_are_null():
+    extract = compile_extractor(NHL_SCHEMA['v1'])
+
+    row = extract({'person': {'id': 1}, 'stats': {}}, {})
+
+    assert len(row) == len(NHL_SCHEMA['v1'])
+    assert row[0] == 1
+    assert row[1:] == (None,) * (len(NHL_SCHEMA['v1']) - 1)
+
+def test_falsy_values_are_kept():
+    extract = compile_extractor(['player_stats_skaterStats_goals', 'player_person_captain'])
+
+    player = {'person': {'captain': False}, 'stats': {'skaterStats': {'goals': 0}}}
+
+    assert extract(player, {}) == (0, False)
+
+def test_compiled_once_per_schema():
+    assert compile_extractor(NHL_SCHEMA['v1']) is compile_extractor(list(NHL_SCHEMA['v1']))
+
+def test_converters_apply_per_column():
+    extract = compile_extractor(['player_jerseyNumber', 'side'], [int, None])
+
+    assert extract({'jerseyNumber': '72'}, {'side': 'home'}) == (72, 'home')
@@ -0,0 +1,57 @@
+import json
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from nhldata.parser import NhlParser
+from nhldata.schema import NHL_SCHEMA, NHL_COLUMN_TYPES
+from nhldata.strategy import NHL_PARSING_STRATEGY
+from nhldata.formats import CsvFormat, OUTPUT_FORMATS, decompress
+
+
+version = 'v1'
+
+parser = NhlParser(NHL_PARSING_STRATEGY[version], NHL_SCHEMA[version])
+
+
+@pytest.fixture()
+def game_df():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    return parser.parse_game_frame(boxscore)
+
+
+def test_every_column_has_a_type():
+    assert sorted(NHL_COLUMN_TYPES[version]) == sorted(NHL_SCHEMA[version])
+
+def test_csv_format(game_df):
+    output = CsvFormat().serialize(game_df)
+
+    assert output.splitlines()[0].split(',')[1:] == NHL_SCHEMA[version]
+    assert len(output.splitlines()) == 7
+
+def test_parquet_format_is_typed(game_df):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    output_format = OUTPUT_FORMATS['parquet'](NHL_COLUMN_TYPES[version])
+    table = pq.read_table(BytesIO(output_format.serialize(game_df)))
+
+    assert table.column_names == NHL_SCHEMA[version]
+    assert str(table.schema.field('player_jerseyNumber').type) == 'int64'
+    assert str(table.schema.field('player_person_active').type) == 'bool'
+    assert str(table.schema.field('player_stats_skaterStats_goals').type) == 'double'
+    assert str(table.schema.field('player_stats_skaterStats_timeOnIce').type) == 'string'
+
+    rows = table.to_pylist()
+    assert rows[0]['player_jerseyNumber'] == 72
+    assert rows[0]['player_stats_skaterStats_goals'] is None
+    assert rows[1]['player_stats_skaterStats_goals'] == 1.0
+
+@pytest.mark.parametrize('output_format', ['csv.gz', 'csv.zst'])
+def test_compressed_csv_formats_match_csv(game_df, output_format):
+    body = BytesIO()
+    OUTPUT_FORMATS[output_format]().write(game_df, body)
+
+    assert not body.closed
+    assert decompress(body.getvalue()).decode('utf-8') == CsvFormat().serialize(game_df)
+    assert len(body.getvalue()) < len(CsvFormat().serialize(game_df)) / 3
@@ -0,0 +1,36 @@
+import sys
+import subprocess
+
+from nhldata.replay import ReplayCatalog, ReplayServer
+from tests.test_replay import FIXTURES
+
+
+HEAVY_MODULES = ('pandas', 'numpy', 'boto3', 'botocore', 'dateutil', 'pyarrow')
+
+
+def imported_heavy_modules(code: str) -> list:
+    check = '; import sys; print("imported:" + ",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code + check], capture_output=True, text=True, check=True)
+    imported = [line for line in output.stdout.splitlines() if line.startswith('imported:')][-1]
+
+    return [module for module in imported[len('imported:'):].split(',') if module]
+
+
+def test_importing_the_cli_stays_light():
+    assert imported_heavy_modules('import nhldata.app, nhldata.backfill, nhldata.loader') == []
+
+def test_dry_run_lists_keys_without_pandas():
+    with ReplayServer(ReplayCatalog.from_directory(FIXTURES)) as server:
+        code = (
+            'import sys; from nhldata.app import main; '
+            'sys.argv = ["app", "--dry_run", "--layout", "game", "--api_base", "{}"]; main()'.format(server.url)
+        )
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        heavy = imported_heavy_modules(code)
+
+    assert output.stdout.split() == [
+        'season=20192020/date=2020-08-04/2019030042.csv',
+        'season=20192020/date=2020-08-04/2019030043.csv',
+        'season=20192020/date=2020-08-05/2019030044.csv'
+    ]
+    assert heavy == []
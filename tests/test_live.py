@@ -0,0 +1,135 @@
+import copy
+import json
+from pathlib import Path
+from datetime import datetime
+
+from nhldata.live import LivePoller
+from nhldata.manifest import GameManifest
+from nhldata.strategy import NhlGame
+from tests.test_app import FakeStorage
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+game_date = datetime(2020, 8, 4)
+
+
+class FakeLiveApi():
+    ''' the 2020-08-04 games, in the given states, answering None for a boxscore unchanged since the last request '''
+    def __init__(self, states):
+        schedule = json.loads((FIXTURES / 'schedule.json').read_text())
+
+        self.schedule_data = dict(schedule, dates=schedule['dates'][:1])
+        self.boxscores = {game_id: json.loads((FIXTURES / 'boxscore.json').read_text()) for game_id in states}
+        self.fetched = []
+
+        self._sent = {}
+        self.set_states(states)
+
+    def set_states(self, states):
+        for game in self.schedule_data['dates'][0]['games']:
+            game['status']['abstractGameState'] = states[game['gamePk']]
+
+    def schedule(self, start_date, end_date, expand=None, conditional=False):
+        return copy.deepcopy(self.schedule_data)
+
+    def boxscore(self, game_id, final=False, conditional=False):
+        self.fetched.append(game_id)
+        boxscore = self.boxscores[game_id]
+
+        if conditional and self._sent.get(game_id) == boxscore:
+            return None
+
+        self._sent[game_id] = copy.deepcopy(boxscore)
+
+        return copy.deepcopy(boxscore)
+
+    def score(self, game_id, player_id, goals):
+        for team in self.boxscores[game_id]['teams'].values():
+            player = team['players'].get(f'ID{player_id}')
+
+            if player:
+                player['stats']['skaterStats']['goals'] = goals
+
+
+def skater(api, game_id):
+    for team in api.boxscores[game_id]['teams'].values():
+        for player in team['players'].values():
+            if 'skaterStats' in player['stats']:
+                return player['person']['id']
+
+
+def test_only_live_games_are_polled():
+    api = FakeLiveApi({2019030042: 'Live', 2019030043: 'Preview'})
+    storage = FakeStorage()
+
+    result = LivePoller(api, storage, 'v3').poll(game_date)
+
+    assert api.fetched == [2019030042]
+    assert result.fetched == [2019030042]
+    assert result.players_written == len(storage.stored)
+    assert all(key.endswith('/2019030042.csv') for key in storage.stored)
+    assert not result.finished
+
+def test_only_changed_players_are_written():
+    api = FakeLiveApi({2019030042: 'Live', 2019030043: 'Preview'})
+    storage = FakeStorage()
+    poller = LivePoller(api, storage, 'v3')
+    poller.poll(game_date)
+
+    storage.stored.clear()
+    unchanged = poller.poll(game_date)
+
+    assert unchanged.unchanged == [2019030042]
+    assert storage.stored == {}
+
+    player_id = skater(api, 2019030042)
+    api.score(2019030042, player_id, 9)
+    changed = poller.poll(game_date)
+
+    assert changed.fetched == [2019030042]
+    assert changed.players_written == 1
+    assert list(storage.stored) == [f'{player_id}/2019030042.csv']
+    assert poller.metrics.counter('nhl_live_boxscores_total', outcome='unchanged') == 1
+
+def test_polling_finishes_once_every_game_is_final():
+    api = FakeLiveApi({2019030042: 'Live', 2019030043: 'Live'})
+    storage = FakeStorage()
+    manifest = GameManifest(storage)
+    poller = LivePoller(api, storage, 'v3', interval=0, manifest=manifest)
+    poller.poll(game_date)
+
+    api.set_states({2019030042: 'Final', 2019030043: 'Final'})
+    api.fetched.clear()
+    result = poller.run(game_date)
+
+    assert result.finished
+    assert result.unchanged == [2019030042, 2019030043]
+    assert api.fetched == [2019030042, 2019030043]
+    assert sorted(json.loads(storage.objects[GameManifest.KEY])) == ['2019030042', '2019030043']
+
+def test_games_landed_as_final_are_not_polled():
+    api = FakeLiveApi({2019030042: 'Final', 2019030043: 'Final'})
+    storage = FakeStorage()
+    manifest = GameManifest(storage)
+    manifest.record(NhlGame(2019030042, '2020-08-04', '20192020', 'Final'), 40, 'hash')
+
+    result = LivePoller(api, storage, 'v3', manifest=manifest).poll(game_date)
+
+    assert api.fetched == [2019030043]
+    assert result.finished
+
+def test_failed_writes_are_retried():
+    api = FakeLiveApi({2019030042: 'Live', 2019030043: 'Preview'})
+    storage = FakeStorage()
+    poller = LivePoller(api, storage, 'v3')
+    store_game = storage.store_game
+    storage.store_game = lambda key, data: (_ for _ in ()).throw(IOError('s3 is down'))
+
+    assert poller.poll(game_date).failed == [2019030042]
+
+    storage.store_game = store_game
+    result = poller.poll(game_date)
+
+    assert result.fetched == [2019030042]
+    assert result.players_written == len(storage.stored)
@@ -0,0 +1,213 @@
+import csv
+import json
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from nhldata.app import Storage, StorageKey, GameStorageKey
+from nhldata.formats import OUTPUT_FORMATS
+from nhldata.loader import CopyLoader, LocalSource
+from nhldata.parser import NhlParser
+from nhldata.players import PlayerStorageKey
+from nhldata.schema import NHL_SCHEMA
+from nhldata.strategy import NHL_PARSING_STRATEGY
+
+
+version = 'v1'
+
+parser = NhlParser(NHL_PARSING_STRATEGY[version], NHL_SCHEMA[version])
+
+
+class FakeCursor():
+    def __init__(self, copies, statements, rowcount=0):
+        self.copies = copies
+        self.statements = statements
+        self.rowcount = rowcount
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def copy_expert(self, sql, file):
+        self.copies.append((sql, file.read()))
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+class FakeConnection():
+    def __init__(self, rowcount=0):
+        self.copies = []
+        self.statements = []
+        self.committed = False
+        self.rolled_back = False
+        self.rowcount = rowcount
+
+    def cursor(self):
+        return FakeCursor(self.copies, self.statements, self.rowcount)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class DirectoryS3Client():
+    def __init__(self, directory):
+        self.directory = directory
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self.directory / Key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body.read() if hasattr(Body, 'read') else Body.encode('utf-8'))
+
+
+@pytest.fixture()
+def bucket(tmp_path):
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    game_df = parser.parse_game_frame(boxscore)
+    storage = Storage('bucket', DirectoryS3Client(tmp_path))
+
+    storage.store_game(GameStorageKey('20192020', '2020-08-04', 2019030042), game_df)
+
+    for index, player_id in enumerate(game_df['player_person_id']):
+        storage.store_game(StorageKey(2019030043, player_id), game_df.iloc[index:index + 1])
+
+    players = game_df[['player_person_id', 'player_person_fullName']]
+    storage.store_game(PlayerStorageKey(8475683), players.iloc[:1])
+
+    (tmp_path / '_manifest').mkdir()
+    (tmp_path / '_manifest' / 'games.csv').write_text('not,data\n')
+
+    return tmp_path
+
+
+def test_local_source_skips_metadata(bucket):
+    keys = list(LocalSource(bucket).keys())
+
+    assert len(keys) == 7
+    assert 'season=20192020/date=2020-08-04/2019030042.csv' in keys
+    assert not any(key.startswith('_') for key in keys)
+    assert not any(key.startswith('players/') for key in keys)
+
+def test_dimensions_load_from_their_prefix(bucket):
+    connection = FakeConnection()
+
+    result = CopyLoader(connection, 'players', table='players').load(LocalSource(bucket, 'players'))
+
+    assert result.files == 1
+    assert result.rows == 1
+    assert 'COPY players (player_person_id, player_person_active' in connection.copies[0][0]
+
+def test_load_streams_every_row_in_batches(bucket):
+    connection = FakeConnection()
+
+    result = CopyLoader(connection, version, batch_size=5, readers=3).load(LocalSource(bucket))
+
+    assert result.files == 7
+    assert result.rows == 12
+    assert result.failed == []
+    assert connection.committed
+    assert len(connection.copies) == 2
+
+    sql, _ = connection.copies[0]
+    assert sql == 'COPY game_stats ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(NHL_SCHEMA[version]))
+
+    rows = [row for _, data in connection.copies for row in csv.reader(StringIO(data))]
+    assert all(len(row) == len(NHL_SCHEMA[version]) for row in rows)
+    assert sorted(row[0] for row in rows)[:2] == ['8474709', '8474709']
+
+def test_load_reorders_columns_by_header(tmp_path):
+    (tmp_path / 'game.csv').write_text('side,player_person_currentAge,player_person_id\nhome,30.0,8475683\n')
+    connection = FakeConnection()
+
+    CopyLoader(connection, version).load(LocalSource(tmp_path))
+
+    row = next(csv.reader(StringIO(connection.copies[0][1])))
+    columns = NHL_SCHEMA[version]
+    assert row[columns.index('player_person_id')] == '8475683'
+    assert row[columns.index('player_person_currentAge')] == '30'
+    assert row[columns.index('side')] == 'home'
+    assert row[columns.index('player_person_weight')] == ''
+
+def test_load_reports_unreadable_objects(tmp_path):
+    (tmp_path / 'good.csv').write_text('player_person_id\n1\n')
+    (tmp_path / 'bad.csv').write_text('unrelated\n1\n')
+
+    result = CopyLoader(FakeConnection(), version).load(LocalSource(tmp_path))
+
+    assert result.rows == 1
+    assert result.failed == ['bad.csv']
+
+def test_upsert_replaces_staged_games(tmp_path):
+    (tmp_path / 'game.csv').write_text('player_person_id,game_id,game_date\n8475683,2019030042,2020-08-04\n')
+    connection = FakeConnection()
+
+    result = CopyLoader(connection, 'v2', mode='upsert').load(LocalSource(tmp_path))
+
+    assert result.rows == 1
+    assert connection.copies[0][0].startswith('COPY game_stats_staging (')
+    assert connection.statements[0] == 'CREATE TEMP TABLE game_stats_staging (LIKE game_stats INCLUDING DEFAULTS) ON COMMIT DROP'
+    assert connection.statements[1] == 'DELETE FROM game_stats WHERE game_id IN (SELECT DISTINCT game_id FROM game_stats_staging)'
+    assert connection.statements[2].startswith('INSERT INTO game_stats (')
+    assert 'SELECT DISTINCT ON (game_id, player_person_id)' in connection.statements[2]
+    assert connection.committed
+
+@pytest.mark.parametrize('output_format', ['csv.gz', 'csv.zst'])
+def test_load_reads_compressed_objects(tmp_path, output_format):
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    storage = Storage('bucket', DirectoryS3Client(tmp_path), OUTPUT_FORMATS[output_format]())
+    storage.store_game(GameStorageKey('20192020', '2020-08-04', 2019030042), parser.parse_game_frame(boxscore))
+    (tmp_path / 'plain.csv').write_text('player_person_id\n1\n')
+
+    connection = FakeConnection()
+    result = CopyLoader(connection, version).load(LocalSource(tmp_path))
+
+    assert sorted(LocalSource(tmp_path).keys()) == [
+        'plain.csv', f'season=20192020/date=2020-08-04/2019030042.{output_format}']
+    assert result.rows == 7
+    assert result.failed == []
+
+def test_upsert_reports_dropped_rows(tmp_path):
+    (tmp_path / 'game.csv').write_text(
+        'player_person_id,game_id,game_date\n8475683,2019030042,2020-08-04\n8475684,,2020-08-04\n')
+
+    result = CopyLoader(FakeConnection(rowcount=1), 'v2', mode='upsert').load(LocalSource(tmp_path))
+
+    assert result.rows == 2
+    assert result.dropped == 1
+
+def test_upsert_with_unreadable_objects_loads_nothing(tmp_path):
+    (tmp_path / '8475683').mkdir()
+    (tmp_path / '8475683' / '2019030042.csv').write_text('player_person_id,game_id\n8475683,2019030042\n')
+    (tmp_path / '8475684').mkdir()
+    (tmp_path / '8475684' / '2019030042.csv').write_text('unrelated\n1\n')
+    connection = FakeConnection(rowcount=1)
+
+    result = CopyLoader(connection, 'v2', mode='upsert').load(LocalSource(tmp_path))
+
+    assert result.failed == ['8475684/2019030042.csv']
+    assert result.rows == 0
+    assert connection.rolled_back and not connection.committed
+    assert not any(statement.startswith(('DELETE', 'INSERT')) for statement in connection.statements)
+
+def test_upsert_replaces_staged_players(tmp_path):
+    (tmp_path / 'players').mkdir()
+    (tmp_path / 'players' / '8475683.csv').write_text('player_person_id,player_person_currentAge\n8475683,30\n')
+    connection = FakeConnection()
+
+    result = CopyLoader(connection, 'players', table='players', mode='upsert').load(LocalSource(tmp_path, 'players'))
+
+    assert result.rows == 1
+    assert connection.statements[1] == \
+        'DELETE FROM players WHERE player_person_id IN (SELECT DISTINCT player_person_id FROM players_staging)'
+    assert 'SELECT DISTINCT ON (player_person_id)' in connection.statements[2]
+    assert connection.committed
+
+def test_upsert_needs_game_id():
+    with pytest.raises(ValueError):
+        CopyLoader(FakeConnection(), 'v1', mode='upsert')
@@ -0,0 +1,94 @@
+import json
+
+from nhldata.manifest import GameManifest
+from nhldata.strategy import NhlGame
+from tests.conftest import ObjectStorage
+
+
+final_game = NhlGame(2019030042, '2020-08-04', '20192020', 'Final')
+live_game = NhlGame(2019030043, '2020-08-04', '20192020', 'Live')
+
+
+def test_missing_manifest_is_empty():
+    assert GameManifest(ObjectStorage()).load().entries == {}
+
+def test_should_fetch():
+    manifest = GameManifest(ObjectStorage())
+    manifest.record(final_game, 40, 'a')
+    manifest.record(live_game, 40, 'b')
+
+    assert not manifest.should_fetch(final_game)
+    assert manifest.should_fetch(live_game)
+    assert manifest.should_fetch(live_game._replace(state='Final'))
+    assert manifest.should_fetch(NhlGame(2019030044, '2020-08-05', '20192020', 'Final'))
+
+def test_unchanged():
+    manifest = GameManifest(ObjectStorage())
+    manifest.record(live_game, 40, GameManifest.digest({'teams': {'home': 1}}))
+
+    assert manifest.unchanged(live_game, GameManifest.digest({'teams': {'home': 1}}))
+    assert not manifest.unchanged(live_game, GameManifest.digest({'teams': {'home': 2}}))
+    assert not manifest.unchanged(final_game, GameManifest.digest({'teams': {'home': 1}}))
+
+def test_save_round_trip():
+    storage = ObjectStorage()
+    manifest = GameManifest(storage)
+    manifest.record(final_game, 40, 'a')
+    manifest.save()
+
+    entries = GameManifest(storage).load().entries
+
+    assert list(entries) == ['2019030042']
+    assert entries['2019030042']['rows'] == 40
+    assert entries['2019030042']['state'] == 'Final'
+
+def test_save_skips_unchanged_manifest():
+    storage = ObjectStorage()
+
+    GameManifest(storage).load().save()
+
+    assert storage.objects == {}
+
+def test_discard():
+    storage = ObjectStorage()
+    manifest = GameManifest(storage)
+    manifest.record(final_game, 40, 'a')
+    manifest.save()
+
+    manifest.discard([2019030042])
+    manifest.save()
+
+    assert json.loads(storage.objects[GameManifest.KEY]) == {}
+
+def test_save_keeps_entries_written_by_other_runs():
+    storage = ObjectStorage()
+    first = GameManifest(storage).load()
+    second = GameManifest(storage).load()
+
+    first.record(final_game, 40, 'a')
+    second.record(live_game, 38, 'b')
+    first.save()
+    second.save()
+
+    assert sorted(json.loads(storage.objects[GameManifest.KEY])) == ['2019030042', '2019030043']
+
+def test_save_merges_a_write_made_between_its_read_and_write():
+    storage = ObjectStorage()
+    first = GameManifest(storage).load()
+    second = GameManifest(storage).load()
+    read_object_version = storage.read_object_version
+
+    def interleaved(key):
+        # the other process saves right after this one has read the manifest
+        read = read_object_version(key)
+        storage.read_object_version = read_object_version
+        second.save()
+        return read
+
+    first.record(final_game, 40, 'a')
+    second.record(live_game, 38, 'b')
+    storage.read_object_version = interleaved
+    first.save()
+
+    assert sorted(json.loads(storage.objects[GameManifest.KEY])) == ['2019030042', '2019030043']
+    assert sorted(first.entries) == ['2019030042', '2019030043']
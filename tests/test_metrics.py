@@ -0,0 +1,61 @@
+import json
+
+from nhldata.metrics import Metrics, Histogram
+
+
+def test_counters_by_label():
+    metrics = Metrics()
+    metrics.inc('nhl_games_total', outcome='succeeded')
+    metrics.inc('nhl_games_total', 2, outcome='succeeded')
+    metrics.inc('nhl_games_total', outcome='failed')
+
+    assert metrics.counter('nhl_games_total', outcome='succeeded') == 3
+    assert metrics.counter('nhl_games_total', outcome='failed') == 1
+    assert metrics.counter('nhl_games_total', outcome='skipped') == 0
+
+def test_histogram_summary():
+    histogram = Histogram(buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.05, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.95) == 3.0
+    assert histogram.summary()['mean'] == 0.9
+
+def test_timer_observes_elapsed_time():
+    metrics = Metrics()
+
+    with metrics.timer('nhl_stage_seconds', stage='parse'):
+        pass
+
+    assert metrics.histogram('nhl_stage_seconds', stage='parse').count == 1
+    assert metrics.histogram('nhl_stage_seconds', stage='fetch') is None
+
+def test_prometheus_textfile(tmp_path):
+    metrics = Metrics()
+    metrics.inc('nhl_games_total', outcome='succeeded')
+    metrics.observe('nhl_api_request_seconds', 0.2, endpoint='boxscore')
+
+    metrics.write_prometheus(tmp_path / 'nhldata.prom')
+    lines = (tmp_path / 'nhldata.prom').read_text().splitlines()
+
+    assert '# TYPE nhl_games_total counter' in lines
+    assert 'nhl_games_total{outcome="succeeded"} 1' in lines
+    assert 'nhl_api_request_seconds_bucket{endpoint="boxscore",le="0.1"} 0' in lines
+    assert 'nhl_api_request_seconds_bucket{endpoint="boxscore",le="+Inf"} 1' in lines
+    assert 'nhl_api_request_seconds_count{endpoint="boxscore"} 1' in lines
+    assert not list(tmp_path.glob('*.tmp'))
+
+def test_json_report(tmp_path):
+    metrics = Metrics()
+    metrics.inc('nhl_rows_total', 40)
+    metrics.observe('nhl_stage_seconds', 0.01, stage='fetch')
+
+    metrics.write_report(tmp_path / 'run_report.json', start_date='2020-08-04')
+    report = json.loads((tmp_path / 'run_report.json').read_text())
+
+    assert report['run'] == {'start_date': '2020-08-04'}
+    assert report['counters']['nhl_rows_total'] == {'': 40}
+    assert report['histograms']['nhl_stage_seconds']['{stage="fetch"}']['count'] == 1
@@ -1,7 +1,9 @@
 import pytest
+import requests
 from datetime import datetime
 
-from nhldata.app import NHLApi
+from nhldata.app import NHLApi, RateLimiter, _retry_after
+from nhldata.cache import ResponseCache
 
 
 @pytest.fixture()
@@ -51,3 +53,156 @@ def test_bad_failed_boxscore():
     result = api.boxscore(bad_id)
 
     assert result == {}
+
+
+class FakeResponse():
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload if payload is not None else {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error', response=self)
+
+
+class FakeSession():
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.headers = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, params))
+        self.headers.append(headers)
+        outcome = self.outcomes.pop(0)
+
+        if isinstance(outcome, Exception):
+            raise outcome
+
+        return outcome
+
+
+def test_get_retries_server_errors_and_timeouts():
+    session = FakeSession(requests.Timeout(), FakeResponse(503), FakeResponse(200, {'teams': {}}))
+    timings = []
+
+    api = NHLApi('http://nhl.test', backoff=0, session=session,
+                 on_request=lambda url, status, elapsed, attempt: timings.append((status, attempt)))
+
+    assert api.boxscore(1) == {'teams': {}}
+    assert timings == [(None, 0), (503, 1), (200, 2)]
+
+def test_get_gives_up_after_retries():
+    session = FakeSession(*[FakeResponse(500) for _ in range(3)])
+
+    api = NHLApi('http://nhl.test', retries=2, backoff=0, session=session)
+
+    assert api.boxscore(1) == {}
+    assert len(session.calls) == 3
+
+def test_get_does_not_retry_client_errors():
+    session = FakeSession(FakeResponse(404))
+
+    api = NHLApi('http://nhl.test', backoff=0, session=session)
+
+    assert api.boxscore(1) == {}
+    assert len(session.calls) == 1
+
+def test_get_honors_retry_after():
+    session = FakeSession(FakeResponse(429, headers={'Retry-After': '0'}), FakeResponse(200, {'dates': []}))
+
+    api = NHLApi('http://nhl.test', backoff=0, session=session)
+
+    assert api._get('http://nhl.test/schedule') == {'dates': []}
+    assert len(session.calls) == 2
+
+def test_retry_after_header_formats():
+    assert _retry_after(FakeResponse(429, headers={'Retry-After': '2.5'})) == 2.5
+    assert _retry_after(FakeResponse(429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0.0
+    assert _retry_after(FakeResponse(429, headers={'Retry-After': 'soon'})) is None
+    assert _retry_after(FakeResponse(429)) is None
+
+def test_rate_limiter_recovers_after_throttle():
+    limiter = RateLimiter()
+
+    limiter.throttle(0)
+    assert limiter.interval == RateLimiter.MIN_INTERVAL
+
+    for _ in range(10):
+        limiter.relax()
+
+    assert limiter.interval == 0.0
+
+def test_final_boxscores_are_cached(tmp_path):
+    session = FakeSession(FakeResponse(200, {'teams': {'home': {}}}), FakeResponse(200, {'teams': {'away': {}}}))
+
+    api = NHLApi('http://nhl.test', session=session, cache=ResponseCache(tmp_path))
+
+    assert api.boxscore(1, final=True) == {'teams': {'home': {}}}
+    assert api.boxscore(1, final=True) == {'teams': {'home': {}}}
+    assert len(session.calls) == 1
+
+def test_live_boxscores_are_not_cached(tmp_path):
+    session = FakeSession(FakeResponse(200, {'teams': {'home': {}}}), FakeResponse(200, {'teams': {'away': {}}}))
+
+    api = NHLApi('http://nhl.test', session=session, cache=ResponseCache(tmp_path))
+
+    assert api.boxscore(1) == {'teams': {'home': {}}}
+    assert api.boxscore(1) == {'teams': {'away': {}}}
+    assert len(session.calls) == 2
+
+def test_requests_are_measured():
+    session = FakeSession(FakeResponse(503), FakeResponse(200, {'teams': {}}))
+
+    api = NHLApi('http://nhl.test', backoff=0, session=session)
+    api.boxscore(2019030042)
+
+    assert api.metrics.counter('nhl_api_requests_total', endpoint='boxscore', status=503) == 1
+    assert api.metrics.counter('nhl_api_requests_total', endpoint='boxscore', status=200) == 1
+    assert api.metrics.counter('nhl_api_retries_total', endpoint='boxscore') == 1
+    assert api.metrics.histogram('nhl_api_request_seconds', endpoint='boxscore').count == 2
+
+def test_conditional_requests_send_validators_back():
+    session = FakeSession(
+        FakeResponse(200, {'teams': {}}, headers={'ETag': '"a"', 'Last-Modified': 'Tue, 04 Aug 2020 20:00:00 GMT'}),
+        FakeResponse(304),
+        FakeResponse(200, {'teams': {'home': {}}})
+    )
+
+    api = NHLApi('http://nhl.test', session=session)
+
+    assert api.boxscore(1, conditional=True) == {'teams': {}}
+    assert api.boxscore(1, conditional=True) is None
+    assert api.boxscore(1, conditional=True) == {'teams': {'home': {}}}
+    assert session.headers == [
+        None,
+        {'If-None-Match': '"a"', 'If-Modified-Since': 'Tue, 04 Aug 2020 20:00:00 GMT'},
+        {'If-None-Match': '"a"', 'If-Modified-Since': 'Tue, 04 Aug 2020 20:00:00 GMT'}
+    ]
+    assert api.metrics.counter('nhl_api_not_modified_total', endpoint='boxscore') == 1
+
+def test_retry_after_is_capped_and_zero_retries_at_once(monkeypatch):
+    delays = []
+    monkeypatch.setattr(RateLimiter, 'throttle', lambda self, delay: delays.append(delay))
+
+    session = FakeSession(FakeResponse(429, headers={'Retry-After': '0'}),
+                          FakeResponse(429, headers={'Retry-After': '86400'}),
+                          FakeResponse(200, {'dates': []}))
+
+    api = NHLApi('http://nhl.test', backoff=10, max_backoff=5, session=session)
+
+    assert api._get('http://nhl.test/schedule') == {'dates': []}
+    assert delays == [0.0, 5]
+
+def test_cache_is_kept_per_api_base(tmp_path):
+    live = NHLApi('http://nhl.test', session=FakeSession(FakeResponse(200, {'teams': {'home': {}}})),
+                  cache=ResponseCache(tmp_path))
+    replay = NHLApi('http://127.0.0.1:8080/api/v1', session=FakeSession(FakeResponse(200, {'teams': {'away': {}}})),
+                    cache=ResponseCache(tmp_path))
+
+    assert live.boxscore(1, final=True) == {'teams': {'home': {}}}
+    assert replay.boxscore(1, final=True) == {'teams': {'away': {}}}
@@ -0,0 +1,123 @@
+import json
+from pathlib import Path
+
+from nhldata.parser import NhlParser
+from nhldata.players import PlayerDimension, PlayerStorageKey
+from nhldata.schema import NHL_SCHEMA, PLAYER_DIMENSION_COLUMNS, PLAYER_GAME_COLUMNS
+from nhldata.strategy import NHL_PARSING_STRATEGY
+from tests.conftest import ObjectStorage
+
+
+parser = NhlParser(NHL_PARSING_STRATEGY['v3'], NHL_SCHEMA['v3'])
+
+
+def game_frame():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+
+    return parser.parse_game_frame(boxscore)
+
+
+def test_player_storage_key():
+    assert PlayerStorageKey(8475683).key() == 'players/8475683.csv'
+
+def test_split_separates_attributes_from_stats():
+    players, facts = PlayerDimension(ObjectStorage()).split(game_frame())
+
+    assert list(players.columns) == ['player_person_id'] + PLAYER_DIMENSION_COLUMNS
+    assert len(players) == 6
+    assert 'player_person_id' in facts.columns
+    assert set(PLAYER_DIMENSION_COLUMNS) & set(facts.columns) == set(PLAYER_GAME_COLUMNS)
+    assert len(facts.columns) == len(NHL_SCHEMA['v3']) - len(PLAYER_DIMENSION_COLUMNS) + len(PLAYER_GAME_COLUMNS)
+
+def test_only_changed_players_are_split_off():
+    dimension = PlayerDimension(ObjectStorage())
+    game_df = game_frame()
+
+    dimension.record(dimension.split(game_df)[0])
+    assert dimension.split(game_df)[0].empty
+
+    game_df.loc[0, 'player_person_currentAge'] += 1
+    assert list(dimension.split(game_df)[0]['player_person_id']) == [8475683]
+
+def test_discarded_players_are_split_off_again():
+    dimension = PlayerDimension(ObjectStorage())
+    game_df = game_frame()
+
+    dimension.record(dimension.split(game_df)[0])
+    dimension.discard([8477493])
+
+    assert list(dimension.split(game_df)[0]['player_person_id']) == [8477493]
+
+def test_save_merges_with_other_runs():
+    storage = ObjectStorage()
+    game_df = game_frame()
+
+    other = PlayerDimension(storage).load()
+    other.record(other.split(game_df.iloc[:1])[0])
+
+    dimension = PlayerDimension(storage).load()
+    dimension.record(dimension.split(game_df.iloc[1:])[0])
+
+    other.save()
+    dimension.save()
+
+    assert len(json.loads(storage.objects[PlayerDimension.KEY])) == 6
+    assert PlayerDimension(storage).load().split(game_df)[0].empty
+
+def test_save_merges_a_write_made_between_its_read_and_write():
+    storage = ObjectStorage()
+    game_df = game_frame()
+    first = PlayerDimension(storage).load()
+    second = PlayerDimension(storage).load()
+    read_object_version = storage.read_object_version
+
+    def interleaved(key):
+        # the other process saves right after this one has read the dimension
+        read = read_object_version(key)
+        storage.read_object_version = read_object_version
+        second.save()
+        return read
+
+    first.record(first.split(game_df.iloc[:1])[0])
+    second.record(second.split(game_df.iloc[1:])[0])
+    storage.read_object_version = interleaved
+    first.save()
+
+    assert len(json.loads(storage.objects[PlayerDimension.KEY])) == 6
+    assert PlayerDimension(storage).load().split(game_df)[0].empty
+
+def test_older_games_dont_rewrite_players():
+    storage = ObjectStorage()
+    game_df = game_frame()
+    dimension = PlayerDimension(storage)
+    dimension.record(dimension.split(game_df, '2020-08-04')[0], '2020-08-04')
+    dimension.save()
+
+    game_df.loc[0, 'player_person_currentAge'] -= 1
+    backfill = PlayerDimension(storage).load()
+
+    assert backfill.split(game_df, '2019-10-02')[0].empty
+    assert list(backfill.split(game_df, '2020-08-05')[0]['player_person_id']) == [8475683]
+
+def test_save_drops_players_written_from_a_more_recent_game_meanwhile():
+    storage = ObjectStorage()
+    game_df = game_frame()
+    backfill = PlayerDimension(storage).load()
+    nightly = PlayerDimension(storage).load()
+
+    backfill.record(backfill.split(game_df.iloc[:1], '2019-10-02')[0], '2019-10-02')
+    nightly.record(nightly.split(game_df.iloc[:1], '2020-08-04')[0], '2020-08-04')
+    nightly.save()
+    backfill.save()
+
+    # either run's object may be the last one written, so the next crawl of the player writes it again
+    assert '8475683' not in json.loads(storage.objects[PlayerDimension.KEY])
+
+def test_hashes_saved_without_a_date_still_load():
+    storage = ObjectStorage()
+    game_df = game_frame()
+    players = PlayerDimension(storage).split(game_df)[0]
+    storage.write_object(PlayerDimension.KEY, json.dumps(
+        {str(row[0]): PlayerDimension.digest(row[1:]) for row in players.itertuples(index=False)}))
+
+    assert PlayerDimension(storage).load().split(game_df, '2020-08-04')[0].empty
@@ -0,0 +1,46 @@
+import pstats
+import threading
+
+from nhldata.profiling import Profiler
+
+
+def busy_work():
+    return sum(index * index for index in range(20000))
+
+def allocate(store):
+    store.extend(bytearray(1024) for _ in range(500))
+
+
+def test_profiles_every_thread(tmp_path):
+    with Profiler(tmp_path, top=5):
+        busy_work()
+
+        thread = threading.Thread(target=busy_work, name='worker')
+        thread.start()
+        thread.join()
+
+    stats = pstats.Stats(str(tmp_path / 'profile.pstats'))
+    calls = [count for (_, _, function), (count, *_) in stats.stats.items() if function == 'busy_work']
+
+    assert calls == [2]
+
+    summary = (tmp_path / 'profile_summary.txt').read_text()
+    assert 'Top 5 functions by cumulative time, 2 threads profiled' in summary
+    assert 'Top 5 functions by tottime time' in summary
+
+def test_memory_snapshots_per_stage(tmp_path):
+    store = []
+    profiler = Profiler(tmp_path, cpu=False, memory=True, top=3).start()
+
+    allocate(store)
+    profiler.stage('games')
+    allocate(store)
+    profiler.stop()
+
+    assert [name for name, _ in profiler.snapshots] == ['games', 'end']
+    assert sorted(path.name for path in tmp_path.glob('*.snapshot')) == ['memory_0_games.snapshot', 'memory_1_end.snapshot']
+
+    summary = (tmp_path / 'profile_summary.txt').read_text()
+    assert '[games]' in summary and '[end]' in summary
+    assert 'test_profiling.py' in summary
+    assert not (tmp_path / 'profile.pstats').exists()
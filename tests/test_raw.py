@@ -0,0 +1,71 @@
+import gzip
+import json
+from datetime import datetime
+
+from nhldata.app import Crawler
+from nhldata.raw import RawArchive, ArchiveApi, RawBoxscoreKey, RawScheduleKey
+from tests.test_app import FakeApi, FakeStorage
+
+
+start_date = datetime(2020, 8, 4)
+end_date = datetime(2020, 8, 5)
+
+
+def test_raw_keys():
+    assert RawScheduleKey('2020-08-04').key() == 'raw/schedule/date=2020-08-04.json.gz'
+    assert RawBoxscoreKey('20192020', '2020-08-04', 2019030042).key() == \
+        'raw/boxscore/season=20192020/date=2020-08-04/2019030042.json.gz'
+
+def test_crawl_archives_raw_json():
+    storage = FakeStorage()
+
+    Crawler(FakeApi(), storage, 'v3', layout='game', archive=RawArchive(storage)).crawl(start_date, end_date)
+
+    assert sorted(storage.objects) == [
+        'raw/boxscore/season=20192020/date=2020-08-04/2019030042.json.gz',
+        'raw/boxscore/season=20192020/date=2020-08-04/2019030043.json.gz',
+        'raw/boxscore/season=20192020/date=2020-08-05/2019030044.json.gz',
+        'raw/schedule/date=2020-08-04.json.gz',
+        'raw/schedule/date=2020-08-05.json.gz'
+    ]
+
+    boxscore = json.loads(gzip.decompress(storage.objects['raw/boxscore/season=20192020/date=2020-08-04/2019030042.json.gz']))
+    assert boxscore == FakeApi().boxscore_data
+
+def test_reparse_from_archive_matches_the_crawl():
+    storage = FakeStorage()
+    Crawler(FakeApi(), storage, 'v3', layout='game', archive=RawArchive(storage)).crawl(start_date, end_date)
+    crawled = dict(storage.stored)
+    storage.stored.clear()
+
+    crawler = Crawler(None, storage, 'v3', layout='game')
+    crawler.api = ArchiveApi(RawArchive(storage), crawler.parser)
+    result = crawler.crawl(start_date, end_date)
+
+    assert result.succeeded == [2019030042, 2019030043, 2019030044]
+    assert sorted(storage.stored) == sorted(crawled)
+    assert all(storage.stored[key].equals(crawled[key]) for key in crawled)
+
+def test_archive_api_reports_missing_games():
+    storage = FakeStorage()
+    Crawler(FakeApi(), storage, 'v3', layout='game', archive=RawArchive(storage)).crawl(start_date, end_date)
+    del storage.objects['raw/boxscore/season=20192020/date=2020-08-05/2019030044.json.gz']
+
+    crawler = Crawler(None, storage, 'v3', layout='game')
+    crawler.api = ArchiveApi(RawArchive(storage), crawler.parser)
+
+    assert crawler.crawl(start_date, end_date).failed == [2019030044]
+    assert crawler.api.boxscore(1) == {}
+    assert crawler.api.schedule(datetime(2020, 9, 1), datetime(2020, 9, 2)) == {}
+
+def test_reparse_tells_dates_without_games_from_dates_never_archived():
+    storage = FakeStorage()
+    api = FakeApi()
+    api.schedule_data = dict(api.schedule_data, dates=[])
+    Crawler(api, storage, 'v3', archive=RawArchive(storage)).crawl(datetime(2020, 9, 1), datetime(2020, 9, 2))
+
+    crawler = Crawler(None, storage, 'v3', layout='game')
+    crawler.api = ArchiveApi(RawArchive(storage), crawler.parser)
+
+    assert not crawler.crawl(datetime(2020, 9, 1), datetime(2020, 9, 2)).schedule_failed
+    assert crawler.crawl(datetime(2020, 9, 3), datetime(2020, 9, 4)).schedule_failed
@@ -0,0 +1,110 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from nhldata.app import NHLApi, Crawler
+from nhldata.replay import ReplayCatalog, ReplayConfig, ReplayServer
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+class MemoryStorage():
+    def __init__(self):
+        self.stored = {}
+
+    def store_game(self, key, game_data):
+        self.stored[key.key()] = game_data
+        return True
+
+    def object_key(self, key):
+        return key.key()
+
+
+def replay(config=None, games_per_day=None):
+    return ReplayServer(ReplayCatalog.from_directory(FIXTURES, games_per_day), config)
+
+
+def test_replays_recorded_schedule_and_boxscores():
+    with replay() as server:
+        api = NHLApi(server.url)
+
+        schedule = api.schedule(datetime(2020, 8, 4), datetime(2020, 8, 4))
+        boxscore = api.boxscore(2019030042)
+
+    assert [game['gamePk'] for date in schedule['dates'] for game in date['games']] == [2019030042, 2019030043]
+    assert set(boxscore['teams']) == {'home', 'away'}
+
+def test_unknown_paths_are_not_found():
+    with replay() as server:
+        assert NHLApi(server.url, retries=0).boxscore('x') == {}
+
+    assert server.requests == {404: 1}
+
+def test_synthetic_season_scaling():
+    catalog = ReplayCatalog.from_directory(FIXTURES, games_per_day=4)
+
+    with ReplayServer(catalog) as server:
+        api = NHLApi(server.url)
+
+        schedule = api.schedule(datetime(2019, 10, 2), datetime(2019, 10, 8))
+        again = api.schedule(datetime(2019, 10, 5), datetime(2019, 10, 5))
+
+    games = [game for date in schedule['dates'] for game in date['games']]
+    assert len(games) == 7 * 4
+    assert len({game['gamePk'] for game in games}) == 7 * 4
+    assert {game['season'] for game in games} == {'20192020'}
+    assert [game['gamePk'] for game in again['dates'][0]['games']] == [
+        game['gamePk'] for game in schedule['dates'][3]['games']
+    ]
+
+@pytest.mark.parametrize('config, status', [
+    (ReplayConfig(error_rate=1.0), 503),
+    (ReplayConfig(throttle_rate=1.0, retry_after=0.01), 429)
+])
+def test_injected_failures_are_retried(config, status):
+    attempts = []
+
+    with replay(config) as server:
+        api = NHLApi(server.url, retries=2, backoff=0.01, on_request=lambda url, code, *_: attempts.append(code))
+
+        assert api.boxscore(2019030042) == {}
+
+    assert attempts == [status] * 3
+    assert server.requests == {status: 3}
+
+def test_crawl_against_replay():
+    config = ReplayConfig(latency=0.01, jitter=0.005, error_rate=0.1, seed=7)
+
+    with replay(config, games_per_day=3) as server:
+        api = NHLApi(server.url, retries=5, backoff=0.01)
+        storage = MemoryStorage()
+
+        result = Crawler(api, storage, 'v3', workers=4, layout='game').crawl(datetime(2020, 1, 1), datetime(2020, 1, 4))
+
+    assert len(result.succeeded) == 12
+    assert result.failed == []
+    assert len(storage.stored) == 12
+
+def test_hydrated_crawl_against_replay():
+    with replay(games_per_day=3) as server:
+        api = NHLApi(server.url)
+
+        result = Crawler(api, MemoryStorage(), 'v3', layout='game', hydrate=True, hydrate_days=2).crawl(
+            datetime(2020, 1, 1), datetime(2020, 1, 4))
+
+    assert len(result.succeeded) == 12
+    assert server.requests == {200: 2}
+
+def test_unchanged_responses_are_not_modified():
+    with replay() as server:
+        api = NHLApi(server.url)
+
+        first = api.boxscore(2019030042, conditional=True)
+        second = api.boxscore(2019030042, conditional=True)
+
+        assert server.requests == {200: 1, 304: 1}
+
+    assert set(first['teams']) == {'home', 'away'}
+    assert second is None
@@ -1,8 +1,11 @@
+import json
+from pathlib import Path
+
 import pytest
 import pandas as pd
 from nhldata.parser import NhlParser
 from nhldata.schema import NHL_SCHEMA
-from nhldata.strategy import _parse_personal_info, _parse_goalie_stats, _parse_skater_stats, NHL_PARSING_STRATEGY
+from nhldata.strategy import _parse_personal_info, _parse_goalie_stats, _parse_skater_stats, NhlGame, NHL_PARSING_STRATEGY
 
 
 version = 'v1'
@@ -254,3 +257,90 @@ def test_parse_skater_stats():
     actual_output = _parse_skater_stats(raw_skater_stats, actual_skater_cols)
 
     pd.testing.assert_frame_equal(expected_output, actual_output)
+
+def test_parse_games():
+    dates = [
+        {'date': '2020-08-04', 'games': [
+            {'gamePk': 2019030042, 'season': '20192020', 'status': {'abstractGameState': 'Final'}},
+            {'gamePk': 2019030043, 'season': '20192020', 'status': {'abstractGameState': 'Live'}}
+        ]},
+        {'date': '2020-08-05', 'games': [{'gamePk': 2019030044}]}
+    ]
+
+    expected_output = [
+        NhlGame(2019030042, '2020-08-04', '20192020', 'Final'),
+        NhlGame(2019030043, '2020-08-04', '20192020', 'Live'),
+        NhlGame(2019030044, '2020-08-05', '20192020', None)
+    ]
+
+    assert parser.parse_games(dates) == expected_output
+
+def test_parse_player_rows_merges_personal_info_and_stats():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+
+    rows = parser.parse_player_rows(boxscore)
+
+    assert len(rows) == 6
+    assert all(len(row) == len(output_cols) for row in rows)
+
+    goalie = dict(zip(output_cols, rows[0]))
+    assert goalie['player_person_id'] == 8475683
+    assert goalie['player_stats_goalieStats_timeOnIce'] == '57:29'
+    assert goalie['player_stats_skaterStats_timeOnIce'] is None
+    assert goalie['side'] == 'home'
+
+    scratched = dict(zip(output_cols, rows[2]))
+    assert scratched['player_person_id'] == 8478055
+    assert scratched['player_stats_goalieStats_saves'] is None
+    assert scratched['player_stats_skaterStats_goals'] is None
+
+def test_parse_game_frame():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+
+    game_df = parser.parse_game_frame(boxscore)
+
+    assert list(game_df.columns) == output_cols
+    assert list(game_df['player_person_id']) == [8475683, 8477493, 8478055, 8478009, 8474709, 8480865]
+    assert parser.parse_game_frame({'teams': {'home': {'players': {}}, 'away': {'players': {}}}}) is None
+
+def test_parse_player_info_yields_one_row_per_player():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+
+    player_dfs = parser.parse_player_info(boxscore, output_cols)
+
+    assert [len(player_df) for player_df in player_dfs] == [1] * 6
+
+def test_v2_rows_carry_the_game():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    v2_parser = NhlParser(NHL_PARSING_STRATEGY['v1'], NHL_SCHEMA['v2'])
+    game = NhlGame(2019030042, '2020-08-04', '20192020', 'Final')
+
+    game_df = v2_parser.parse_game_frame(boxscore, game)
+
+    assert list(game_df.columns) == NHL_SCHEMA['v1'] + ['game_id', 'game_date']
+    assert set(game_df['game_id']) == {2019030042}
+    assert set(game_df['game_date']) == {'2020-08-04'}
+
+def test_v3_rows_are_typed():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    v3_parser = NhlParser(NHL_PARSING_STRATEGY['v3'], NHL_SCHEMA['v3'])
+
+    rows = [dict(zip(NHL_SCHEMA['v3'], row)) for row in v3_parser.parse_player_rows(boxscore)]
+
+    goalie, skater, scratched = rows[:3]
+    assert goalie['player_stats_goalieStats_timeOnIce'] == 57 * 60 + 29
+    assert isinstance(skater['player_stats_skaterStats_evenTimeOnIce'], int)
+    assert isinstance(goalie['player_stats_goalieStats_savePercentage'], float)
+    assert goalie['player_jerseyNumber'] == 72
+    assert scratched['player_stats_skaterStats_timeOnIce'] is None
+
+def test_parse_hydrated_boxscores_keeps_complete_ones():
+    boxscore = json.loads((Path(__file__).parent / 'fixtures' / 'boxscore.json').read_text())
+    dates = [{'date': '2020-08-04', 'games': [
+        {'gamePk': 1, 'boxscore': boxscore},
+        {'gamePk': 2, 'liveData': {'boxscore': boxscore}},
+        {'gamePk': 3, 'boxscore': {'teams': {'home': boxscore['teams']['home']}}},
+        {'gamePk': 4}
+    ]}]
+
+    assert sorted(parser.parse_hydrated_boxscores(dates)) == [1, 2]
@@ -0,0 +1,71 @@
+import threading
+
+from nhldata.app import StorageKey
+from nhldata.upload import UploadExecutor
+
+
+class SlowStorage():
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.stored = []
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def store_game(self, key, game_data):
+        self.release.wait(5)
+
+        if key.key() in self.failing:
+            raise IOError('upload failed')
+
+        with self._lock:
+            self.stored.append(key.key())
+
+        return True
+
+    def object_key(self, key):
+        return key.key()
+
+
+def test_flush_waits_for_every_upload():
+    storage = SlowStorage()
+    storage.release.set()
+
+    with UploadExecutor(storage, workers=3) as uploader:
+        for player_id in range(20):
+            uploader.submit(StorageKey(2019030042, player_id), None)
+
+        assert uploader.flush() == {}
+        assert len(storage.stored) == 20
+
+def test_failed_uploads_are_reported_per_key():
+    storage = SlowStorage(failing=['1/2019030042.csv'])
+    storage.release.set()
+
+    with UploadExecutor(storage, workers=2) as uploader:
+        for player_id in range(3):
+            uploader.submit(StorageKey(2019030042, player_id), None)
+
+        errors = uploader.flush()
+
+    assert list(errors) == ['1/2019030042.csv']
+    assert sorted(storage.stored) == ['0/2019030042.csv', '2/2019030042.csv']
+
+def test_submit_blocks_when_queue_is_full():
+    storage = SlowStorage()
+    uploader = UploadExecutor(storage, workers=1, max_pending=1)
+
+    uploader.submit(StorageKey(1, 1), None)
+    uploader.submit(StorageKey(1, 2), None)
+
+    submitted = threading.Event()
+    blocked = threading.Thread(target=lambda: (uploader.submit(StorageKey(1, 3), None), submitted.set()))
+    blocked.start()
+
+    assert not submitted.wait(0.2)
+
+    storage.release.set()
+    blocked.join(5)
+
+    assert submitted.is_set()
+    assert uploader.close() == {}
+    assert len(storage.stored) == 3
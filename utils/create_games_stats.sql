@@ -1,5 +1,4 @@
-DROP TABLE IF EXISTS game_stats;
-CREATE TABLE game_stats (
+CREATE TABLE IF NOT EXISTS game_stats (
 player_person_id int,
 player_jerseyNumber int,
 player_person_active bool,
@@ -48,10 +47,10 @@ player_stats_goalieStats_shortHandedSavePercentage float8,
 player_stats_goalieStats_shortHandedSaves float8,
 player_stats_goalieStats_shortHandedShotsAgainst float8,
 player_stats_goalieStats_shots float8,
-player_stats_goalieStats_timeOnIce varchar(50),
+player_stats_goalieStats_timeOnIce int,
 player_stats_skaterStats_assists float8,
 player_stats_skaterStats_blocked float8,
-player_stats_skaterStats_evenTimeOnIce varchar(50),
+player_stats_skaterStats_evenTimeOnIce int,
 player_stats_skaterStats_faceOffPct float8,
 player_stats_skaterStats_faceOffWins float8,
 player_stats_skaterStats_faceoffTaken float8,
@@ -62,12 +61,17 @@ player_stats_skaterStats_penaltyMinutes float8,
 player_stats_skaterStats_plusMinus float8,
 player_stats_skaterStats_powerPlayAssists float8,
 player_stats_skaterStats_powerPlayGoals float8,
-player_stats_skaterStats_powerPlayTimeOnIce varchar(50),
+player_stats_skaterStats_powerPlayTimeOnIce int,
 player_stats_skaterStats_shortHandedAssists float8,
 player_stats_skaterStats_shortHandedGoals float8,
-player_stats_skaterStats_shortHandedTimeOnIce varchar(50),
+player_stats_skaterStats_shortHandedTimeOnIce int,
 player_stats_skaterStats_shots float8,
 player_stats_skaterStats_takeaways float8,
-player_stats_skaterStats_timeOnIce varchar(50),
-side varchar(50)
-)
+player_stats_skaterStats_timeOnIce int,
+side varchar(50),
+game_id bigint,
+game_date date,
+loaded_at timestamptz not null default now()
+);
+CREATE INDEX IF NOT EXISTS game_stats_game_player ON game_stats (game_id, player_person_id);
+
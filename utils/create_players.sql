@@ -0,0 +1,31 @@
+CREATE TABLE IF NOT EXISTS players (
+player_person_id int,
+player_person_active bool,
+player_person_alternateCaptain bool,
+player_person_birthCity varchar(50),
+player_person_birthCountry varchar(50),
+player_person_birthDate varchar(50),
+player_person_birthStateProvince varchar(50),
+player_person_captain bool,
+player_person_currentAge int,
+player_person_currentTeam_id int,
+player_person_currentTeam_link varchar(50),
+player_person_currentTeam_name varchar(50),
+player_person_firstName varchar(50),
+player_person_fullName varchar(50),
+player_person_height varchar(50),
+player_person_lastName varchar(50),
+player_person_link varchar(50),
+player_person_nationality varchar(50),
+player_person_primaryNumber int,
+player_person_primaryPosition_abbreviation varchar(50),
+player_person_primaryPosition_code varchar(50),
+player_person_primaryPosition_name varchar(50),
+player_person_primaryPosition_type varchar(50),
+player_person_rookie bool,
+player_person_rosterStatus varchar(50),
+player_person_shootsCatches varchar(50),
+player_person_weight int,
+loaded_at timestamptz not null default now()
+);
+CREATE INDEX IF NOT EXISTS players_person_loaded ON players (player_person_id, loaded_at);